@@ -1,14 +1,14 @@
 """
 報表 API
 """
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from models.travel_record import TravelRecord
 from utils.report_generator import ExcelReportGenerator, PDFReportGenerator
 from extensions import db
 from datetime import datetime
 from loguru import logger
-import tempfile
+from utils.download_stream import spooled_buffer, stream_download
 
 bp = Blueprint('reports', __name__)
 
@@ -42,28 +42,32 @@ def generate_mileage_report():
             generator = ExcelReportGenerator()
             generator.generate_mileage_report(record_data, report_type, include_map, include_route, include_distance)
             
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
-            generator.save(temp_file.name)
-            temp_file.close()
+            buffer = spooled_buffer()
+            try:
+                generator.save(buffer)
+            except Exception:
+                buffer.close()
+                raise
             
-            return send_file(
-                temp_file.name,
-                as_attachment=True,
-                download_name=f'里程報表_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            return stream_download(
+                buffer,
+                f'里程報表_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
+                'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
             )
             
         elif format_type == 'pdf':
             generator = PDFReportGenerator()
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-            generator.generate_mileage_report(record_data, report_type, temp_file.name, include_map, include_route, include_distance)
-            temp_file.close()
+            buffer = spooled_buffer()
+            try:
+                generator.generate_mileage_report(record_data, report_type, buffer, include_map, include_route, include_distance)
+            except Exception:
+                buffer.close()
+                raise
             
-            return send_file(
-                temp_file.name,
-                as_attachment=True,
-                download_name=f'里程報表_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf',
-                mimetype='application/pdf'
+            return stream_download(
+                buffer,
+                f'里程報表_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf',
+                'application/pdf'
             )
         
         return jsonify({'status': 'error', 'message': '不支援的報表格式'}), 400
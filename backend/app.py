@@ -91,7 +91,7 @@ app.register_blueprint(calculate_bp, url_prefix='/api/calculate')
 app.register_blueprint(export_bp, url_prefix='/api/export')
 
 # 匯入模型以建立資料表
-from models import User, TravelRecord, SystemSetting
+from models import User, TravelRecord, SystemSetting, CacheEntry
 
 @app.route('/')
 def index():
@@ -129,9 +129,11 @@ def health_detailed():
         except:
             db_status = 'disconnected'
         
+        from services.janitor import janitor
         return {
             'status': 'healthy',
-            'database': db_status
+            'database': db_status,
+            'janitor': janitor.stats()
         }
     except Exception as e:
         return {
@@ -154,6 +156,14 @@ if __name__ == '__main__':
     except Exception as e:
         logger.warning(f"資料表初始化失敗（可能資料庫未連線）: {str(e)}")
     
+    # 預先解析中文字體（之後各張地圖共用）
+    from utils.font_registry import font_registry
+    font_registry.resolve()
+
+    # 定期清理 temp/、temp/maps/、output/ 的舊檔案
+    from services.janitor import janitor
+    janitor.start()
+    
     # 啟動應用程式
     port = int(os.getenv('PORT', 5001))
     host = os.getenv('HOST', '0.0.0.0')
@@ -133,7 +133,7 @@ app.register_blueprint(upload_bp, url_prefix="/api/upload")
 app.register_blueprint(calculate_bp, url_prefix="/api/calculate")
 app.register_blueprint(export_bp, url_prefix="/api/export")
 
-from models import User, TravelRecord, SystemSetting  # noqa: F401
+from models import User, TravelRecord, SystemSetting, CacheEntry  # noqa: F401
 
 # =========================
 # Required dirs
@@ -212,7 +212,8 @@ def health_detailed():
             db.engine.connect()
         except Exception:
             db_status = "disconnected"
-        return {"status": "healthy", "database": db_status}
+        from services.janitor import janitor
+        return {"status": "healthy", "database": db_status, "janitor": janitor.stats()}
     except Exception:
         return {"status": "healthy", "database": "unknown"}
 
@@ -237,6 +238,14 @@ if __name__ == "__main__":
     except Exception as e:
         logger.warning(f"資料表初始化失敗: {str(e)}")
 
+    # 預先解析中文字體（之後各張地圖共用）
+    from utils.font_registry import font_registry
+    font_registry.resolve()
+
+    # 定期清理 temp/、temp/maps/、output/ 的舊檔案
+    from services.janitor import janitor
+    janitor.start()
+
     # exe 才開瀏覽器；Render 不開
     if IS_FROZEN:
         threading.Thread(target=open_browser, daemon=True).start()
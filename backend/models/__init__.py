@@ -4,11 +4,13 @@
 from models.user import User
 from models.travel_record import TravelRecord
 from models.setting import SystemSetting
+from models.cache_entry import CacheEntry
 
 __all__ = [
     'User',
     'TravelRecord',
-    'SystemSetting'
+    'SystemSetting',
+    'CacheEntry'
 ]
 
 
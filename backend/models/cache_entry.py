@@ -0,0 +1,38 @@
+"""
+外部 API 快取模型
+"""
+from datetime import datetime
+from sqlalchemy.dialects import mysql
+from extensions import db
+
+class CacheEntry(db.Model):
+    """外部 API 結果快取資料表（地理編碼、路線等）"""
+    __tablename__ = 'api_cache_entries'
+    __table_args__ = (
+        db.UniqueConstraint('namespace', 'cache_key', name='uq_api_cache_namespace_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    namespace = db.Column(db.String(50), nullable=False, index=True, comment='快取分類：geocode, directions')
+    cache_key = db.Column(db.String(64), nullable=False, comment='正規化查詢的 SHA-256')
+    query_text = db.Column(db.Text, comment='正規化後的查詢內容（除錯用）')
+    payload = db.Column(db.Text().with_variant(mysql.MEDIUMTEXT(), 'mysql'), comment='結果（JSON格式），負向快取為空')
+    is_negative = db.Column(db.Boolean, default=False, comment='是否為查無結果的負向快取')
+    hit_count = db.Column(db.Integer, default=0, comment='命中次數')
+    expires_at = db.Column(db.DateTime, nullable=False, index=True, comment='到期時間')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, comment='建立時間')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment='更新時間')
+
+    def to_dict(self):
+        """轉換為字典"""
+        return {
+            'id': self.id,
+            'namespace': self.namespace,
+            'cache_key': self.cache_key,
+            'query_text': self.query_text,
+            'is_negative': self.is_negative,
+            'hit_count': self.hit_count,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -1,21 +1,39 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, has_app_context
 from loguru import logger
 
-from services.google_maps_service import GoogleMapsService
+from services.google_maps_service import GoogleMapsService, overlay_timestamp
 from services.place_mapping import PlaceMappingService
+from services.place_resolver import PlaceResolver
+from services.local_map_renderer import LocalMapRenderer
+from services.tile_cache import build_tile_compositor
+from services.map_image_store import make_image_key, map_image_store
 from services.gmap_screenshot_service import capture_route_screenshot_sync
+from services.batch_jobs import BatchJobManager
+from services.janitor import janitor
+from models.travel_record import TravelRecord
 
 from utils.log_sanitizer import sanitize_log_input
 from utils.path_manager import get_temp_maps_dir, get_relative_path
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 import os
+import threading
+import uuid
 
 bp = Blueprint("calculate", __name__)
 maps_service = GoogleMapsService()
+# 本機繪製地圖：設定 MAP_TILE_URL 時以快取圖磚作為背景
+local_renderer = LocalMapRenderer(maps_service, background=build_tile_compositor())
 place_mapping = PlaceMappingService()
 
+# 批次並行設定：預設並行數、上限，以及同時進行的瀏覽器截圖數
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+_screenshot_slots = threading.BoundedSemaphore(max(int(os.getenv("SCREENSHOT_CONCURRENCY", "2")), 1))
 
 @bp.route("/test-screenshot", methods=["POST"])
 def test_screenshot():
@@ -58,6 +76,7 @@ def test_screenshot():
         # 呼叫截圖函數
         screenshot_path = None
         error_details = None
+        readiness = {}
         try:
             logger.info(f"[TEST_SCREENSHOT] 呼叫 capture_route_screenshot_sync")
             screenshot_result = capture_route_screenshot_sync(
@@ -66,6 +85,7 @@ def test_screenshot():
                 output_path=str(expected_path),
                 viewport_width=1920,
                 viewport_height=1080,
+                metrics=readiness,
             )
 
             if screenshot_result:
@@ -100,6 +120,7 @@ def test_screenshot():
             "exists": exists,
             "file_size": file_size,
             "maps_url": maps_url,
+            "readiness": readiness or None,
             "error": error_details
         }
 
@@ -147,12 +168,16 @@ def calculate_distance():
             }), 400
 
         alternative_polylines = route_detail.get("alternative_polylines", [])
+        origin_geo, destination_geo = maps_service.route_endpoints(route_detail)
         map_image_path = maps_service.download_static_map_with_polyline(
             route_detail["polyline"],
             origin_address,
             destination_address,
             distance_km=route_detail["distance_km"],
             alternative_polylines=alternative_polylines,
+            origin_geo=origin_geo,
+            destination_geo=destination_geo,
+            bounds=route_detail.get("bounds"),
         )
 
         response_data = {
@@ -180,217 +205,529 @@ def calculate_distance():
         return jsonify({"status": "error", "message": f"計算距離失敗: {str(e)}"}), 500
 
 
+def _prepare_record(idx, record, fixed_origin, resolver):
+    """
+    前置處理單筆紀錄：檢查欄位並由批次解析表取得起終點地址
+
+    Returns:
+        tuple: (outcome, route_key)；route_key 為 (起點地址, 終點地址)，
+               不需計算或已失敗時為 None（outcome 即為最終結果）
+    """
+    outcome = {"record": record, "errors": [], "directions": None}
+    try:
+        is_driving = (record.get("IsDriving", "N") or "N").upper()
+        if is_driving != "Y":
+            return outcome, None
+
+        origin_name = (record.get("起點名稱") or "").strip()
+        destination_name = (record.get("目的地名稱") or "").strip()
+
+        if not origin_name or not destination_name:
+            outcome["errors"].append(f"第 {idx + 1} 筆資料缺少起點或終點")
+            return outcome, None
+
+        # 起點（固定起點不需解析）
+        if fixed_origin:
+            origin_address = fixed_origin
+        else:
+            origin_address, _ = resolver.resolve(origin_name)
+
+        # 終點
+        destination_address, _ = resolver.resolve(destination_name)
+
+        # 起終點檢查
+        if origin_address == destination_address and origin_name == destination_name:
+            outcome["errors"].append(f"第 {idx + 1} 筆資料起點和終點完全相同: {origin_name}")
+            logger.warning(f"第 {idx + 1} 筆資料起點和終點完全相同: {origin_name}")
+            return outcome, None
+        elif origin_address == destination_address and origin_name != destination_name:
+            logger.info(f"第 {idx + 1} 筆資料對應地址相同，改用原始名稱計算: {origin_name} -> {destination_name}")
+            origin_address = origin_name
+            destination_address = destination_name
+
+        safe_origin = sanitize_log_input(origin_address)
+        safe_destination = sanitize_log_input(destination_address)
+        logger.info(f"第 {idx + 1} 筆資料計算: {origin_name} ({safe_origin}) -> {destination_name} ({safe_destination})")
+        return outcome, (origin_address, destination_address)
+
+    except Exception as e:
+        logger.error(f"處理第 {idx + 1} 筆資料錯誤: {str(e)}")
+        outcome["errors"].append(f"第 {idx + 1} 筆資料處理失敗: {str(e)}")
+        return outcome, None
+
+
+def _capture_screenshot(origin_address, destination_address):
+    """
+    Playwright 截圖（完整路線頁，未標註）
+
+    Returns:
+        Path | None: 有效截圖路徑（> 10KB），失敗時為 None
+    """
+    safe_origin = sanitize_log_input(origin_address)
+    safe_destination = sanitize_log_input(destination_address)
+    # 相同起終點與視窗大小的截圖只產生一次（內容定址儲存）
+    image_key = make_image_key("screenshot", origin_address, destination_address, viewport="1920x1080")
+    cached = map_image_store.lookup(image_key)
+    if cached:
+        logger.info(f"[MAP_STORE] 重複路線，使用既有截圖: {safe_origin} -> {safe_destination}")
+        return cached
+    try:
+        temp_maps_dir = get_temp_maps_dir()  # Path
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        # 並行處理時同一毫秒可能有多筆，加上隨機碼避免檔名衝突
+        screenshot_filename = f"gmap_route_{timestamp}_{uuid.uuid4().hex[:8]}.png"
+        expected_path = temp_maps_dir / screenshot_filename
+
+        logger.info(f"[TRY_PLAYWRIGHT] {safe_origin} -> {safe_destination}")
+        readiness = {}
+        with _screenshot_slots:
+            screenshot_result = capture_route_screenshot_sync(
+                origin=origin_address,
+                destination=destination_address,
+                output_path=str(expected_path),
+                viewport_width=1920,
+                viewport_height=1080,
+                metrics=readiness,
+            )
+
+        if screenshot_result:
+            # 有些實作會回傳字串路徑
+            screenshot_path = Path(screenshot_result)
+        else:
+            screenshot_path = expected_path if expected_path.exists() else None
+
+        # 驗證截圖檔案
+        exists = False
+        file_size = 0
+        if screenshot_path:
+            exists = os.path.exists(screenshot_path)
+            if exists:
+                file_size = os.path.getsize(screenshot_path)
+                # 檢查檔案大小（必須 > 10KB）
+                if file_size <= 10240:
+                    logger.warning(f"[PLAYWRIGHT_RESULT] 截圖檔案太小 ({file_size} bytes)，視為失敗")
+                    screenshot_path = None
+                    exists = False
+                    file_size = 0
+
+        logger.info(
+            f"[PLAYWRIGHT_RESULT] path={screenshot_path}, exists={exists}, size={file_size} bytes, "
+            f"ready_ms={readiness.get('ready_ms')}"
+        )
+
+        if not exists or not screenshot_path:
+            logger.warning("[FALLBACK_STATICMAP] Playwright 截圖失敗，回退使用靜態地圖")
+            return None
+        return map_image_store.put_file(
+            image_key, screenshot_path,
+            kind="screenshot", origin=origin_address, destination=destination_address,
+        )
+
+    except Exception as e:
+        logger.warning(f"[FALLBACK_STATICMAP] Playwright 截圖過程發生錯誤: {str(e)}，回退使用靜態地圖")
+        import traceback
+        logger.debug(f"錯誤詳情: {traceback.format_exc()}")
+        return None
+
+
+def _annotate_route(screenshot_path, route_detail, origin_address, destination_address):
+    """
+    產生路線標註圖：同一路線只截圖一次、只解碼與標註一次，共用此路線的紀錄使用同一張標註圖
+    （標註內容只有公里數、地址與產出時間，不含出差日期）；截圖（底圖）保持不變，標註圖依底圖與標註內容存放於內容定址儲存
+
+    Returns:
+        Path: 圖片路徑
+    """
+    try:
+        base = maps_service.open_map_image(screenshot_path)
+    except Exception as e:
+        logger.error(f"[ANNOTATE] 讀取截圖失敗: {str(e)}")
+        # 標註失敗不影響截圖結果，繼續使用原圖
+        return screenshot_path
+
+    base_key = map_image_store.key_for_path(screenshot_path) or str(screenshot_path)
+    generated_at = overlay_timestamp()
+    image_key = make_image_key(
+        "annotated", base_key,
+        distance_km=route_detail["distance_km"],
+        round_trip_km=route_detail.get("round_trip_km"),
+        origin=origin_address,
+        destination=destination_address,
+        generated_at=generated_at,
+    )
+    target = map_image_store.path_for(image_key)
+
+    # 成功截圖後，統一加上 footer 樣式 (km + A/B 地址 + 時間)，由記憶體中的影像合成後一次寫檔
+    logger.info(f"[ANNOTATE] 為截圖加上標註資訊: {target}")
+    annotated = maps_service.annotate_map_image(
+        base,
+        target,
+        distance_km=route_detail["distance_km"],
+        origin_addr=origin_address,
+        dest_addr=destination_address,
+        round_trip_km=route_detail.get("round_trip_km"),
+        generated_at=generated_at,
+        copy=False,
+    )
+    if not annotated:
+        # 標註失敗不影響截圖結果，繼續使用原圖
+        map_image_store.put_bytes(image_key, Path(screenshot_path).read_bytes())
+    map_image_store.record(image_key, kind="annotated", base=base_key)
+    return target
+
+
+def _compute_route(route_key, resolver):
+    """
+    計算單一路線（同一批次中相同起終點只計算一次）：路線 → 截圖（失敗回退靜態地圖，再回退本機繪製）→ 標註
+
+    Args:
+        route_key: (起點地址, 終點地址)
+        resolver: 批次地點解析表（靜態地圖回退時取用起終點座標）
+
+    Returns:
+        dict: {"route_detail": 路線結果, "directions": "hit" | "api" | None, "image": 圖片路徑（無圖片時為 None）}
+    """
+    origin_address, destination_address = route_key
+    result = {"route_detail": None, "directions": None, "image": None, "error": None}
+    try:
+        route_detail = maps_service.get_route_detail(
+            origin_address, destination_address, alternatives=True
+        )
+    except Exception as e:
+        logger.error(f"計算路線錯誤: {sanitize_log_input(origin_address)} -> {sanitize_log_input(destination_address)}, {str(e)}")
+        result["error"] = str(e)
+        return result
+
+    result["route_detail"] = route_detail
+    if route_detail.get("from_cache"):
+        result["directions"] = "hit"
+    elif maps_service.gmaps:
+        result["directions"] = "api"
+
+    if not route_detail.get("success") or not (route_detail.get("distance_km", 0) or 0):
+        return result
+
+    screenshot_path = _capture_screenshot(origin_address, destination_address)
+    if screenshot_path:
+        result["image"] = _annotate_route(screenshot_path, route_detail, origin_address, destination_address)
+        return result
+
+    # 回退：Google Maps 官方樣式靜態地圖（含替代路線）
+    logger.info("[FALLBACK_STATICMAP] 使用 Google Maps 官方樣式靜態地圖")
+    alternative_polylines = route_detail.get("alternative_polylines", [])
+    origin_geo, destination_geo = maps_service.route_endpoints(route_detail)
+    origin_geo = origin_geo or resolver.locate(origin_address)
+    destination_geo = destination_geo or resolver.locate(destination_address)
+    map_image_path = maps_service.download_static_map_with_polyline(
+        route_detail["polyline"],
+        origin_address,
+        destination_address,
+        distance_km=route_detail["distance_km"],
+        alternative_polylines=alternative_polylines,
+        origin_geo=origin_geo,
+        destination_geo=destination_geo,
+        bounds=route_detail.get("bounds"),
+    )
+    if map_image_path:
+        map_path = Path(map_image_path) if not isinstance(map_image_path, Path) else map_image_path
+        # 驗證靜態地圖檔案也存在
+        if map_path.exists() and os.path.getsize(map_path) > 10240:
+            result["image"] = map_path
+            return result
+        logger.warning(f"[FALLBACK_STATICMAP] 靜態地圖檔案無效: {map_path}")
+
+    # 第三層回退：本機依 polyline 繪製（不需網路）
+    logger.info("[FALLBACK_LOCALMAP] 使用本機繪製路線地圖")
+    local_map_path = local_renderer.render(
+        route_detail, origin_address, destination_address,
+        origin_geo=origin_geo, destination_geo=destination_geo,
+    )
+    if local_map_path:
+        result["image"] = Path(local_map_path)
+    return result
+
+
+def _apply_route(idx, outcome, route_key, route):
+    """將路線計算結果寫回單筆紀錄"""
+    record = outcome["record"]
+    origin_address, destination_address = route_key
+    route_detail = route["route_detail"]
+    if route["error"]:
+        outcome["errors"].append(f"第 {idx + 1} 筆資料處理失敗: {route['error']}")
+        return outcome
+    try:
+        if not route_detail.get("success"):
+            error_msg = route_detail.get("error", "未知錯誤")
+            outcome["errors"].append(f"第 {idx + 1} 筆資料計算失敗: {error_msg}")
+            logger.warning(
+                f"第 {idx + 1} 筆資料計算失敗: {sanitize_log_input(origin_address)} -> "
+                f"{sanitize_log_input(destination_address)}, 錯誤: {error_msg}"
+            )
+            return outcome
+
+        distance_km = route_detail.get("distance_km", 0) or 0
+        if distance_km == 0:
+            outcome["errors"].append(f"第 {idx + 1} 筆資料計算結果為 0 公里，請檢查地址是否正確: {origin_address} -> {destination_address}")
+            logger.warning(
+                f"第 {idx + 1} 筆資料計算結果為 0 公里: {sanitize_log_input(origin_address)} -> "
+                f"{sanitize_log_input(destination_address)}"
+            )
+            return outcome
+
+        # 更新紀錄
+        record["OneWayKm"] = route_detail["distance_km"]
+        record["RoundTripKm"] = route_detail["round_trip_km"]
+        record["GoogleMapUrl"] = route_detail["map_url"]
+        record["StepCount"] = route_detail.get("step_count")
+        record["Polyline"] = route_detail.get("polyline")
+        record["RouteSteps"] = route_detail.get("route_steps_text")
+
+        record["OriginAddress"] = origin_address
+        record["DestinationAddress"] = destination_address
+
+        if "estimated_time" in route_detail:
+            record["EstimatedTime"] = route_detail.get("estimated_time")
+
+        # 確保 StaticMapImage 是前端可用的相對路徑（前面有 /）
+        screenshot_path = route["image"]
+        if screenshot_path and screenshot_path.exists() and os.path.getsize(screenshot_path) > 10240:
+            relative_path = get_relative_path(str(screenshot_path))
+            # 確保路徑前面有 /
+            if not relative_path.startswith('/'):
+                relative_path = '/' + relative_path
+            record["StaticMapImage"] = relative_path
+        else:
+            record["StaticMapImage"] = None
+            logger.warning(f"第 {idx + 1} 筆資料地圖截圖失敗，StaticMapImage 設為 None")
+
+    except Exception as e:
+        logger.error(f"處理第 {idx + 1} 筆資料錯誤: {str(e)}")
+        outcome["errors"].append(f"第 {idx + 1} 筆資料處理失敗: {str(e)}")
+
+    return outcome
+
+
+def _resolve_concurrency(value):
+    """
+    解析並行數設定（請求值優先，否則使用環境變數），限制在 1 ~ BATCH_MAX_CONCURRENCY
+    """
+    try:
+        concurrency = int(value) if value not in (None, "") else BATCH_CONCURRENCY
+    except (TypeError, ValueError):
+        concurrency = BATCH_CONCURRENCY
+    return min(max(concurrency, 1), BATCH_MAX_CONCURRENCY)
+
+
+def _map_tasks(func, tasks, concurrency):
+    """
+    執行一組工作；concurrency > 1 時以有界執行緒池並行處理
+
+    Args:
+        func: 工作函式 func(*task)
+        tasks: 參數 tuple 列表
+        concurrency: 並行數
+
+    Yields:
+        tuple: (工作索引, 結果)，並行時依完成順序
+    """
+    if concurrency <= 1 or len(tasks) <= 1:
+        for i, task in enumerate(tasks):
+            yield i, func(*task)
+        return
+
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def worker(task):
+        # 工作執行緒沒有請求環境，推入 app context 讓快取可使用資料庫層
+        with (app.app_context() if app else nullcontext()):
+            return func(*task)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-calc") as executor:
+        futures = {executor.submit(worker, task): i for i, task in enumerate(tasks)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def _run_batch(records, fixed_origin, concurrency=1, on_record_done=None):
+    """
+    執行批次計算：先解析所有紀錄的起終點，依路線分組後每條路線只計算一次，再將結果分派回各筆紀錄；
+    concurrency > 1 時以有界執行緒池並行處理，結果依原始順序重組
+
+    Args:
+        records: 紀錄列表
+        fixed_origin: 固定起點地址
+        concurrency: 並行數
+        on_record_done: 每筆完成時的回呼 on_record_done(idx, outcome)（背景工作回報進度用）
+
+    Returns:
+        dict: {"records": 依原順序的紀錄, "errors": 錯誤列表, "directions_hits": int,
+               "directions_api_calls": int, "unique_routes": int, "shared_routes": int,
+               "places": 地點解析統計}
+    """
+    outcomes = [None] * len(records)
+
+    def finish(idx, outcome):
+        outcomes[idx] = outcome
+        if on_record_done:
+            on_record_done(idx, outcome)
+
+    if concurrency > 1 and len(records) > 1:
+        logger.info(f"批次計算以並行模式執行: {len(records)} 筆, 並行數 {concurrency}")
+
+    # 1. 解析起終點（每個不同地點名稱只解析一次），依路線分組（保留首次出現順序）
+    resolver = PlaceResolver(maps_service, place_mapping)
+    groups = {}  # route_key -> [idx, ...]
+    prepared = {}
+    tasks = [(idx, record, fixed_origin, resolver) for idx, record in enumerate(records)]
+    for idx, (outcome, route_key) in _map_tasks(_prepare_record, tasks, concurrency):
+        if route_key is None:
+            finish(idx, outcome)
+        else:
+            prepared[idx] = (outcome, route_key)
+    for idx in sorted(prepared):
+        groups.setdefault(prepared[idx][1], []).append(idx)
+
+    # 2. 每條路線計算一次，再分派給共用此路線的紀錄
+    route_keys = list(groups)
+    if len(route_keys) < len(prepared):
+        logger.info(f"批次路線去重: {len(prepared)} 筆紀錄共 {len(route_keys)} 條不同路線")
+    tasks = [(key, resolver) for key in route_keys]
+    for i, route in _map_tasks(_compute_route, tasks, concurrency):
+        key = route_keys[i]
+        for position, idx in enumerate(groups[key]):
+            outcome = _apply_route(idx, prepared[idx][0], key, route)
+            outcome["directions"] = route["directions"] if position == 0 else "shared"
+            finish(idx, outcome)
+
+    return {
+        "records": [o["record"] for o in outcomes],
+        "errors": [err for o in outcomes for err in o["errors"]],
+        "directions_hits": sum(1 for o in outcomes if o["directions"] == "hit"),
+        "directions_api_calls": sum(1 for o in outcomes if o["directions"] == "api"),
+        "unique_routes": len(route_keys),
+        "shared_routes": sum(1 for o in outcomes if o["directions"] == "shared"),
+        "places": resolver.stats(),
+    }
+
+
+def _submit_job(records, fixed_origin, concurrency):
+    """
+    送出背景批次工作，回傳 202 與輪詢網址
+    """
+    job = batch_jobs.submit(
+        records,
+        app=current_app._get_current_object(),
+        fixed_origin=fixed_origin,
+        concurrency=concurrency,
+    )
+    return jsonify({
+        "status": "success",
+        "data": {
+            "job_id": job.job_id,
+            "status": job.status,
+            "total_count": job.total,
+            "status_url": f"/api/calculate/jobs/{job.job_id}",
+        },
+        "message": f"已排入背景計算: {job.total} 筆",
+    }), 202
+
+
+batch_jobs = BatchJobManager(
+    runner=_run_batch,
+    workers=int(os.getenv("BATCH_JOB_WORKERS", "1")),
+    retention_seconds=int(os.getenv("BATCH_JOB_RETENTION_SECONDS", "3600")),
+)
+
+
+def _job_files():
+    """保留中的批次工作（含已完成、結果仍可查詢者）引用的地圖圖片（暫存檔清理時略過）"""
+    return [path for job in batch_jobs.retained_jobs() for path in job.referenced_files()]
+
+
+janitor.add_protected(_job_files)
+
+
+def _travel_record_files(app):
+    """資料庫中出差紀錄引用的地圖圖片（暫存檔清理時略過；背景執行緒沒有 app context，需自行推入）"""
+    with app.app_context():
+        rows = TravelRecord.query.with_entities(TravelRecord.map_image_path).filter(
+            TravelRecord.map_image_path.isnot(None)
+        ).all()
+        return [path for (path,) in rows]
+
+
+@bp.record_once
+def _protect_travel_record_files(state):
+    # 藍圖註冊到應用程式（main.py 或 app.py）時登記，兩個進入點都會受到保護
+    janitor.add_protected(partial(_travel_record_files, state.app))
+
+
+@bp.route("/jobs", methods=["POST"])
+def submit_batch_job():
+    """
+    以背景工作方式批次計算（立即回傳 job id）
+
+    請求:
+        與 /batch 相同
+    """
+    try:
+        data = request.get_json() or {}
+        records = data.get("records", []) or []
+        fixed_origin = (data.get("fixed_origin") or "").strip()
+        concurrency = _resolve_concurrency(data.get("concurrency"))
+
+        if not records:
+            return jsonify({"status": "error", "message": "沒有提供資料"}), 400
+
+        return _submit_job(records, fixed_origin, concurrency)
+
+    except Exception as e:
+        logger.error(f"送出批次工作錯誤: {str(e)}")
+        return jsonify({"status": "error", "message": f"送出批次工作失敗: {str(e)}"}), 500
+
+
+@bp.route("/jobs/<job_id>", methods=["GET"])
+def get_batch_job(job_id):
+    """
+    查詢背景工作進度（含已完成的部分結果與錯誤）
+    """
+    job = batch_jobs.get(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": "工作不存在或已過期"}), 404
+
+    return jsonify({"status": "success", "data": job.to_dict()}), 200
+
+
 @bp.route("/batch", methods=["POST"])
 def calculate_batch():
     """
     批次計算多筆距離
+
+    請求:
+        {
+            "records": 紀錄列表,
+            "fixed_origin": "固定起點地址（可選）",
+            "concurrency": 並行處理筆數（可選，預設 BATCH_CONCURRENCY）,
+            "async": true 時改為背景工作，立即回傳 job id（可選）
+        }
     """
     try:
         data = request.get_json() or {}
         records = data.get("records", []) or []
         fixed_origin = (data.get("fixed_origin") or "").strip()
+        concurrency = _resolve_concurrency(data.get("concurrency"))
 
         if not records:
             return jsonify({"status": "error", "message": "沒有提供資料"}), 400
 
-        updated_records = []
-        errors = []
-
-        for idx, record in enumerate(records):
-            try:
-                is_driving = (record.get("IsDriving", "N") or "N").upper()
-                if is_driving != "Y":
-                    updated_records.append(record)
-                    continue
-
-                origin_name = (record.get("起點名稱") or "").strip()
-                destination_name = (record.get("目的地名稱") or "").strip()
-
-                if not origin_name or not destination_name:
-                    errors.append(f"第 {idx + 1} 筆資料缺少起點或終點")
-                    updated_records.append(record)
-                    continue
-
-                # 起點
-                if fixed_origin:
-                    origin_address = fixed_origin
-                else:
-                    origin_geocode = maps_service.geocode(origin_name)
-                    if origin_geocode:
-                        origin_address = origin_geocode.get("formatted_address", origin_name)
-                        logger.info(f"第 {idx + 1} 筆資料起點 Google Maps 解析成功: {origin_name} -> {origin_address}")
-                    else:
-                        mapped_origin = place_mapping.get_address(origin_name)
-                        origin_address = mapped_origin if mapped_origin else origin_name
-                        if mapped_origin:
-                            logger.info(f"第 {idx + 1} 筆資料起點使用對應表: {origin_name} -> {origin_address}")
-                        else:
-                            logger.warning(f"第 {idx + 1} 筆資料起點無法解析，使用原始名稱: {origin_name}")
-
-                # 終點
-                destination_geocode = maps_service.geocode(destination_name)
-                if destination_geocode:
-                    destination_address = destination_geocode.get("formatted_address", destination_name)
-                    logger.info(f"第 {idx + 1} 筆資料終點 Google Maps 解析成功: {destination_name} -> {destination_address}")
-                else:
-                    mapped_destination = place_mapping.get_address(destination_name)
-                    destination_address = mapped_destination if mapped_destination else destination_name
-                    if mapped_destination:
-                        logger.info(f"第 {idx + 1} 筆資料終點使用對應表: {destination_name} -> {destination_address}")
-                    else:
-                        logger.warning(f"第 {idx + 1} 筆資料終點無法解析，使用原始名稱: {destination_name}")
-
-                # 起終點檢查
-                if origin_address == destination_address and origin_name == destination_name:
-                    errors.append(f"第 {idx + 1} 筆資料起點和終點完全相同: {origin_name}")
-                    logger.warning(f"第 {idx + 1} 筆資料起點和終點完全相同: {origin_name}")
-                    updated_records.append(record)
-                    continue
-                elif origin_address == destination_address and origin_name != destination_name:
-                    logger.info(f"第 {idx + 1} 筆資料對應地址相同，改用原始名稱計算: {origin_name} -> {destination_name}")
-                    origin_address = origin_name
-                    destination_address = destination_name
-
-                safe_origin = sanitize_log_input(origin_address)
-                safe_destination = sanitize_log_input(destination_address)
-                logger.info(f"第 {idx + 1} 筆資料計算: {origin_name} ({safe_origin}) -> {destination_name} ({safe_destination})")
-
-                route_detail = maps_service.get_route_detail(
-                    origin_address, destination_address, alternatives=True
-                )
-
-                if not route_detail.get("success"):
-                    error_msg = route_detail.get("error", "未知錯誤")
-                    errors.append(f"第 {idx + 1} 筆資料計算失敗: {error_msg}")
-                    logger.warning(f"第 {idx + 1} 筆資料計算失敗: {safe_origin} -> {safe_destination}, 錯誤: {error_msg}")
-                    updated_records.append(record)
-                    continue
-
-                distance_km = route_detail.get("distance_km", 0) or 0
-                if distance_km == 0:
-                    errors.append(f"第 {idx + 1} 筆資料計算結果為 0 公里，請檢查地址是否正確: {origin_address} -> {destination_address}")
-                    logger.warning(f"第 {idx + 1} 筆資料計算結果為 0 公里: {safe_origin} -> {safe_destination}")
-                    updated_records.append(record)
-                    continue
-
-                # Playwright 截圖（完整路線頁）
-                screenshot_path: Path | None = None
-                try:
-                    temp_maps_dir = get_temp_maps_dir()  # Path
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
-                    screenshot_filename = f"gmap_route_{timestamp}.png"
-                    expected_path = temp_maps_dir / screenshot_filename
-
-                    logger.info(f"[TRY_PLAYWRIGHT] {safe_origin} -> {safe_destination}")
-                    screenshot_result = capture_route_screenshot_sync(
-                        origin=origin_address,
-                        destination=destination_address,
-                        output_path=str(expected_path),
-                        viewport_width=1920,
-                        viewport_height=1080,
-                    )
-
-                    if screenshot_result:
-                        # 有些實作會回傳字串路徑
-                        screenshot_path = Path(screenshot_result)
-                    else:
-                        screenshot_path = expected_path if expected_path.exists() else None
-
-                    # 驗證截圖檔案
-                    exists = False
-                    file_size = 0
-                    if screenshot_path:
-                        exists = os.path.exists(screenshot_path)
-                        if exists:
-                            file_size = os.path.getsize(screenshot_path)
-                            # 檢查檔案大小（必須 > 10KB）
-                            if file_size <= 10240:
-                                logger.warning(f"[PLAYWRIGHT_RESULT] 截圖檔案太小 ({file_size} bytes)，視為失敗")
-                                screenshot_path = None
-                                exists = False
-                                file_size = 0
-
-                    logger.info(f"[PLAYWRIGHT_RESULT] path={screenshot_path}, exists={exists}, size={file_size} bytes")
-
-                    if not exists or not screenshot_path:
-                        logger.warning("[FALLBACK_STATICMAP] Playwright 截圖失敗，回退使用靜態地圖")
-                        screenshot_path = None
-                    else:
-                        # 成功截圖後，統一加上 footer 樣式 (km + A/B 地址 + 時間)
-                        try:
-                            # 嘗試獲取 formatted address，如果沒有就用目前的 address
-                            # Playwright 截圖時通常已經經過解析，這裡是再次確認
-                            logger.info(f"[ANNOTATE] 為截圖加上標註資訊: {screenshot_path}")
-                            maps_service.annotate_map_info(
-                                str(screenshot_path),
-                                distance_km=distance_km,
-                                origin_addr=origin_address,
-                                dest_addr=destination_address,
-                                round_trip_km=route_detail.get("round_trip_km"),
-                                date_text=record.get("出差日期時間（開始）")
-                            )
-                        except Exception as ann_e:
-                            logger.error(f"[ANNOTATE] 標註截圖失敗: {str(ann_e)}")
-                            # 標註失敗不影響截圖結果，繼續使用原圖
-
-
-                except Exception as e:
-                    logger.warning(f"[FALLBACK_STATICMAP] Playwright 截圖過程發生錯誤: {str(e)}，回退使用靜態地圖")
-                    import traceback
-                    logger.debug(f"錯誤詳情: {traceback.format_exc()}")
-                    screenshot_path = None
+        if data.get("async"):
+            return _submit_job(records, fixed_origin, concurrency)
 
-                # 回退：Google Maps 官方樣式靜態地圖（含替代路線）
-                if not screenshot_path:
-                    logger.info("[FALLBACK_STATICMAP] 使用 Google Maps 官方樣式靜態地圖")
-                    alternative_polylines = route_detail.get("alternative_polylines", [])
-                    map_image_path = maps_service.download_static_map_with_polyline(
-                        route_detail["polyline"],
-                        origin_address,
-                        destination_address,
-                        distance_km=route_detail["distance_km"],
-                        alternative_polylines=alternative_polylines,
-                    )
-                    if map_image_path:
-                        map_path = Path(map_image_path) if not isinstance(map_image_path, Path) else map_image_path
-                        # 驗證靜態地圖檔案也存在
-                        if map_path.exists() and os.path.getsize(map_path) > 10240:
-                            screenshot_path = map_path
-                        else:
-                            logger.warning(f"[FALLBACK_STATICMAP] 靜態地圖檔案無效: {map_path}")
-                            screenshot_path = None
-
-                # 更新紀錄
-                record["OneWayKm"] = route_detail["distance_km"]
-                record["RoundTripKm"] = route_detail["round_trip_km"]
-                record["GoogleMapUrl"] = route_detail["map_url"]
-                record["StepCount"] = route_detail.get("step_count")
-                record["Polyline"] = route_detail.get("polyline")
-                record["RouteSteps"] = route_detail.get("route_steps_text")
-
-                record["OriginAddress"] = origin_address
-                record["DestinationAddress"] = destination_address
-
-                if "estimated_time" in route_detail:
-                    record["EstimatedTime"] = route_detail.get("estimated_time")
-
-                # 確保 StaticMapImage 是前端可用的相對路徑（前面有 /）
-                if screenshot_path and screenshot_path.exists() and os.path.getsize(screenshot_path) > 10240:
-                    relative_path = get_relative_path(str(screenshot_path))
-                    # 確保路徑前面有 /
-                    if not relative_path.startswith('/'):
-                        relative_path = '/' + relative_path
-                    record["StaticMapImage"] = relative_path
-                else:
-                    record["StaticMapImage"] = None
-                    logger.warning(f"第 {idx + 1} 筆資料地圖截圖失敗，StaticMapImage 設為 None")
-
-                updated_records.append(record)
-
-            except Exception as e:
-                logger.error(f"處理第 {idx + 1} 筆資料錯誤: {str(e)}")
-                errors.append(f"第 {idx + 1} 筆資料處理失敗: {str(e)}")
-                updated_records.append(record)
+        result = _run_batch(records, fixed_origin, concurrency=concurrency)
+        updated_records = result["records"]
+        errors = result["errors"]
+        # 結果回傳前端後才會匯出報表，圖片保留與背景工作結果相同的時間
+        janitor.hold([r.get("StaticMapImage") for r in updated_records], batch_jobs.retention_seconds)
 
         calculated_count = sum(
             1 for r in updated_records
@@ -404,11 +741,23 @@ def calculate_batch():
                 "total_count": len(updated_records),
                 "calculated_count": calculated_count,
                 "errors": errors,
+                "concurrency": concurrency,
+                "cache": {
+                    "directions_hits": result["directions_hits"],
+                    "directions_api_calls": result["directions_api_calls"],
+                    "unique_routes": result["unique_routes"],
+                    "shared_routes": result["shared_routes"],
+                    "places": result["places"],
+                    "stats": maps_service.cache_stats(),
+                },
             },
             "message": f"部分資料計算失敗: {len(errors)} 筆" if errors else f"成功計算 {calculated_count} 筆資料",
         }
 
-        logger.info(f"批次計算完成: {len(updated_records)} 筆, 成功 {calculated_count} 筆")
+        logger.info(
+            f"批次計算完成: {len(updated_records)} 筆, 成功 {calculated_count} 筆, "
+            f"路線快取命中 {result['directions_hits']} 次, 共用路線 {result['shared_routes']} 筆"
+        )
         return jsonify(response_data), 200
 
     except Exception as e:
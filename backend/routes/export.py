@@ -10,7 +10,7 @@ from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 from io import BytesIO
 from datetime import datetime
-from utils.path_manager import get_output_dir
+from utils.download_stream import spooled_buffer, stream_download
 from pathlib import Path
 import os
 
@@ -50,15 +50,19 @@ def export_excel():
                 'message': '沒有資料可匯出'
             }), 400
         
-        # 更新 Excel 檔案
-        output_path = excel_service.add_calculation_results(file_path, records)
+        # 更新 Excel 檔案（寫入暫存緩衝區後串流下載）
+        buffer = spooled_buffer()
+        try:
+            excel_service.write_calculation_results(file_path, records, buffer)
+        except Exception:
+            buffer.close()
+            raise
         
         # 回傳檔案
-        return send_file(
-            output_path,
-            as_attachment=True,
-            download_name=os.path.basename(output_path),
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        return stream_download(
+            buffer,
+            excel_service.export_filename(),
+            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
         
     except Exception as e:
@@ -96,15 +100,19 @@ def export_word():
                 'message': '沒有資料可匯出'
             }), 400
         
-        # 產生 Word 報表
-        word_path = word_service.generate_report(project_name, records, fixed_origin)
+        # 產生 Word 報表（寫入暫存緩衝區後串流下載）
+        buffer = spooled_buffer()
+        try:
+            filename = word_service.generate_report(project_name, records, fixed_origin, output=buffer)
+        except Exception:
+            buffer.close()
+            raise
         
         # 回傳檔案
-        return send_file(
-            word_path,
-            as_attachment=True,
-            download_name=os.path.basename(word_path),
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+        return stream_download(
+            buffer,
+            filename,
+            'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
         )
         
     except Exception as e:
@@ -144,47 +152,39 @@ def export_word_batch():
                 'message': '沒有資料可匯出'
             }), 400
         
-        # 產生所有 Word 報表
-        word_files = []
-        for project_name, records in projects.items():
-            try:
-                word_path = word_service.generate_report(project_name, records, fixed_origin)
-                word_files.append({
-                    'path': word_path,
-                    'name': os.path.basename(word_path)
-                })
-            except Exception as e:
-                logger.error(f"產生 {project_name} 報表錯誤: {str(e)}")
-                continue
-        
-        if not word_files:
-            return jsonify({
-                'status': 'error',
-                'message': '無法產生任何報表'
-            }), 500
-        
-        # 建立 ZIP 壓縮檔（使用相對路徑）
+        # 逐一產生 Word 報表並直接寫入 ZIP（ZIP 寫入暫存緩衝區後串流下載）
         import zipfile
         from datetime import datetime
         
-        output_dir = get_output_dir()
-        
         zip_filename = f"里程報表_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-        zip_path = output_dir / zip_filename
-        
-        with zipfile.ZipFile(str(zip_path), 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for word_file in word_files:
-                zipf.write(word_file['path'], word_file['name'])
+        buffer = spooled_buffer()
+        word_count = 0
+        try:
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                for project_name, records in projects.items():
+                    document = BytesIO()
+                    try:
+                        filename = word_service.generate_report(project_name, records, fixed_origin, output=document)
+                    except Exception as e:
+                        logger.error(f"產生 {project_name} 報表錯誤: {str(e)}")
+                        continue
+                    zipf.writestr(filename, document.getvalue())
+                    word_count += 1
+        except Exception:
+            buffer.close()
+            raise
+        
+        if not word_count:
+            buffer.close()
+            return jsonify({
+                'status': 'error',
+                'message': '無法產生任何報表'
+            }), 500
         
-        logger.info(f"成功產生 ZIP 壓縮檔: {zip_path}, 包含 {len(word_files)} 個 Word 檔案")
+        logger.info(f"成功產生 ZIP 壓縮檔: {zip_filename}, 包含 {word_count} 個 Word 檔案")
         
         # 回傳 ZIP 檔案
-        return send_file(
-            zip_path,
-            as_attachment=True,
-            download_name=zip_filename,
-            mimetype='application/zip'
-        )
+        return stream_download(buffer, zip_filename, 'application/zip')
         
     except Exception as e:
         logger.error(f"批次匯出 Word 錯誤: {str(e)}")
@@ -80,9 +80,9 @@ def upload_excel():
         safe_path = sanitize_path(get_relative_path(temp_path))
         logger.info(f"檔案已儲存至: {safe_path}")
         
-        # 解析 Excel
+        # 串流解析 Excel，邊讀邊依計畫別分組
         logger.info("開始解析 Excel 檔案...")
-        parse_result = excel_service.parse_excel(str(temp_path))
+        parse_result = excel_service.parse_excel_grouped(str(temp_path))
         logger.info(f"Excel 解析完成，結果: {parse_result.get('success', False)}")
         
         if not parse_result['success']:
@@ -94,11 +94,7 @@ def upload_excel():
                 'message': parse_result['error']
             }), 400
         
-        records = parse_result['data']
-        
-        # 依計畫別分組
-        logger.info(f"開始分組，共 {len(records)} 筆資料")
-        grouped_records = excel_service.group_by_project(records)
+        grouped_records = parse_result['data']
         logger.info(f"分組完成，共 {len(grouped_records)} 個計畫別")
         
         # 儲存檔案路徑到 session（用於後續處理）
@@ -155,8 +151,8 @@ def preview_data():
                 'message': '檔案不存在'
             }), 400
         
-        # 重新解析（如果需要）
-        parse_result = excel_service.parse_excel(file_path)
+        # 相同內容的檔案直接使用已解析快取
+        parse_result = excel_service.parse_excel_grouped(file_path)
         
         if not parse_result['success']:
             return jsonify({
@@ -164,8 +160,7 @@ def preview_data():
                 'message': parse_result['error']
             }), 400
         
-        # 依計畫別分組
-        grouped_records = excel_service.group_by_project(parse_result['data'])
+        grouped_records = parse_result['data']
         
         return jsonify({
             'status': 'success',
@@ -0,0 +1,206 @@
+"""
+批次計算背景工作服務
+送出後立即回傳 job id，由本機佇列與背景執行緒執行批次計算，前端輪詢進度
+（單一程序內運作，不依賴外部佇列服務）
+"""
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from loguru import logger
+
+
+class BatchJob:
+    """單一批次計算工作"""
+
+    def __init__(self, records, params):
+        self.job_id = uuid.uuid4().hex
+        self.records = records
+        self.params = params
+        self.total = len(records)
+        self.status = "queued"  # queued, running, completed, failed
+        self.error = None
+        self.summary = {}
+        self.created_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+
+        self._done = {}  # idx -> outcome
+        self._lock = threading.Lock()
+
+    @property
+    def is_active(self):
+        return self.status in ("queued", "running")
+
+    def record_done(self, idx, outcome):
+        """記錄單筆處理結果（由批次執行器回呼）"""
+        with self._lock:
+            self._done[idx] = outcome
+
+    def referenced_files(self):
+        """
+        取得此工作的紀錄引用的檔案（地圖圖片），供暫存檔清理略過
+
+        Returns:
+            list: 檔案路徑（紀錄中的相對路徑）
+        """
+        with self._lock:
+            done = [outcome["record"] for outcome in self._done.values()]
+        return [
+            record.get("StaticMapImage")
+            for record in list(self.records) + done
+            if isinstance(record, dict) and record.get("StaticMapImage")
+        ]
+
+    def to_dict(self):
+        """轉換為字典（包含部分結果）"""
+        with self._lock:
+            done = dict(self._done)
+
+        records = [done[i]["record"] if i in done else None for i in range(self.total)]
+        errors = [err for i in sorted(done) for err in done[i]["errors"]]
+        calculated_count = sum(
+            1 for r in records
+            if r is not None and r.get("OneWayKm") is not None
+        )
+
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total_count": self.total,
+            "processed_count": len(done),
+            "calculated_count": calculated_count,
+            "progress": round(len(done) / self.total, 4) if self.total else 1.0,
+            "records": records,
+            "errors": errors,
+            "error": self.error,
+            "summary": self.summary,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class BatchJobManager:
+    """批次工作管理（本機佇列 + 背景執行緒）"""
+
+    def __init__(self, runner, workers=1, retention_seconds=3600):
+        """
+        Args:
+            runner: 批次執行函式 runner(records, on_record_done=..., **params) -> dict
+            workers: 背景執行緒數
+            retention_seconds: 完成後的工作保留秒數
+        """
+        self.runner = runner
+        self.workers = max(int(workers), 1)
+        self.retention_seconds = retention_seconds
+
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, records, app=None, **params):
+        """
+        送出批次工作
+
+        Args:
+            records: 紀錄列表
+            app: Flask app（背景執行緒會推入其 app context）
+            **params: 傳給 runner 的參數（fixed_origin, concurrency 等）
+
+        Returns:
+            BatchJob: 新建立的工作
+        """
+        job = BatchJob(records, params)
+        with self._lock:
+            self._prune()
+            self._jobs[job.job_id] = job
+        self._ensure_workers()
+        self._queue.put((job, app))
+        logger.info(f"[BATCH_JOB] 已排入工作 {job.job_id}: {job.total} 筆")
+        return job
+
+    def get(self, job_id):
+        """取得工作，不存在時回傳 None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_jobs(self):
+        """取得尚未完成的工作"""
+        with self._lock:
+            return [job for job in self._jobs.values() if job.is_active]
+
+    def retained_jobs(self):
+        """取得仍保留的工作（含已完成、結果仍可查詢者）"""
+        with self._lock:
+            self._prune()
+            return list(self._jobs.values())
+
+    def wait(self, job_id, timeout=None):
+        """
+        等待工作完成（測試與命令列使用）
+
+        Returns:
+            BatchJob: 工作（逾時仍回傳目前狀態）
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        job = self.get(job_id)
+        while job and job.is_active:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(0.02)
+        return job
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"batch-job-{len(self._threads) + 1}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker_loop(self):
+        while True:
+            job, app = self._queue.get()
+            try:
+                if app is not None:
+                    with app.app_context():
+                        self._execute(job)
+                else:
+                    self._execute(job)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, job):
+        job.status = "running"
+        job.started_at = datetime.now()
+        logger.info(f"[BATCH_JOB] 開始執行工作 {job.job_id}")
+        try:
+            result = self.runner(job.records, on_record_done=job.record_done, **job.params) or {}
+            job.summary = {k: v for k, v in result.items() if k not in ("records", "errors")}
+            job.status = "completed"
+            logger.info(f"[BATCH_JOB] 工作完成 {job.job_id}")
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            logger.error(f"[BATCH_JOB] 工作失敗 {job.job_id}: {str(e)}")
+        finally:
+            job.finished_at = datetime.now()
+            # 釋放原始資料，結果已保存在各筆 outcome 中
+            job.records = []
+
+    def _prune(self):
+        now = datetime.now()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at and (now - job.finished_at).total_seconds() > self.retention_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
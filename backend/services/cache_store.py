@@ -0,0 +1,271 @@
+"""
+外部 API 結果快取服務
+記憶體層（LRU + TTL）在前，資料庫層（extensions.db，預設 SQLite）在後做持久保存，
+重啟後仍可命中；支援負向快取（查無結果）與命中/未命中計數。
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import has_app_context
+from loguru import logger
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models.cache_entry import CacheEntry
+
+
+def normalize_query(text) -> str:
+    """
+    正規化查詢文字：全形轉半形（NFKC）、去頭尾空白、合併連續空白、英文轉小寫
+
+    Args:
+        text: 查詢文字
+
+    Returns:
+        str: 正規化後的文字
+    """
+    if text is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(text))
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.lower()
+
+
+def make_cache_key(key_parts) -> tuple[str, str]:
+    """
+    將查詢條件組成快取鍵
+
+    Args:
+        key_parts: 查詢條件（tuple/list），字串會先正規化
+
+    Returns:
+        tuple: (SHA-256 鍵值, 正規化後的查詢文字)
+    """
+    normalized = [
+        normalize_query(p) if isinstance(p, str) or p is None else str(p)
+        for p in key_parts
+    ]
+    query_text = "\x1f".join(normalized)
+    return hashlib.sha256(query_text.encode("utf-8")).hexdigest(), query_text
+
+
+class PersistentCache:
+    """兩層式 API 結果快取（記憶體 LRU + 資料庫）"""
+
+    def __init__(self, namespace, ttl_seconds, negative_ttl_seconds=None,
+                 max_memory_items=2048, use_db=True, db_retry_seconds=60):
+        """
+        Args:
+            namespace: 快取分類名稱（例如 geocode）
+            ttl_seconds: 正向結果存活秒數
+            negative_ttl_seconds: 負向結果（查無資料）存活秒數，None 表示不快取負向結果
+            max_memory_items: 記憶體層最多保留筆數（LRU 淘汰）
+            use_db: 是否啟用資料庫持久層
+            db_retry_seconds: 資料庫層無法使用時，暫停幾秒後再重試
+        """
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_memory_items = max(int(max_memory_items), 1)
+        self.use_db = use_db
+        self.db_retry_seconds = db_retry_seconds
+
+        self._memory = OrderedDict()  # key -> (expires_ts, payload_json)
+        self._lock = threading.Lock()
+        self._ready_engines = set()
+        self._db_retry_at = None  # 資料庫層失敗後，下次可重試的 time.monotonic()
+        self._counters = {
+            "hits": 0,
+            "memory_hits": 0,
+            "db_hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    # =========================
+    # Public API
+    # =========================
+    def get(self, key_parts):
+        """
+        查詢快取
+
+        Args:
+            key_parts: 查詢條件（例如 (地址, 語言)）
+
+        Returns:
+            tuple: (是否命中, 結果)；負向快取命中時結果為 None
+        """
+        cache_key, _ = make_cache_key(key_parts)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(cache_key)
+            if entry is not None:
+                expires_ts, payload = entry
+                if expires_ts > now:
+                    self._memory.move_to_end(cache_key)
+                    self._count_hit("memory_hits", payload)
+                    return True, self._decode(payload)
+                del self._memory[cache_key]
+
+        found, payload, expires_ts = self._db_get(cache_key)
+        if found:
+            with self._lock:
+                self._remember(cache_key, expires_ts, payload)
+                self._count_hit("db_hits", payload)
+            return True, self._decode(payload)
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return False, None
+
+    def set(self, key_parts, value):
+        """
+        寫入快取
+
+        Args:
+            key_parts: 查詢條件
+            value: 結果（需可 JSON 序列化）；None 代表查無結果（負向快取）
+        """
+        if value is None and self.negative_ttl_seconds is None:
+            return
+
+        ttl = self.ttl_seconds if value is not None else self.negative_ttl_seconds
+        cache_key, query_text = make_cache_key(key_parts)
+        payload = None if value is None else json.dumps(value, ensure_ascii=False)
+        expires_ts = time.time() + ttl
+
+        with self._lock:
+            self._remember(cache_key, expires_ts, payload)
+            self._counters["stores"] += 1
+
+        self._db_set(cache_key, query_text, payload, expires_ts)
+
+    def stats(self):
+        """
+        取得快取統計
+
+        Returns:
+            dict: 命中/未命中計數與命中率
+        """
+        with self._lock:
+            data = dict(self._counters)
+            data["memory_items"] = len(self._memory)
+        lookups = data["hits"] + data["misses"]
+        data["hit_rate"] = round(data["hits"] / lookups, 4) if lookups else 0.0
+        data["persistent"] = self.use_db and self._db_retry_at is None
+        return data
+
+    def clear_memory(self):
+        """清空記憶體層（資料庫層保留）"""
+        with self._lock:
+            self._memory.clear()
+
+    # =========================
+    # Memory tier
+    # =========================
+    def _remember(self, cache_key, expires_ts, payload):
+        self._memory[cache_key] = (expires_ts, payload)
+        self._memory.move_to_end(cache_key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _count_hit(self, tier, payload):
+        self._counters["hits"] += 1
+        self._counters[tier] += 1
+        if payload is None:
+            self._counters["negative_hits"] += 1
+
+    @staticmethod
+    def _decode(payload):
+        # 每次解碼一份新物件，避免呼叫端修改到快取內容
+        return None if payload is None else json.loads(payload)
+
+    # =========================
+    # Database tier
+    # =========================
+    def _db_usable(self):
+        if not self.use_db or not has_app_context():
+            return False
+        if self._db_retry_at is not None and time.monotonic() < self._db_retry_at:
+            return False
+        try:
+            engine = db.engine
+            if str(engine.url) not in self._ready_engines:
+                CacheEntry.__table__.create(engine, checkfirst=True)
+                self._ready_engines.add(str(engine.url))
+        except Exception as e:
+            self._db_retry_at = time.monotonic() + self.db_retry_seconds
+            logger.warning(
+                f"[CACHE:{self.namespace}] 資料庫快取層無法使用，改用記憶體快取，"
+                f"{self.db_retry_seconds} 秒後重試: {str(e)}"
+            )
+            return False
+        if self._db_retry_at is not None:
+            self._db_retry_at = None
+            logger.info(f"[CACHE:{self.namespace}] 資料庫快取層已恢復")
+        return True
+
+    def _db_get(self, cache_key):
+        if not self._db_usable():
+            return False, None, None
+        table = CacheEntry.__table__
+        try:
+            with db.engine.begin() as conn:
+                row = conn.execute(
+                    select(table.c.id, table.c.payload, table.c.is_negative, table.c.expires_at)
+                    .where(table.c.namespace == self.namespace, table.c.cache_key == cache_key)
+                ).first()
+                if row is None or row.expires_at <= datetime.utcnow():
+                    return False, None, None
+                conn.execute(
+                    update(table).where(table.c.id == row.id)
+                    .values(hit_count=table.c.hit_count + 1)
+                )
+            payload = None if row.is_negative else row.payload
+            expires_ts = time.time() + (row.expires_at - datetime.utcnow()).total_seconds()
+            return True, payload, expires_ts
+        except Exception as e:
+            logger.warning(f"[CACHE:{self.namespace}] 讀取資料庫快取失敗: {str(e)}")
+            return False, None, None
+
+    def _db_set(self, cache_key, query_text, payload, expires_ts):
+        if not self._db_usable():
+            return
+        table = CacheEntry.__table__
+        now = datetime.utcnow()
+        values = {
+            "query_text": query_text,
+            "payload": payload,
+            "is_negative": payload is None,
+            "expires_at": now + timedelta(seconds=max(expires_ts - time.time(), 0)),
+            "updated_at": now,
+        }
+        where = (table.c.namespace == self.namespace) & (table.c.cache_key == cache_key)
+        try:
+            with db.engine.begin() as conn:
+                result = conn.execute(update(table).where(where).values(**values))
+                if result.rowcount:
+                    return
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(insert(table).values(
+                        namespace=self.namespace, cache_key=cache_key,
+                        hit_count=0, created_at=now, **values
+                    ))
+            except IntegrityError:
+                # 其他執行緒剛好先寫入，改為更新
+                with db.engine.begin() as conn:
+                    conn.execute(update(table).where(where).values(**values))
+        except Exception as e:
+            logger.warning(f"[CACHE:{self.namespace}] 寫入資料庫快取失敗: {str(e)}")
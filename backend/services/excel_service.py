@@ -1,15 +1,63 @@
 """
 Excel 處理服務
 """
+import numpy as np
 import pandas as pd
 import openpyxl
-from openpyxl import load_workbook
+from pandas.tseries.api import guess_datetime_format
+from openpyxl import Workbook, load_workbook
 from datetime import datetime
+from itertools import zip_longest
 from loguru import logger
+from services.workbook_cache import file_digest, parsed_workbook_cache
 from utils.path_manager import get_output_dir
 from pathlib import Path
 import os
 
+# 串流解析時每批轉換日期的列數
+EXCEL_CHUNK_ROWS = int(os.getenv("EXCEL_CHUNK_ROWS", "1000"))
+# 匯出模式（full / streaming / auto）與 auto 改用串流匯出的筆數門檻；預設保留格式，串流需明確指定
+EXCEL_EXPORT_MODE = os.getenv("EXCEL_EXPORT_MODE", "full")
+EXCEL_STREAM_EXPORT_MIN_ROWS = int(os.getenv("EXCEL_STREAM_EXPORT_MIN_ROWS", "5000"))
+# 寫回 Excel 的計算結果欄位（依此順序新增到標題列）
+EXPORT_COLUMNS = ['OneWayKm', 'RoundTripKm', 'GoogleMapUrl', 'StaticMapImage', 'IsDriving', 'StepCount', 'Polyline', 'RouteSteps']
+
+
+def _datetime_to_iso(series):
+    """
+    將日期時間欄位整欄轉為 ISO 字串（與 pd.Timestamp.isoformat() 相同），NaT 轉為 None
+
+    Args:
+        series: datetime64 型別的 pd.Series
+
+    Returns:
+        np.ndarray: object 陣列
+    """
+    values = series.to_numpy()
+    result = np.full(len(values), None, dtype=object)
+    valid = ~np.isnat(values)
+    if not valid.any():
+        return result
+    values = values[valid]
+
+    # isoformat 只在有小數秒時才輸出微秒（或奈秒）位數
+    seconds = values.astype('datetime64[s]')
+    fraction_ns = (values - seconds).astype('timedelta64[ns]').astype(np.int64)
+    iso = np.datetime_as_string(seconds, unit='s').astype(object)
+    has_us = (fraction_ns != 0) & (fraction_ns % 1000 == 0)
+    has_ns = fraction_ns % 1000 != 0
+    if has_us.any():
+        iso[has_us] = np.datetime_as_string(values[has_us].astype('datetime64[us]'), unit='us')
+    if has_ns.any():
+        iso[has_ns] = np.datetime_as_string(values[has_ns].astype('datetime64[ns]'), unit='ns')
+    result[valid] = iso
+    return result
+
+
+def _is_blank(value):
+    # 與 pandas 推斷日期格式時相同：略過 None、NaN、NaT 與空字串
+    return value is None or value is pd.NaT or value == '' or (isinstance(value, float) and value != value)
+
 
 class ExcelService:
     """Excel 處理服務類別"""
@@ -20,6 +68,25 @@ class ExcelService:
             '出差日期時間（結束）', '目的地名稱'
         ]
         # IsDriving 不從 Excel 讀取，由前端上傳後設定
+
+        # 標準化欄位名稱（支援中英文）
+        self.column_mapping = {
+            '部門': '部門',
+            '姓名': '姓名',
+            '計畫別': '計畫別',
+            'ProjectName': '計畫別',
+            '起點名稱': '起點名稱',
+            '出差日期時間（開始）': '出差日期時間（開始）',
+            '出差日期時間（結束）': '出差日期時間（結束）',
+            '目的地名稱': '目的地名稱'
+        }
+        self.date_columns = ['出差日期時間（開始）', '出差日期時間（結束）']
+        # 不從 Excel 讀取的欄位（IsDriving 一律預設為 'N'，由使用者勾選）
+        self.ignored_columns = ['IsDriving', '是否自駕']
+        # 計算結果欄位（初始為空）
+        self.result_columns = [
+            'OneWayKm', 'RoundTripKm', 'GoogleMapUrl', 'StaticMapImage', 'StepCount', 'Polyline', 'RouteSteps'
+        ]
     
     def _get_sort_key(self, date_value):
         """
@@ -53,107 +120,102 @@ class ExcelService:
         
         return datetime.min
     
-    def parse_excel(self, file_path):
+    def iter_records(self, file_path, chunk_size=None):
         """
-        解析 Excel 檔案
-        
+        串流解析 Excel 檔案（openpyxl read_only 逐列讀取，不載入整個工作簿）
+
+        欄位標準化與 pd.read_excel 整份解析相同（欄名、空白列、日期 ISO 字串）；每讀取 chunk_size 列整批轉換日期欄位後依序產出。
+        儲存格保留原始型別（整數不會因同欄有空白而變成浮點數）；各欄的型別只推斷一次
+        （日期欄位的格式依第一個非空值決定，數值欄位依第一批判斷是否為浮點數），之後每批沿用，
+        同一欄的結果不會因資料落在哪一批而不同。
+
         Args:
             file_path: Excel 檔案路徑
-            
-        Returns:
-            dict: 包含解析結果和資料
+            chunk_size: 每批列數（None 表示使用 EXCEL_CHUNK_ROWS）
+
+        Yields:
+            dict: 標準化後的單筆資料
+
+        Raises:
+            ValueError: 缺少必要欄位（在產出第一筆資料前）
         """
+        chunk_size = chunk_size or EXCEL_CHUNK_ROWS
+        wb = load_workbook(file_path, read_only=True, data_only=True)
         try:
-            logger.info(f"開始讀取 Excel 檔案: {file_path}")
-            # 讀取 Excel
-            df = pd.read_excel(file_path, engine='openpyxl')
-            logger.info(f"Excel 檔案讀取完成，共 {len(df)} 行, {len(df.columns)} 欄")
-            
-            # 標準化欄位名稱（支援中英文）
-            # 注意：IsDriving 和「是否自駕」不從 Excel 讀取，會被移除
-            column_mapping = {
-                '部門': '部門',
-                '姓名': '姓名',
-                '計畫別': '計畫別',
-                'ProjectName': '計畫別',
-                '起點名稱': '起點名稱',
-                '出差日期時間（開始）': '出差日期時間（開始）',
-                '出差日期時間（結束）': '出差日期時間（結束）',
-                '目的地名稱': '目的地名稱'
-            }
-            
-            # 重新命名欄位
-            df = df.rename(columns=column_mapping)
-            
-            # 檢查必要欄位
-            missing_columns = []
-            for col in self.required_columns:
-                if col not in df.columns:
-                    missing_columns.append(col)
-            
+            rows = wb.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            columns = [self.column_mapping.get(name, name) for name in self._header_names(header or ())]
+
+            missing_columns = [col for col in self.required_columns if col not in columns]
             if missing_columns:
-                return {
-                    'success': False,
-                    'error': f'缺少必要欄位: {", ".join(missing_columns)}',
-                    'data': None
-                }
-            
-            # 處理日期時間欄位
-            if '出差日期時間（開始）' in df.columns:
-                df['出差日期時間（開始）'] = pd.to_datetime(
-                    df['出差日期時間（開始）'], errors='coerce'
-                )
-            if '出差日期時間（結束）' in df.columns:
-                df['出差日期時間（結束）'] = pd.to_datetime(
-                    df['出差日期時間（結束）'], errors='coerce'
-                )
-            
-            # IsDriving 不從 Excel 讀取，一律預設為 'N'（由前端上傳後由使用者勾選）
-            # 如果 Excel 中有 IsDriving 欄位，忽略它
-            if 'IsDriving' in df.columns:
-                df = df.drop(columns=['IsDriving'])
-            if '是否自駕' in df.columns:
-                df = df.drop(columns=['是否自駕'])
-            
-            # 一律設定為 'N'（預設非自駕）
-            df['IsDriving'] = 'N'
-            
-            # 新增計算結果欄位（初始為空）
-            df['OneWayKm'] = None
-            df['RoundTripKm'] = None
-            df['GoogleMapUrl'] = None
-            df['StaticMapImage'] = None
-            df['StepCount'] = None
-            df['Polyline'] = None
-            df['RouteSteps'] = None
-            
-            # 轉換為字典列表，並處理 NaT 值
-            records = []
-            for _, row in df.iterrows():
-                record = {}
-                for col in df.columns:
-                    value = row[col]
-                    # 處理 NaT (Not a Time) 值
-                    if pd.isna(value):
-                        record[col] = None
-                    # 處理 datetime 物件，轉換為字串或 None
-                    elif isinstance(value, pd.Timestamp):
-                        if pd.isna(value):
-                            record[col] = None
-                        else:
-                            record[col] = value.isoformat()
-                    else:
-                        record[col] = value
-                records.append(record)
-            
-            logger.info(f"成功解析 Excel 檔案: {len(records)} 筆資料")
-            
+                raise ValueError(f'缺少必要欄位: {", ".join(missing_columns)}')
+
+            width = len(columns)
+            column_types = {'date_formats': {}, 'float_columns': None}
+            chunk = []
+            blank_rows = 0
+            for row in rows:
+                values = (tuple(row) + (None,) * width)[:width]
+                if all(value is None or value == '' for value in values):
+                    # 與 pd.read_excel 相同：中間的空白列保留，檔尾的空白列忽略
+                    blank_rows += 1
+                    continue
+                chunk.extend([(None,) * width] * blank_rows)
+                blank_rows = 0
+                chunk.append(values)
+                if len(chunk) >= chunk_size:
+                    yield from self._normalize_chunk(columns, chunk, column_types)
+                    chunk = []
+            if chunk:
+                yield from self._normalize_chunk(columns, chunk, column_types)
+        finally:
+            wb.close()
+
+    def parse_excel_grouped(self, file_path):
+        """
+        串流解析 Excel 檔案並邊讀邊依計畫別分組（上傳、預覽時使用）
+
+        以檔案內容的 SHA-256 查詢已解析快取，相同內容的檔案不再重新解析。
+
+        Args:
+            file_path: Excel 檔案路徑
+
+        Returns:
+            dict: 包含解析結果、依計畫別分組的資料與總筆數
+        """
+        try:
+            digest = file_digest(file_path)
+            cached = parsed_workbook_cache.get(digest)
+            if cached is not None:
+                logger.info(f"使用已解析快取: {file_path}（{len(cached)} 筆資料）")
+                records = cached
+            else:
+                logger.info(f"開始串流讀取 Excel 檔案: {file_path}")
+                records = self.iter_records(file_path)
+
+            grouped = {}
+            parsed = []
+            for record in records:
+                grouped.setdefault(record.get('計畫別', '未分類'), []).append(record)
+                parsed.append(record)
+            if cached is None:
+                parsed_workbook_cache.put(digest, parsed)
+            total_count = len(parsed)
+            self._sort_groups(grouped)
+            logger.info(f"成功解析 Excel 檔案: {total_count} 筆資料，{len(grouped)} 個計畫別")
+
             return {
                 'success': True,
-                'data': records,
-                'total_count': len(records)
+                'data': grouped,
+                'total_count': total_count
+            }
+
+        except ValueError as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'data': None
             }
-            
         except Exception as e:
             logger.error(f"解析 Excel 檔案錯誤: {str(e)}")
             return {
@@ -161,7 +223,95 @@ class ExcelService:
                 'error': f'解析 Excel 檔案失敗: {str(e)}',
                 'data': None
             }
-    
+
+    @staticmethod
+    def _header_names(header):
+        # 與 pd.read_excel 相同：空白標題為 Unnamed: N，重複標題加上 .1、.2
+        names = []
+        seen = {}
+        for idx, name in enumerate(header):
+            name = f'Unnamed: {idx}' if name is None or name == '' else name
+            base = name
+            while name in seen:
+                seen[base] += 1
+                name = f'{base}.{seen[base]}'
+            seen[name] = 0
+            names.append(name)
+        return names
+
+    def _infer_column_types(self, columns, chunk, column_types):
+        """
+        推斷各欄型別（已決定的欄位不再變更）
+
+        - 日期欄位：與整欄 pd.to_datetime 相同，依第一個非空值決定格式（字串時以 pandas 推斷格式，
+          否則逐格解析），之後每批都使用同一格式
+        - 數值欄位：第一批的非空值全為數值且含浮點數時視為浮點數欄位（同 pandas 的 float64 欄），
+          之後每批的整數都轉為浮點數
+        """
+        date_formats = column_types['date_formats']
+        for col in self.date_columns:
+            if col not in columns:
+                continue
+            idx = columns.index(col)
+            if idx in date_formats:
+                continue
+            first = next((row[idx] for row in chunk if not _is_blank(row[idx])), None)
+            if first is not None:
+                date_formats[idx] = guess_datetime_format(first) if type(first) is str else None
+
+        if column_types['float_columns'] is None:
+            float_columns = set()
+            for idx in range(len(columns)):
+                values = [row[idx] for row in chunk if not _is_blank(row[idx])]
+                numbers = [value for value in values if isinstance(value, (int, float)) and not isinstance(value, bool)]
+                if numbers and len(numbers) == len(values) and any(isinstance(value, float) for value in numbers):
+                    float_columns.add(idx)
+            column_types['float_columns'] = float_columns
+
+    def _normalize_chunk(self, columns, chunk, column_types):
+        # 整批轉換日期欄位（沿用已推斷的格式），其餘欄位只處理空值、日期時間與浮點數欄位
+        self._infer_column_types(columns, chunk, column_types)
+        converted = {}
+        for col in self.date_columns:
+            if col in columns:
+                idx = columns.index(col)
+                date_format = column_types['date_formats'].get(idx) or 'mixed'
+                series = pd.to_datetime(
+                    pd.Series([row[idx] for row in chunk], dtype=object), errors='coerce', format=date_format
+                )
+                converted[idx] = _datetime_to_iso(series)
+
+        float_columns = column_types['float_columns']
+
+        for row_number, row in enumerate(chunk):
+            record = {}
+            for idx, col in enumerate(columns):
+                if col in self.ignored_columns:
+                    continue
+                if idx in converted:
+                    value = converted[idx][row_number]
+                else:
+                    value = row[idx]
+                    if isinstance(value, float) and value != value:
+                        value = None
+                    elif isinstance(value, datetime):
+                        value = value.isoformat()
+                    elif type(value) is int and idx in float_columns:
+                        value = float(value)
+                record[col] = value
+            record['IsDriving'] = 'N'
+            for col in self.result_columns:
+                record[col] = None
+            yield record
+
+    def _sort_groups(self, grouped):
+        # 每個計畫別內部依出差日期排序
+        for project_name in grouped:
+            grouped[project_name].sort(
+                key=lambda x: self._get_sort_key(x.get('出差日期時間（開始）')),
+                reverse=False
+            )
+
     def group_by_project(self, records):
         """
         依計畫別分組
@@ -182,14 +332,9 @@ class ExcelService:
                     grouped[project_name] = []
                 
                 grouped[project_name].append(record)
-            
-            # 每個計畫別內部依出差日期排序
-            for project_name in grouped:
-                grouped[project_name].sort(
-                    key=lambda x: self._get_sort_key(x.get('出差日期時間（開始）')),
-                    reverse=False
-                )
-            
+
+            self._sort_groups(grouped)
+
             logger.info(f"成功分組: {len(grouped)} 個計畫別")
             
             return grouped
@@ -198,67 +343,126 @@ class ExcelService:
             logger.error(f"分組錯誤: {str(e)}")
             return {}
     
-    def add_calculation_results(self, file_path, records):
+    def add_calculation_results(self, file_path, records, mode=None):
         """
-        將計算結果寫回 Excel
+        將計算結果寫回 Excel，存到 output/
         
         Args:
             file_path: 原始 Excel 檔案路徑
             records: 包含計算結果的資料列表
+            mode: 匯出模式（見 write_calculation_results）
             
         Returns:
             str: 更新後的 Excel 檔案路徑
         """
+        output_path = get_output_dir() / self.export_filename()
+        self.write_calculation_results(file_path, records, output_path, mode)
+        return str(output_path)
+
+    def export_filename(self):
+        """匯出檔名（updated_時間戳記.xlsx）"""
+        return f"updated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+
+    def write_calculation_results(self, file_path, records, output, mode=None):
+        """
+        將計算結果寫回 Excel
+        
+        Args:
+            file_path: 原始 Excel 檔案路徑
+            records: 包含計算結果的資料列表
+            output: 輸出檔案路徑或可寫入的檔案物件
+            mode: 'full'（載入整個工作簿後修改，保留格式）、'streaming'（read_only 逐列讀取、
+                  write_only 逐列寫出，記憶體用量不隨列數增加，但不保留格式）或 'auto'（依筆數決定）；
+                  None 表示使用 EXCEL_EXPORT_MODE
+        """
         try:
-            # 讀取原始 Excel
-            wb = load_workbook(file_path)
-            ws = wb.active
-            
-            # 找到欄位索引
-            headers = [cell.value for cell in ws[1]]
-            
-            # 新增欄位（如果不存在）
-            new_columns = ['OneWayKm', 'RoundTripKm', 'GoogleMapUrl', 'StaticMapImage', 'IsDriving', 'StepCount', 'Polyline', 'RouteSteps']
-            for col in new_columns:
-                if col not in headers:
-                    headers.append(col)
-                    ws.cell(row=1, column=len(headers), value=col)
-            
-            # 建立欄位索引對應
-            col_index = {col: idx + 1 for idx, col in enumerate(headers)}
-            
-            # 更新資料
-            for idx, record in enumerate(records, start=2):
-                if 'OneWayKm' in record and record['OneWayKm'] is not None:
-                    ws.cell(row=idx, column=col_index['OneWayKm'], value=record['OneWayKm'])
-                if 'RoundTripKm' in record and record['RoundTripKm'] is not None:
-                    ws.cell(row=idx, column=col_index['RoundTripKm'], value=record['RoundTripKm'])
-                if 'GoogleMapUrl' in record and record['GoogleMapUrl']:
-                    ws.cell(row=idx, column=col_index['GoogleMapUrl'], value=record['GoogleMapUrl'])
-                if 'StaticMapImage' in record and record['StaticMapImage']:
-                    ws.cell(row=idx, column=col_index['StaticMapImage'], value=record['StaticMapImage'])
-                if 'IsDriving' in record:
-                    ws.cell(row=idx, column=col_index['IsDriving'], value=record['IsDriving'])
-                if 'StepCount' in record and record['StepCount'] is not None:
-                    ws.cell(row=idx, column=col_index['StepCount'], value=record['StepCount'])
-                if 'Polyline' in record and record['Polyline']:
-                    ws.cell(row=idx, column=col_index['Polyline'], value=record['Polyline'])
-                if 'RouteSteps' in record and record['RouteSteps']:
-                    ws.cell(row=idx, column=col_index['RouteSteps'], value=record['RouteSteps'])
-            
-            # 儲存更新後的檔案
-            output_dir = get_output_dir()
-            
-            output_filename = f"updated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            output_path = output_dir / output_filename
-            
-            wb.save(str(output_path))
-            logger.info(f"成功更新 Excel 檔案: {str(output_path)}")
-            
-            return str(output_path)
+            mode = (mode or EXCEL_EXPORT_MODE).lower()
+            if mode == 'auto':
+                mode = 'streaming' if len(records) >= EXCEL_STREAM_EXPORT_MIN_ROWS else 'full'
+
+            if mode == 'streaming':
+                logger.warning(f"Excel 以串流模式匯出（{len(records)} 筆），不保留原始檔案的格式、欄寬與樣式")
+                self._write_results_streaming(file_path, records, output)
+            else:
+                self._write_results_full(file_path, records, output)
+            logger.info(f"成功更新 Excel 檔案（{mode}）: {output if isinstance(output, (str, Path)) else '串流下載'}")
             
         except Exception as e:
             logger.error(f"更新 Excel 檔案錯誤: {str(e)}")
             raise
 
+    @staticmethod
+    def _result_values(record):
+        # 各計算結果欄位要寫入的值（沒有結果的欄位保留原本儲存格）
+        values = {}
+        for col in EXPORT_COLUMNS:
+            if col not in record:
+                continue
+            value = record[col]
+            # 數值欄位與 IsDriving 只略過 None（ws.cell 傳入 None 不會改動儲存格），文字欄位略過空字串
+            if col in ('OneWayKm', 'RoundTripKm', 'StepCount', 'IsDriving'):
+                if value is not None:
+                    values[col] = value
+            elif value:
+                values[col] = value
+        return values
+
+    @staticmethod
+    def _export_headers(headers):
+        # 新增欄位（如果不存在），回傳完整標題與欄位索引（0 起算）
+        headers = list(headers)
+        for col in EXPORT_COLUMNS:
+            if col not in headers:
+                headers.append(col)
+        return headers, {col: idx for idx, col in enumerate(headers)}
+
+    def _write_results_full(self, file_path, records, output):
+        # 讀取原始 Excel
+        wb = load_workbook(file_path)
+        ws = wb.active
+        
+        # 找到欄位索引
+        original = [cell.value for cell in ws[1]]
+        headers, col_index = self._export_headers(original)
+        for idx in range(len(original), len(headers)):
+            ws.cell(row=1, column=idx + 1, value=headers[idx])
+        
+        # 更新資料
+        for row, record in enumerate(records, start=2):
+            for col, value in self._result_values(record).items():
+                ws.cell(row=row, column=col_index[col] + 1, value=value)
+        
+        wb.save(output)
+
+    def _write_results_streaming(self, file_path, records, output):
+        source = load_workbook(file_path, read_only=True)
+        target = Workbook(write_only=True)
+        try:
+            active_title = source.active.title
+            for sheet_index, ws in enumerate(source.worksheets):
+                out = target.create_sheet(ws.title)
+                if ws.title != active_title:
+                    # 其他工作表照原樣複製
+                    for values in ws.iter_rows(values_only=True):
+                        out.append(values)
+                    continue
+
+                target.active = sheet_index
+                rows = ws.iter_rows(values_only=True)
+                headers, col_index = self._export_headers(next(rows, ()))
+                out.append(headers)
+                width = len(headers)
 
+                # 原始資料列與紀錄依序對應；任一方較多時照舊保留或補上新列
+                for values, record in zip_longest(rows, records):
+                    values = list(values or ())
+                    if record is not None:
+                        updates = self._result_values(record)
+                        if updates:
+                            values.extend([None] * (width - len(values)))
+                            for col, value in updates.items():
+                                values[col_index[col]] = value
+                    out.append(values)
+            target.save(output)
+        finally:
+            source.close()
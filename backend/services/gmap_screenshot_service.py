@@ -1,13 +1,22 @@
 """
 Google Maps 路線截圖服務
 使用 Playwright 截取 Google Maps 完整路線頁面（包含左側面板和右側地圖）
+
+同步呼叫透過長駐的瀏覽器池（BrowserPool）執行：N 個 Chromium × 每個 M 個 context，
+由專屬 event loop 執行緒持有，避免每筆紀錄都重新啟動瀏覽器。
 """
 from pathlib import Path
 from typing import Optional
 from urllib.parse import quote
 from loguru import logger
 import asyncio
+import atexit
+import concurrent.futures
+import hashlib
 import os
+import re
+import threading
+import time
 
 try:
     from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
@@ -16,6 +25,237 @@ except ImportError:
     PLAYWRIGHT_AVAILABLE = False
     logger.warning("Playwright 未安裝，無法使用 Google Maps 截圖功能")
 
+    class PlaywrightTimeoutError(Exception):
+        """Playwright 未安裝時的佔位例外"""
+
+
+BROWSER_LAUNCH_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--disable-dev-shm-usage',
+    '--no-sandbox',
+]
+BROWSER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# 地圖就緒偵測：等待上限（取代原本固定 3 + 1 秒）、圖磚網路靜止時間、輪詢間隔
+READY_TIMEOUT_MS = int(os.getenv("SCREENSHOT_READY_TIMEOUT_MS", "4000"))
+READY_QUIET_MS = int(os.getenv("SCREENSHOT_READY_QUIET_MS", "400"))
+READY_POLL_MS = 100
+# 地圖圖磚請求（向量/點陣圖磚、衛星圖）
+TILE_URL_PATTERN = re.compile(r"/maps/vt|/vt\?|/vt/|khms\d*\.google|/kh\?|/maps/api/js/.*Tile", re.IGNORECASE)
+# 左側路線面板（第一條建議路線）
+ROUTE_PANEL_SELECTOR = '[id^="section-directions-trip"], div[role="main"] [data-trip-index]'
+
+
+class TileRequestTracker:
+    """追蹤頁面上進行中的地圖圖磚請求"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.total = 0
+        self.last_activity = time.monotonic()
+
+    def attach(self, page):
+        page.on("request", self._on_start)
+        page.on("requestfinished", self._on_end)
+        page.on("requestfailed", self._on_end)
+
+    def _on_start(self, request):
+        if TILE_URL_PATTERN.search(request.url):
+            self.in_flight += 1
+            self.total += 1
+            self.last_activity = time.monotonic()
+
+    def _on_end(self, request):
+        if TILE_URL_PATTERN.search(request.url):
+            self.in_flight = max(self.in_flight - 1, 0)
+            self.last_activity = time.monotonic()
+
+    def is_idle(self, quiet_ms) -> bool:
+        return self.in_flight == 0 and (time.monotonic() - self.last_activity) * 1000 >= quiet_ms
+
+
+async def wait_for_map_ready(page, tracker: TileRequestTracker, timeout_ms: Optional[int] = None,
+                             quiet_ms: Optional[int] = None, poll_ms: Optional[int] = None) -> dict:
+    """
+    等待地圖就緒：圖磚請求靜止、路線面板出現、地圖區域畫面穩定（連續兩次縮圖相同）
+    超過 timeout_ms 仍未就緒時直接回傳（照常截圖）；未指定的參數使用模組設定值
+
+    Returns:
+        dict: {"ready_ms", "timed_out", "network_idle", "panel", "stable", "tile_requests"}
+    """
+    timeout_ms = READY_TIMEOUT_MS if timeout_ms is None else timeout_ms
+    quiet_ms = READY_QUIET_MS if quiet_ms is None else quiet_ms
+    poll_ms = READY_POLL_MS if poll_ms is None else poll_ms
+    start = time.monotonic()
+    deadline = start + timeout_ms / 1000
+    state = {"network_idle": False, "panel": False, "stable": False}
+    viewport = page.viewport_size or {"width": 1920, "height": 1080}
+    # 地圖區域（避開左側面板）
+    clip = {
+        "x": int(viewport["width"] * 0.4),
+        "y": 0,
+        "width": max(int(viewport["width"] * 0.6), 1),
+        "height": max(int(viewport["height"]), 1),
+    }
+    last_digest = None
+
+    while time.monotonic() < deadline:
+        state["network_idle"] = tracker.is_idle(quiet_ms)
+        if not state["panel"]:
+            try:
+                state["panel"] = await page.query_selector(ROUTE_PANEL_SELECTOR) is not None
+            except Exception:
+                state["panel"] = False
+
+        if state["network_idle"] and state["panel"]:
+            try:
+                shot = await page.screenshot(type="jpeg", quality=30, clip=clip)
+                digest = hashlib.md5(shot).hexdigest()
+            except Exception:
+                digest = None
+            if digest is not None and digest == last_digest:
+                state["stable"] = True
+                break
+            last_digest = digest
+        else:
+            last_digest = None
+
+        await page.wait_for_timeout(poll_ms)
+
+    return {
+        "ready_ms": int((time.monotonic() - start) * 1000),
+        "timed_out": not state["stable"],
+        "tile_requests": tracker.total,
+        **state,
+    }
+
+
+def build_maps_url(origin: str, destination: str) -> str:
+    """
+    構建 Google Maps 駕車路線 URL
+    """
+    return (
+        f"https://www.google.com/maps/dir/?api=1"
+        f"&origin={quote(origin)}"
+        f"&destination={quote(destination)}"
+        f"&travelmode=driving"
+    )
+
+
+async def _capture_on_page(page, maps_url: str, output_path: Path, wait_timeout: int,
+                           metrics: Optional[dict] = None) -> Optional[str]:
+    """
+    在既有 page 上開啟路線頁並截圖（單次啟動與瀏覽器池共用）
+
+    Args:
+        metrics: 若提供，會寫入就緒偵測結果（ready_ms 等）
+
+    Returns:
+        str: 截圖檔案路徑，如果失敗則返回 None
+    """
+    # 設定 console 和 pageerror 監聽器
+    console_messages = []
+    page_errors = []
+
+    def handle_console(msg):
+        console_messages.append({
+            "type": msg.type,
+            "text": msg.text,
+            "location": str(msg.location) if hasattr(msg, 'location') else None
+        })
+        logger.debug(f"[PLAYWRIGHT_CONSOLE] {msg.type}: {msg.text}")
+
+    def handle_pageerror(error):
+        page_errors.append({
+            "message": str(error),
+            "stack": error.stack if hasattr(error, 'stack') else None
+        })
+        logger.debug(f"[PLAYWRIGHT_PAGEERROR] {error}")
+
+    def dump_diagnostics():
+        if console_messages:
+            logger.debug(f"Console 訊息: {console_messages}")
+        if page_errors:
+            logger.debug(f"Page 錯誤: {page_errors}")
+
+    page.on("console", handle_console)
+    page.on("pageerror", handle_pageerror)
+    tracker = TileRequestTracker()
+    tracker.attach(page)
+
+    try:
+        # 1) 導航到 Google Maps 路線頁面（使用 domcontentloaded）
+        logger.debug(f"導航到 Google Maps: {maps_url}")
+        await page.goto(maps_url, wait_until="domcontentloaded", timeout=wait_timeout)
+        logger.debug("頁面 domcontentloaded 完成")
+
+        # 2) 等待策略：等待 canvas 或 main 元素
+        try:
+            logger.debug("等待 canvas 或 main 元素...")
+            await page.wait_for_selector('canvas, div[role="main"]', timeout=15000)
+            logger.debug("檢測到 canvas 或 main 元素")
+        except PlaywrightTimeoutError:
+            logger.warning("未檢測到 canvas 或 main 元素，繼續等待...")
+
+        # 3) 截圖前檢查 viewport 尺寸
+        viewport_size = page.viewport_size
+        if viewport_size and (viewport_size['width'] == 0 or viewport_size['height'] == 0):
+            logger.error(f"Viewport 尺寸異常: {viewport_size}")
+            return None
+        logger.debug(f"Viewport 尺寸: {viewport_size}")
+
+        # 4) 就緒偵測（圖磚網路靜止 + 路線面板 + 畫面穩定），最多等待 READY_TIMEOUT_MS
+        readiness = await wait_for_map_ready(page, tracker)
+        if metrics is not None:
+            metrics.update(readiness)
+        if readiness["timed_out"]:
+            logger.warning(
+                f"[READINESS] 地圖未在 {READY_TIMEOUT_MS}ms 內就緒，照常截圖: "
+                f"network_idle={readiness['network_idle']}, panel={readiness['panel']}"
+            )
+        else:
+            logger.info(f"[READINESS] 地圖就緒耗時 {readiness['ready_ms']}ms（圖磚請求 {readiness['tile_requests']} 個）")
+
+        # 5) 截取整個視窗的截圖
+        logger.debug(f"開始截圖，儲存到: {output_path}")
+        await page.screenshot(
+            path=str(output_path),
+            full_page=False,  # 只截視窗大小
+            type='png'
+        )
+        logger.debug("截圖完成")
+
+        # 6) 截圖後立刻檢查檔案
+        if not os.path.exists(output_path):
+            logger.error(f"截圖檔案不存在: {output_path}")
+            dump_diagnostics()
+            return None
+
+        file_size = os.path.getsize(output_path)
+        if file_size <= 10240:  # 10KB
+            logger.error(f"截圖檔案太小 ({file_size} bytes)，可能截圖失敗: {output_path}")
+            dump_diagnostics()
+            # 刪除無效檔案
+            try:
+                os.remove(output_path)
+            except:
+                pass
+            return None
+
+        logger.info(f"成功截取 Google Maps 路線截圖: {output_path} ({file_size} bytes)")
+        return str(output_path)
+
+    except PlaywrightTimeoutError as e:
+        logger.error(f"等待頁面載入超時: {str(e)}")
+        dump_diagnostics()
+        return None
+    except Exception as e:
+        logger.error(f"截取 Google Maps 截圖時發生錯誤: {str(e)}")
+        import traceback
+        logger.debug(f"錯誤詳情: {traceback.format_exc()}")
+        dump_diagnostics()
+        return None
+
 
 async def capture_route_screenshot(
     origin: str,
@@ -24,10 +264,12 @@ async def capture_route_screenshot(
     viewport_width: int = 1920,
     viewport_height: int = 1080,
     wait_timeout: int = 30000,
+    metrics: Optional[dict] = None,
 ) -> Optional[str]:
     """
     使用 headless browser 開啟 Google Maps 的駕車路線畫面並截圖（包含左側面板和右側地圖）
-    
+    單次啟動版本：每次呼叫都啟動並關閉瀏覽器；批次處理請使用 capture_route_screenshot_sync（瀏覽器池）
+
     Args:
         origin: 起點地址或名稱
         destination: 終點地址或名稱
@@ -35,182 +277,60 @@ async def capture_route_screenshot(
         viewport_width: 瀏覽器視窗寬度（預設 1920，確保能完整顯示左側面板和地圖）
         viewport_height: 瀏覽器視窗高度（預設 1080，確保能完整顯示頁面）
         wait_timeout: 等待頁面載入的超時時間（毫秒，預設 30000）
-    
+        metrics: 若提供 dict，會寫入地圖就緒偵測結果
+
     Returns:
         str: 截圖檔案路徑，如果失敗則返回 None
     """
     if not PLAYWRIGHT_AVAILABLE:
         logger.error("Playwright 未安裝，無法截取 Google Maps 畫面")
         return None
-    
+
     try:
         # 轉換為 Path 物件
         output_path = Path(output_path)
         output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        # URL encode 起點和終點
-        origin_encoded = quote(origin)
-        destination_encoded = quote(destination)
-        
-        # 構建 Google Maps 路線 URL
-        maps_url = (
-            f"https://www.google.com/maps/dir/?api=1"
-            f"&origin={origin_encoded}"
-            f"&destination={destination_encoded}"
-            f"&travelmode=driving"
-        )
-        
+
+        maps_url = build_maps_url(origin, destination)
+
         logger.info(f"開始截取 Google Maps 路線: {origin} -> {destination}")
         logger.debug(f"Google Maps URL: {maps_url}")
-        
+
         browser = None
         context = None
         page = None
-        
+
         async with async_playwright() as p:
             # 啟動瀏覽器（使用 Chromium）
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    '--disable-blink-features=AutomationControlled',
-                    '--disable-dev-shm-usage',
-                    '--no-sandbox',
-                ]
-            )
-            
+            browser = await p.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+
             try:
                 # 創建新頁面
                 context = await browser.new_context(
                     viewport={'width': viewport_width, 'height': viewport_height},
-                    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+                    user_agent=BROWSER_USER_AGENT
                 )
                 page = await context.new_page()
-                
-                # 設定 console 和 pageerror 監聽器
-                console_messages = []
-                page_errors = []
-                
-                def handle_console(msg):
-                    console_messages.append({
-                        "type": msg.type,
-                        "text": msg.text,
-                        "location": str(msg.location) if hasattr(msg, 'location') else None
-                    })
-                    logger.debug(f"[PLAYWRIGHT_CONSOLE] {msg.type}: {msg.text}")
-                
-                def handle_pageerror(error):
-                    page_errors.append({
-                        "message": str(error),
-                        "stack": error.stack if hasattr(error, 'stack') else None
-                    })
-                    logger.debug(f"[PLAYWRIGHT_PAGEERROR] {error}")
-                
-                page.on("console", handle_console)
-                page.on("pageerror", handle_pageerror)
-                
-                try:
-                    # 1) 導航到 Google Maps 路線頁面（使用 domcontentloaded）
-                    logger.debug(f"導航到 Google Maps: {maps_url}")
-                    await page.goto(maps_url, wait_until="domcontentloaded", timeout=wait_timeout)
-                    logger.debug("頁面 domcontentloaded 完成")
-                    
-                    # 2) 等待策略：等待 canvas 或 main 元素
-                    try:
-                        logger.debug("等待 canvas 或 main 元素...")
-                        await page.wait_for_selector('canvas, div[role="main"]', timeout=15000)
-                        logger.debug("檢測到 canvas 或 main 元素")
-                    except PlaywrightTimeoutError:
-                        logger.warning("未檢測到 canvas 或 main 元素，繼續等待...")
-                    
-                    # 3) 額外等待時間（2-4 秒）
-                    wait_time = 3000  # 3 秒
-                    logger.debug(f"等待 {wait_time}ms 讓地圖完全載入...")
-                    await page.wait_for_timeout(wait_time)
-                    
-                    # 4) 截圖前檢查 viewport 尺寸
-                    viewport_size = page.viewport_size
-                    if viewport_size and (viewport_size['width'] == 0 or viewport_size['height'] == 0):
-                        logger.error(f"Viewport 尺寸異常: {viewport_size}")
-                        return None
-                    logger.debug(f"Viewport 尺寸: {viewport_size}")
-                    
-                    # 5) 截圖前最後等待
-                    await page.wait_for_timeout(1000)
-                    
-                    # 6) 截取整個視窗的截圖
-                    logger.debug(f"開始截圖，儲存到: {output_path}")
-                    await page.screenshot(
-                        path=str(output_path),
-                        full_page=False,  # 只截視窗大小
-                        type='png'
-                    )
-                    logger.debug("截圖完成")
-                    
-                    # 7) 截圖後立刻檢查檔案
-                    if not os.path.exists(output_path):
-                        logger.error(f"截圖檔案不存在: {output_path}")
-                        if console_messages:
-                            logger.debug(f"Console 訊息: {console_messages}")
-                        if page_errors:
-                            logger.debug(f"Page 錯誤: {page_errors}")
-                        return None
-                    
-                    file_size = os.path.getsize(output_path)
-                    if file_size <= 10240:  # 10KB
-                        logger.error(f"截圖檔案太小 ({file_size} bytes)，可能截圖失敗: {output_path}")
-                        if console_messages:
-                            logger.debug(f"Console 訊息: {console_messages}")
-                        if page_errors:
-                            logger.debug(f"Page 錯誤: {page_errors}")
-                        # 刪除無效檔案
-                        try:
-                            os.remove(output_path)
-                        except:
-                            pass
-                        return None
-                    
-                    logger.info(f"成功截取 Google Maps 路線截圖: {output_path} ({file_size} bytes)")
-                    return str(output_path)
-                    
-                except PlaywrightTimeoutError as e:
-                    logger.error(f"等待頁面載入超時: {str(e)}")
-                    if console_messages:
-                        logger.debug(f"Console 訊息: {console_messages}")
-                    if page_errors:
-                        logger.debug(f"Page 錯誤: {page_errors}")
-                    return None
-                except Exception as e:
-                    logger.error(f"截取 Google Maps 截圖時發生錯誤: {str(e)}")
-                    import traceback
-                    logger.debug(f"錯誤詳情: {traceback.format_exc()}")
-                    if console_messages:
-                        logger.debug(f"Console 訊息: {console_messages}")
-                    if page_errors:
-                        logger.debug(f"Page 錯誤: {page_errors}")
-                    return None
-                finally:
-                    # 確保 page 和 context 被正確關閉
-                    if page:
-                        try:
-                            await page.close()
-                        except Exception as e:
-                            logger.warning(f"關閉 page 時發生錯誤: {str(e)}")
-                    if context:
-                        try:
-                            await context.close()
-                        except Exception as e:
-                            logger.warning(f"關閉 context 時發生錯誤: {str(e)}")
-            
+                return await _capture_on_page(page, maps_url, output_path, wait_timeout, metrics)
+
             finally:
-                # 確保 browser 被正確關閉
+                # 確保 page、context 和 browser 被正確關閉
+                if page:
+                    try:
+                        await page.close()
+                    except Exception as e:
+                        logger.warning(f"關閉 page 時發生錯誤: {str(e)}")
+                if context:
+                    try:
+                        await context.close()
+                    except Exception as e:
+                        logger.warning(f"關閉 context 時發生錯誤: {str(e)}")
                 if browser:
                     try:
                         await browser.close()
-                        # 等待瀏覽器進程完全終止
-                        await asyncio.sleep(0.5)
                     except Exception as e:
                         logger.warning(f"關閉 browser 時發生錯誤: {str(e)}")
-    
+
     except Exception as e:
         logger.error(f"Playwright 執行失敗: {str(e)}")
         import traceback
@@ -218,6 +338,340 @@ async def capture_route_screenshot(
         return None
 
 
+class _BrowserEntry:
+    """池中的單一瀏覽器"""
+
+    def __init__(self, index):
+        self.index = index
+        self.browser = None
+        self.generation = 0   # 每次重新啟動 +1，舊 generation 的 context 需重建
+        self.pages_served = 0
+        self.in_use = 0
+        self.lock = None      # asyncio.Lock，於 event loop 內建立
+
+
+class _ContextSlot:
+    """池中的單一 context（同一時間只供一個截圖使用）"""
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.context = None
+        self.generation = -1
+        self.pages_served = 0
+
+
+class BrowserPool:
+    """長駐 Playwright 瀏覽器池（N 個瀏覽器 × 每個 M 個 context）"""
+
+    def __init__(self, browsers=1, contexts_per_browser=2, recycle_after_pages=50,
+                 browser_recycle_after_pages=200, launch_retry_seconds=60,
+                 slot_wait_seconds=120, playwright_factory=None):
+        """
+        Args:
+            browsers: 瀏覽器數量
+            contexts_per_browser: 每個瀏覽器的 context 數（即同時截圖數）
+            recycle_after_pages: context 使用幾頁後重建（釋放記憶體、清除 cookie）
+            browser_recycle_after_pages: 瀏覽器服務幾頁後重新啟動
+            launch_retry_seconds: 啟動失敗後暫停重試的秒數（例如尚未安裝 Chromium）
+            slot_wait_seconds: 等待可用 context 的最長秒數（與截圖本身的逾時分開計算）
+            playwright_factory: 測試用，回傳尚未啟動的 async_playwright() 物件
+        """
+        self.browsers = max(int(browsers), 1)
+        self.contexts_per_browser = max(int(contexts_per_browser), 1)
+        self.recycle_after_pages = max(int(recycle_after_pages), 1)
+        self.browser_recycle_after_pages = max(int(browser_recycle_after_pages), 1)
+        self.launch_retry_seconds = launch_retry_seconds
+        self.slot_wait_seconds = slot_wait_seconds
+        self.playwright_factory = playwright_factory or async_playwright
+
+        self._loop = None
+        self._thread = None
+        self._playwright = None
+        self._entries = []
+        self._slots = None
+        self._start_lock = threading.Lock()
+        self._launch_failed_at = None
+        self._stats = {
+            "launches": 0, "browser_recycles": 0, "context_recycles": 0, "pages": 0, "failures": 0,
+            "ready_ms_total": 0, "ready_count": 0, "ready_timeouts": 0,
+        }
+
+    # =========================
+    # Lifecycle
+    # =========================
+    def start(self):
+        """啟動專屬 event loop 執行緒（重複呼叫無副作用）"""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(self._loop)
+                self._loop.call_soon(ready.set)
+                self._loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name="browser-pool", daemon=True)
+            self._thread.start()
+            ready.wait()
+            asyncio.run_coroutine_threadsafe(self._init_slots(), self._loop).result()
+            logger.info(
+                f"[BROWSER_POOL] 已啟動: {self.browsers} 個瀏覽器 × {self.contexts_per_browser} 個 context"
+            )
+
+    def shutdown(self, timeout=30):
+        """關閉所有瀏覽器並停止 event loop"""
+        with self._start_lock:
+            if not self._thread or not self._thread.is_alive():
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._close_all(), self._loop).result(timeout=timeout)
+            except Exception as e:
+                logger.warning(f"[BROWSER_POOL] 關閉瀏覽器池時發生錯誤: {str(e)}")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+            logger.info("[BROWSER_POOL] 已關閉")
+
+    def health(self):
+        """
+        健康狀態與統計
+
+        Returns:
+            dict: 瀏覽器連線狀態、服務頁數、重建次數等
+        """
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "browsers": [
+                {
+                    "index": e.index,
+                    "connected": bool(e.browser and e.browser.is_connected()),
+                    "pages_served": e.pages_served,
+                    "in_use": e.in_use,
+                }
+                for e in self._entries
+            ],
+            "avg_ready_ms": (
+                round(self._stats["ready_ms_total"] / self._stats["ready_count"])
+                if self._stats["ready_count"] else None
+            ),
+            **self._stats,
+        }
+
+    # =========================
+    # Public API
+    # =========================
+    def capture(self, origin, destination, output_path, viewport_width=1920,
+                viewport_height=1080, wait_timeout=30000, metrics=None) -> Optional[str]:
+        """
+        同步截圖（可由任何執行緒呼叫）
+        先最多等待 slot_wait_seconds 取得 context，取得後截圖本身再依 wait_timeout 計算逾時
+
+        Args:
+            metrics: 若提供，會寫入就緒偵測結果（ready_ms 等）
+
+        Returns:
+            str: 截圖檔案路徑，如果失敗則返回 None
+        """
+        if self._launch_failed_at and time.monotonic() - self._launch_failed_at < self.launch_retry_seconds:
+            logger.warning("[BROWSER_POOL] 瀏覽器最近啟動失敗，暫停截圖")
+            return None
+
+        self.start()
+        # 取得 context 或截圖提早結束時設定，兩段等待分別計時
+        started = threading.Event()
+        future = asyncio.run_coroutine_threadsafe(
+            self._capture(origin, destination, Path(output_path), viewport_width, viewport_height,
+                          wait_timeout, metrics, started),
+            self._loop,
+        )
+        future.add_done_callback(lambda _: started.set())
+        if not started.wait(self.slot_wait_seconds):
+            # 已取得的 context 由 _capture 的 finally 歸還
+            future.cancel()
+            logger.warning(
+                f"[BROWSER_POOL] 等待可用 context 逾時（{self.slot_wait_seconds} 秒，瀏覽器池忙碌）: "
+                f"{origin} -> {destination}"
+            )
+            return None
+        try:
+            return future.result(timeout=(wait_timeout / 1000) + 30)  # 額外給 30 秒緩衝
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            logger.error(f"[BROWSER_POOL] 截圖逾時: {origin} -> {destination}")
+            return None
+
+    # =========================
+    # Event loop side
+    # =========================
+    async def _init_slots(self):
+        self._entries = [_BrowserEntry(i) for i in range(self.browsers)]
+        self._slots = asyncio.Queue()
+        for entry in self._entries:
+            entry.lock = asyncio.Lock()
+            for _ in range(self.contexts_per_browser):
+                self._slots.put_nowait(_ContextSlot(entry))
+
+    async def _capture(self, origin, destination, output_path, viewport_width, viewport_height,
+                       wait_timeout, metrics=None, started=None):
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        maps_url = build_maps_url(origin, destination)
+        logger.info(f"開始截取 Google Maps 路線（瀏覽器池）: {origin} -> {destination}")
+
+        slot = await self._slots.get()
+        if started is not None:
+            started.set()
+        acquired = False
+        healthy = False
+        page = None
+        try:
+            await self._prepare_slot(slot)
+            acquired = True
+            page = await slot.context.new_page()
+            await page.set_viewport_size({'width': viewport_width, 'height': viewport_height})
+            readiness = {}
+            result = await _capture_on_page(page, maps_url, output_path, wait_timeout, readiness)
+            if "ready_ms" in readiness:
+                self._stats["ready_ms_total"] += readiness["ready_ms"]
+                self._stats["ready_count"] += 1
+                self._stats["ready_timeouts"] += int(readiness["timed_out"])
+            if metrics is not None:
+                metrics.update(readiness)
+            healthy = True
+            return result
+        except Exception as e:
+            self._stats["failures"] += 1
+            logger.error(f"[BROWSER_POOL] 截圖失敗: {str(e)}")
+            return None
+        finally:
+            if page:
+                try:
+                    await page.close()
+                except Exception as e:
+                    logger.warning(f"關閉 page 時發生錯誤: {str(e)}")
+                    healthy = False
+            await self._release_slot(slot, acquired, healthy)
+
+    async def _prepare_slot(self, slot):
+        entry = slot.entry
+        async with entry.lock:
+            # 健康檢查：瀏覽器斷線或已服務過多頁面時重新啟動
+            needs_launch = entry.browser is None or not entry.browser.is_connected()
+            needs_recycle = entry.pages_served >= self.browser_recycle_after_pages
+            if needs_recycle:
+                # 持有 lock 等待進行中的截圖結束（不再分配新頁面給這個瀏覽器）
+                while entry.in_use > 0:
+                    await asyncio.sleep(0.05)
+            if needs_launch or needs_recycle:
+                if needs_recycle and not needs_launch:
+                    self._stats["browser_recycles"] += 1
+                    logger.info(f"[BROWSER_POOL] 瀏覽器 #{entry.index} 已服務 {entry.pages_served} 頁，重新啟動")
+                await self._launch(entry)
+            entry.in_use += 1
+
+        try:
+            if slot.context is not None and (
+                slot.generation != entry.generation or slot.pages_served >= self.recycle_after_pages
+            ):
+                if slot.generation == entry.generation:
+                    self._stats["context_recycles"] += 1
+                await self._close_context(slot)
+            if slot.context is None:
+                slot.context = await entry.browser.new_context(
+                    viewport={'width': 1920, 'height': 1080},
+                    user_agent=BROWSER_USER_AGENT,
+                )
+                slot.generation = entry.generation
+                slot.pages_served = 0
+        except Exception:
+            entry.in_use -= 1
+            raise
+
+    async def _release_slot(self, slot, acquired, healthy):
+        if acquired:
+            slot.entry.in_use -= 1
+            slot.entry.pages_served += 1
+            slot.pages_served += 1
+            self._stats["pages"] += 1
+        if not healthy:
+            # 發生例外的 context 不再重用，下次取用時重建
+            await self._close_context(slot)
+        self._slots.put_nowait(slot)
+
+    async def _launch(self, entry):
+        if entry.browser is not None:
+            try:
+                await entry.browser.close()
+            except Exception:
+                pass
+            entry.browser = None
+        try:
+            if self._playwright is None:
+                self._playwright = await self.playwright_factory().start()
+            entry.browser = await self._playwright.chromium.launch(headless=True, args=BROWSER_LAUNCH_ARGS)
+        except Exception as e:
+            self._launch_failed_at = time.monotonic()
+            logger.error(f"[BROWSER_POOL] 啟動瀏覽器失敗: {str(e)}")
+            raise
+        self._launch_failed_at = None
+        entry.generation += 1
+        entry.pages_served = 0
+        self._stats["launches"] += 1
+
+    async def _close_context(self, slot):
+        if slot.context is not None:
+            try:
+                await slot.context.close()
+            except Exception as e:
+                logger.warning(f"關閉 context 時發生錯誤: {str(e)}")
+            slot.context = None
+
+    async def _close_all(self):
+        for entry in self._entries:
+            if entry.browser is not None:
+                try:
+                    await entry.browser.close()
+                except Exception as e:
+                    logger.warning(f"關閉 browser 時發生錯誤: {str(e)}")
+                entry.browser = None
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+
+_browser_pool = None
+_browser_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """
+    取得全程序共用的瀏覽器池（第一次呼叫時建立）
+    """
+    global _browser_pool
+    with _browser_pool_lock:
+        if _browser_pool is None:
+            _browser_pool = BrowserPool(
+                browsers=int(os.getenv("SCREENSHOT_POOL_BROWSERS", "1")),
+                contexts_per_browser=int(os.getenv("SCREENSHOT_POOL_CONTEXTS", "2")),
+                recycle_after_pages=int(os.getenv("SCREENSHOT_POOL_RECYCLE_PAGES", "50")),
+                browser_recycle_after_pages=int(os.getenv("SCREENSHOT_POOL_BROWSER_RECYCLE_PAGES", "200")),
+                slot_wait_seconds=float(os.getenv("SCREENSHOT_POOL_SLOT_WAIT_SECONDS", "120")),
+            )
+            atexit.register(_shutdown_browser_pool)
+        return _browser_pool
+
+
+def _shutdown_browser_pool():
+    # 程序結束時輸出串流可能已關閉，不再寫日誌
+    logger.disable(__name__)
+    if _browser_pool is not None:
+        _browser_pool.shutdown(timeout=5)
+
+
 def capture_route_screenshot_sync(
     origin: str,
     destination: str,
@@ -225,10 +679,12 @@ def capture_route_screenshot_sync(
     viewport_width: int = 1920,
     viewport_height: int = 1080,
     wait_timeout: int = 30000,
+    metrics: Optional[dict] = None,
 ) -> Optional[str]:
     """
     同步版本的 Google Maps 路線截圖函數（包含左側面板和右側地圖）
-    
+    使用長駐瀏覽器池，可由多個執行緒同時呼叫
+
     Args:
         origin: 起點地址或名稱
         destination: 終點地址或名稱
@@ -236,36 +692,23 @@ def capture_route_screenshot_sync(
         viewport_width: 瀏覽器視窗寬度（預設 1920，確保能完整顯示左側面板和地圖）
         viewport_height: 瀏覽器視窗高度（預設 1080，確保能完整顯示頁面）
         wait_timeout: 等待頁面載入的超時時間（毫秒，預設 30000）
-    
+        metrics: 若提供 dict，會寫入地圖就緒偵測結果（ready_ms、timed_out 等）
+
     Returns:
         str: 截圖檔案路徑，如果失敗則返回 None
     """
     if not PLAYWRIGHT_AVAILABLE:
         logger.error("Playwright 未安裝，無法截取 Google Maps 畫面")
         return None
-    
+
     try:
-        # 檢查是否有正在運行的 event loop
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # 如果已經有運行的 loop，需要在新的執行緒中執行
-                import concurrent.futures
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(
-                        asyncio.run,
-                        capture_route_screenshot(origin, destination, output_path, viewport_width, viewport_height, wait_timeout)
-                    )
-                    return future.result(timeout=(wait_timeout / 1000) + 30)  # 額外給 30 秒緩衝
-            else:
-                return loop.run_until_complete(
-                    capture_route_screenshot(origin, destination, output_path, viewport_width, viewport_height, wait_timeout)
-                )
-        except RuntimeError:
-            # 沒有 event loop，直接使用 asyncio.run
-            return asyncio.run(
-                capture_route_screenshot(origin, destination, output_path, viewport_width, viewport_height, wait_timeout)
-            )
+        return get_browser_pool().capture(
+            origin, destination, output_path,
+            viewport_width=viewport_width,
+            viewport_height=viewport_height,
+            wait_timeout=wait_timeout,
+            metrics=metrics,
+        )
     except Exception as e:
         logger.error(f"同步截圖函數執行失敗: {str(e)}")
         import traceback
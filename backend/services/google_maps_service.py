@@ -2,21 +2,66 @@
 Google Maps API 服務
 """
 import googlemaps
+import io
 import requests
 import os
 import re
 from loguru import logger
 from dotenv import load_dotenv
 from datetime import datetime
-from utils.path_manager import get_temp_maps_dir
 from pathlib import Path
 import math
 from PIL import Image, ImageDraw, ImageFont
 import textwrap
 import sys
+from services.cache_store import PersistentCache
+from utils.rate_limiter import RateLimiter
+from utils.font_registry import get_cjk_font
+from utils.text_render import draw_text, text_size
+from utils.label_layout import LabelLayout, measure_label_box
+from utils import polyline as polyline_utils
+from services.map_image_store import make_image_key, map_image_store
+from utils.atomic_write import write_atomic, write_bytes_atomic
 
 load_dotenv()
 
+# 地理編碼快取（全程序共用：同一辦公室名稱每月重複上百次）
+GEOCODE_LANGUAGE = "zh-TW"
+geocode_cache = PersistentCache(
+    namespace="geocode",
+    ttl_seconds=float(os.getenv("GEOCODE_CACHE_TTL_DAYS", "30")) * 86400,
+    negative_ttl_seconds=float(os.getenv("GEOCODE_CACHE_NEGATIVE_TTL_HOURS", "24")) * 3600,
+    max_memory_items=int(os.getenv("GEOCODE_CACHE_MAX_ITEMS", "4096")),
+    db_retry_seconds=float(os.getenv("CACHE_DB_RETRY_SECONDS", "60")),
+)
+
+# 路線快取：只存精簡後的路線資料（距離、時間、polyline、替代路線、整理後步驟）
+directions_cache = PersistentCache(
+    namespace="directions",
+    ttl_seconds=float(os.getenv("DIRECTIONS_CACHE_TTL_DAYS", "14")) * 86400,
+    negative_ttl_seconds=float(os.getenv("DIRECTIONS_CACHE_NEGATIVE_TTL_MINUTES", "60")) * 60,
+    max_memory_items=int(os.getenv("DIRECTIONS_CACHE_MAX_ITEMS", "1024")),
+    db_retry_seconds=float(os.getenv("CACHE_DB_RETRY_SECONDS", "60")),
+)
+
+# Static Maps API 的 URL 長度上限（字元）
+STATIC_MAPS_URL_LIMIT = 16384
+
+# 手動繪製的 A/B 圓點半徑（像素）
+AB_MARKER_RADIUS = 15
+
+# 各階段對外請求的速率限制（批次並行時共用，避免超過 Google 配額）
+geocode_limiter = RateLimiter(float(os.getenv("GEOCODE_QPS", "40")))
+directions_limiter = RateLimiter(float(os.getenv("DIRECTIONS_QPS", "40")))
+static_map_limiter = RateLimiter(float(os.getenv("STATIC_MAPS_QPS", "20")))
+
+
+def overlay_timestamp():
+    """
+    標註圖右下角的系統產出時間（精確到分鐘）；呼叫端同時用於圖片鍵值，相同鍵值的圖片內容一致
+    """
+    return datetime.now().strftime("%Y/%m/%d %H:%M")
+
 
 class GoogleMapsService:
     """Google Maps API 服務類別"""
@@ -24,6 +69,8 @@ class GoogleMapsService:
     def __init__(self):
         self.api_key = os.getenv("GOOGLE_MAPS_API_KEY", "")
         self.gmaps = None
+        self.geocode_cache = geocode_cache
+        self.directions_cache = directions_cache
         if self.api_key:
             try:
                 self.gmaps = googlemaps.Client(key=self.api_key)
@@ -38,22 +85,14 @@ class GoogleMapsService:
             if not self.gmaps:
                 return {"success": False, "error": "Google Maps API Key 未設定"}
 
-            directions_result = self.gmaps.directions(
-                origin,
-                destination,
-                mode=route_type,
-                language="zh-TW",
+            route_data, from_cache = self._get_directions(
+                origin, destination, mode=route_type, alternatives=False
             )
 
-            if not directions_result:
+            if not route_data:
                 return {"success": False, "error": "無法計算路線，請檢查地址是否正確"}
 
-            route = directions_result[0]
-            leg = route["legs"][0]
-
-            distance_km = leg["distance"]["value"] / 1000
-            duration_text = leg["duration"]["text"]
-            duration_seconds = leg["duration"]["value"]
+            distance_km = route_data["distance_m"] / 1000
 
             navigation_url = f"https://www.google.com/maps/dir/?api=1&origin={origin}&destination={destination}"
 
@@ -61,10 +100,10 @@ class GoogleMapsService:
                 "success": True,
                 "one_way_km": round(distance_km, 2),
                 "round_trip_km": round(distance_km * 2, 2),
-                "estimated_time": duration_text,
-                "estimated_seconds": duration_seconds,
+                "estimated_time": route_data["duration_text"],
+                "estimated_seconds": route_data["duration_seconds"],
                 "navigation_url": navigation_url,
-                "route": route,
+                "from_cache": from_cache,
             }
 
         except Exception as e:
@@ -95,18 +134,21 @@ class GoogleMapsService:
                 f"key={self.api_key}"
             )
 
+            static_map_limiter.acquire()
             response = requests.get(static_map_url, timeout=30)
             if response.status_code != 200:
                 logger.error(f"下載靜態地圖失敗: HTTP {response.status_code}")
                 return None
 
             if not output_path:
-                maps_dir = get_temp_maps_dir()
-                filename = f"map_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{hash(origin + destination) % 10000}.png"
-                output_path = maps_dir / filename
-
-            with open(str(output_path), "wb") as f:
-                f.write(response.content)
+                # 以請求內容（不含 API Key）決定檔名：相同地圖只存一份
+                image_key = make_image_key("static", static_map_url.split("&key=")[0])
+                output_path = map_image_store.put_bytes(
+                    image_key, response.content, kind="static", origin=origin, destination=destination
+                )
+            else:
+                with open(str(output_path), "wb") as f:
+                    f.write(response.content)
 
             logger.info(f"成功下載靜態地圖: {str(output_path)}")
             return str(output_path)
@@ -117,21 +159,30 @@ class GoogleMapsService:
 
     def geocode(self, address):
         """
-        地址地理編碼
+        地址地理編碼（先查快取，查無結果也會短暫快取）
         """
         try:
             if not self.gmaps:
                 return None
 
-            geocode_result = self.gmaps.geocode(address, language="zh-TW")
+            cache_key = (address, GEOCODE_LANGUAGE)
+            hit, cached = self.geocode_cache.get(cache_key)
+            if hit:
+                return cached
+
+            geocode_limiter.acquire()
+            geocode_result = self.gmaps.geocode(address, language=GEOCODE_LANGUAGE)
             if geocode_result:
                 location = geocode_result[0]["geometry"]["location"]
-                return {
+                result = {
                     "lat": location["lat"],
                     "lng": location["lng"],
                     "formatted_address": geocode_result[0]["formatted_address"],
                 }
+                self.geocode_cache.set(cache_key, result)
+                return result
 
+            self.geocode_cache.set(cache_key, None)
             return None
 
         except Exception as e:
@@ -156,6 +207,73 @@ class GoogleMapsService:
             logger.error(f"解析地點名稱錯誤: {str(e)}")
             return None
 
+    def _get_directions(self, origin, destination, mode="driving", alternatives=True):
+        """
+        取得精簡後的路線資料（先查快取）
+
+        Returns:
+            tuple: (路線資料 dict 或 None, 是否來自快取)
+        """
+        cache_key = (origin, destination, mode, bool(alternatives), GEOCODE_LANGUAGE)
+        hit, cached = self.directions_cache.get(cache_key)
+        if hit:
+            return cached, True
+
+        directions_limiter.acquire()
+        directions_result = self.gmaps.directions(
+            origin,
+            destination,
+            mode=mode,
+            language=GEOCODE_LANGUAGE,
+            alternatives=alternatives,
+        )
+
+        if not directions_result:
+            self.directions_cache.set(cache_key, None)
+            return None, False
+
+        main_route = directions_result[0]
+        main_leg = main_route["legs"][0]
+
+        alternative_polylines = []
+        if len(directions_result) > 1:
+            for alt_route in directions_result[1:]:
+                if "overview_polyline" in alt_route:
+                    alternative_polylines.append(alt_route["overview_polyline"]["points"])
+
+        steps = []
+        for step in main_leg["steps"]:
+            html_instructions = step.get("html_instructions", "")
+            clean_instruction = self._clean_html_tags(html_instructions)
+            distance_text = step["distance"]["text"]
+            steps.append(f"{clean_instruction} ({distance_text})")
+
+        route_data = {
+            "distance_m": main_leg["distance"]["value"],
+            "duration_text": main_leg["duration"]["text"],
+            "duration_seconds": main_leg["duration"]["value"],
+            "polyline": main_route["overview_polyline"]["points"],
+            "alternative_polylines": alternative_polylines,
+            "steps": steps,
+            # 起終點座標與路線範圍（靜態地圖直接使用，不需再地理編碼）
+            "start_location": main_leg.get("start_location"),
+            "end_location": main_leg.get("end_location"),
+            "start_address": main_leg.get("start_address"),
+            "end_address": main_leg.get("end_address"),
+            "bounds": main_route.get("bounds"),
+        }
+        self.directions_cache.set(cache_key, route_data)
+        return route_data, False
+
+    def cache_stats(self):
+        """
+        取得地理編碼與路線快取統計
+        """
+        return {
+            "geocode": self.geocode_cache.stats(),
+            "directions": self.directions_cache.stats(),
+        }
+
     def get_route_detail(self, origin_address, dest_address, alternatives=True):
         """
         取得詳細路線導航資訊（包含主要路線和替代路線）
@@ -164,40 +282,15 @@ class GoogleMapsService:
             if not self.gmaps:
                 return {"success": False, "error": "Google Maps API Key 未設定"}
 
-            directions_result = self.gmaps.directions(
-                origin_address,
-                dest_address,
-                mode="driving",
-                language="zh-TW",
-                alternatives=alternatives,
+            route_data, from_cache = self._get_directions(
+                origin_address, dest_address, mode="driving", alternatives=alternatives
             )
 
-            if not directions_result:
+            if not route_data:
                 return {"success": False, "error": "無法取得路線，請檢查地址是否正確"}
 
-            main_route = directions_result[0]
-            main_leg = main_route["legs"][0]
-
-            distance_km = main_leg["distance"]["value"] / 1000
-
-            duration_text = main_leg["duration"]["text"]
-            duration_seconds = main_leg["duration"]["value"]
-
-            main_polyline = main_route["overview_polyline"]["points"]
-
-            alternative_polylines = []
-            if len(directions_result) > 1:
-                for alt_route in directions_result[1:]:
-                    if "overview_polyline" in alt_route:
-                        alternative_polylines.append(alt_route["overview_polyline"]["points"])
-
-            steps = []
-            for step in main_leg["steps"]:
-                html_instructions = step.get("html_instructions", "")
-                clean_instruction = self._clean_html_tags(html_instructions)
-                distance_text = step["distance"]["text"]
-                step_desc = f"{clean_instruction} ({distance_text})"
-                steps.append(step_desc)
+            distance_km = route_data["distance_m"] / 1000
+            steps = route_data["steps"]
 
             from urllib.parse import quote
             origin_encoded = quote(origin_address)
@@ -215,14 +308,20 @@ class GoogleMapsService:
                 "success": True,
                 "distance_km": round(distance_km, 2),
                 "round_trip_km": round(distance_km * 2, 2),
-                "estimated_time": duration_text,
-                "estimated_seconds": duration_seconds,
+                "estimated_time": route_data["duration_text"],
+                "estimated_seconds": route_data["duration_seconds"],
                 "steps": steps,
                 "step_count": len(steps),
-                "polyline": main_polyline,
-                "alternative_polylines": alternative_polylines,
+                "polyline": route_data["polyline"],
+                "alternative_polylines": route_data["alternative_polylines"],
                 "map_url": map_url,
                 "route_steps_text": route_steps_text,
+                "start_location": route_data.get("start_location"),
+                "end_location": route_data.get("end_location"),
+                "start_address": route_data.get("start_address"),
+                "end_address": route_data.get("end_address"),
+                "bounds": route_data.get("bounds"),
+                "from_cache": from_cache,
             }
 
         except Exception as e:
@@ -231,6 +330,30 @@ class GoogleMapsService:
             logger.error(traceback.format_exc())
             return {"success": False, "error": f"取得路線詳情失敗: {str(e)}"}
 
+    @staticmethod
+    def route_endpoints(route_detail):
+        """
+        由路線結果取得起終點座標（格式同 geocode 結果）
+
+        Args:
+            route_detail: get_route_detail() 的回傳值
+
+        Returns:
+            tuple: (起點, 終點)，各為 {"lat", "lng", "formatted_address"}；
+                   舊快取資料沒有座標時為 None
+        """
+        endpoints = []
+        for prefix in ("start", "end"):
+            location = route_detail.get(f"{prefix}_location")
+            if location and "lat" in location and "lng" in location:
+                geo = {"lat": location["lat"], "lng": location["lng"]}
+                if route_detail.get(f"{prefix}_address"):
+                    geo["formatted_address"] = route_detail[f"{prefix}_address"]
+                endpoints.append(geo)
+            else:
+                endpoints.append(None)
+        return tuple(endpoints)
+
     def _clean_html_tags(self, html_text):
         """
         清除 HTML 標籤
@@ -245,231 +368,126 @@ class GoogleMapsService:
 
     def _load_cjk_font(self, size: int):
         """
-        載入支援中文（CJK）的字體
-        參考 matplotlib 的方式，明確指定字體路徑
+        載入支援中文（CJK）的字體（由全程序共用的字體登錄表提供，同字級只建立一次）
         """
-        from PIL import ImageFont
-        import os
+        return get_cjk_font(size)
 
-        # 將路徑轉換為絕對路徑，確保路徑正確
-        def get_absolute_path(path):
-            """將路徑轉換為絕對路徑"""
-            if not path:
-                return None
-            try:
-                abs_path = os.path.abspath(str(path))
-                return abs_path if os.path.exists(abs_path) else None
-            except:
-                return None
+    def annotate_map_info(self, image_path: str, distance_km, origin_addr: str, dest_addr: str, round_trip_km=None, date_text=None):
+        """
+        產生符合使用者需求的「報表型」地圖（直接覆寫原檔）：
+        1. 地圖左上角 Badge：單程公里數 (紅字白底)
+        2. 右下角系統產出時間
+        """
+        self.annotate_map_image(
+            image_path, image_path, distance_km, origin_addr, dest_addr,
+            round_trip_km=round_trip_km, date_text=date_text,
+        )
 
-        # Assets 字體目錄（專案內字體）- 使用 resolve() 確保在 Render 環境可解析
-        assets_fonts_dir = Path(__file__).resolve().parent.parent / "assets" / "fonts"
-        
-        # 專案內字體（永遠優先，不依賴系統字體）
-        project_fonts = [
-            str(assets_fonts_dir / "NotoSansTC-Regular.ttf"),
-        ]
-        project_fonts = [get_absolute_path(fp) for fp in project_fonts if get_absolute_path(fp)]
-        
-        # 系統字體（備選，僅在專案字體不存在時使用）
-        system_candidates = []
-        
-        if os.name == "nt":
-            # Windows 系統字體
-            win = os.environ.get("WINDIR", "C:/Windows")
-            fonts_dir = os.path.join(win, "Fonts")
-            
-            # Windows 中文字體候選項
-            system_candidates = [
-                os.path.join(fonts_dir, "msjh.ttc"),      # 微軟正黑體
-                os.path.join(fonts_dir, "msjhbd.ttc"),     # 微軟正黑體粗體
-                os.path.join(fonts_dir, "mingliu.ttc"),    # 新細明體
-                os.path.join(fonts_dir, "kaiu.ttf"),       # 標楷體
-                os.path.join(fonts_dir, "simsun.ttc"),    # 宋體
-                os.path.join(fonts_dir, "simsun.ttf"),    # 宋體
-                os.path.join(fonts_dir, "msyh.ttc"),       # 微軟雅黑
-                os.path.join(fonts_dir, "msyhbd.ttc"),    # 微軟雅黑粗體
-            ]
-        else:
-            # Linux / 其他系統字體（Render 環境通常沒有，但保留作為備選）
-            system_candidates = [
-                "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
-                "/usr/share/fonts/opentype/noto/NotoSansCJKtc-Regular.otf",
-                "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",
-                "/usr/share/fonts/truetype/noto/NotoSansTC-Regular.ttf",
-                "/usr/share/fonts/truetype/noto/NotoSansTC-Regular.otf",
-            ]
-        
-        # 轉換為絕對路徑並過濾不存在的路徑
-        system_candidates = [get_absolute_path(fp) for fp in system_candidates if get_absolute_path(fp)]
-        
-        # 專案字體永遠優先於系統字體
-        candidates = project_fonts + system_candidates
+    def open_map_image(self, source, copy=True):
+        """
+        解碼地圖圖片為可繪製的 RGB 影像
 
-        # 移除 None 值
-        candidates = [fp for fp in candidates if fp is not None]
+        Args:
+            source: 圖片路徑、PNG bytes 或 PIL Image
+            copy: 傳入 RGB 的 PIL Image 時是否複製（呼叫端不再使用原影像時傳 False，直接在原影像上繪製）
 
-        # 嘗試載入字體（使用絕對路徑）
-        loaded_font = None
-        for fp in candidates:
-            try:
-                logger.info(f"[FONT] 嘗試載入字體: {fp}")
-                
-                if fp.lower().endswith('.ttc'):
-                    # TTC 檔案可能包含多個字體，嘗試不同索引
-                    for idx in [0, 1, 2]:
-                        try:
-                            # 使用絕對路徑明確指定字體
-                            loaded_font = ImageFont.truetype(fp, size, index=idx)
-                            # 測試字體是否能正確顯示中文
-                            test_draw = ImageDraw.Draw(Image.new("RGB", (100, 100)))
-                            test_bbox = test_draw.textbbox((0, 0), "測試", font=loaded_font)
-                            if test_bbox[2] > test_bbox[0]:  # 確保文字寬度 > 0
-                                logger.info(f"[FONT] ✓ 成功載入字體: {fp} (index={idx}, size={size})")
-                                break
-                        except Exception as e:
-                            if idx == 2:  # 最後一個索引也失敗
-                                logger.debug(f"[FONT] 無法載入 TTC 字體 {fp} (index={idx}): {e}")
-                            continue
-                    if loaded_font:
-                        break
-                else:
-                    # TTF/OTF 檔案
-                    loaded_font = ImageFont.truetype(fp, size)
-                    # 測試字體是否能正確顯示中文
-                    test_draw = ImageDraw.Draw(Image.new("RGB", (100, 100)))
-                    test_bbox = test_draw.textbbox((0, 0), "測試", font=loaded_font)
-                    if test_bbox[2] > test_bbox[0]:  # 確保文字寬度 > 0
-                        logger.info(f"[FONT] ✓ 成功載入字體: {fp} (size={size})")
-                        break
-                    else:
-                        loaded_font = None
-                        
-            except Exception as e:
-                logger.debug(f"[FONT] 載入字體失敗 {fp}: {e}")
-                continue
-
-        if loaded_font:
-            return loaded_font
-
-        # 如果所有候選字體都失敗，記錄錯誤並拋出異常
-        logger.error("[FONT] ✗ 無法載入任何中文字體！中文字將無法正確顯示。")
-        logger.error(f"[FONT] 已嘗試的候選字體數量: {len(candidates)}")
-        if candidates:
-            logger.error(f"[FONT] 第一個候選字體: {candidates[0]}")
-        if project_fonts:
-            logger.error(f"[FONT] 專案字體路徑: {project_fonts[0]}")
-            logger.error(f"[FONT] 專案字體檔案是否存在: {os.path.exists(project_fonts[0]) if project_fonts[0] else 'N/A'}")
-        
-        # 不使用預設字體（因為不支援中文），改為拋出異常
-        # 讓調用者知道字體載入失敗，避免靜默失敗
-        raise RuntimeError(
-            f"無法載入中文字體！請確認專案字體檔案存在於: {assets_fonts_dir / 'NotoSansTC-Regular.ttf'}"
-        )
+        Returns:
+            Image.Image: RGB 影像
+        """
+        if isinstance(source, Image.Image):
+            if source.mode != "RGB":
+                return source.convert("RGB")
+            return source.copy() if copy else source
+        if isinstance(source, (bytes, bytearray)):
+            return Image.open(io.BytesIO(source)).convert("RGB")
+        return Image.open(source).convert("RGB")
 
-    def annotate_map_info(self, image_path: str, distance_km, origin_addr: str, dest_addr: str, round_trip_km=None, date_text=None):
+    def annotate_map_image(self, source, output_path, distance_km, origin_addr: str, dest_addr: str,
+                           round_trip_km=None, date_text=None, ab_markers=None, compress_level=None,
+                           generated_at=None, copy=True):
         """
-        產生符合使用者需求的「報表型」地圖：
-        1. 頂部 Header：日期 + 起點 + 終點 + 往返核銷里程
-        2. 地圖左上角 Badge：單程公里數 (紅字白底)
+        單次合成流程：解碼一次 → 依序套用所有標註（KM Badge、時間、A/B Marker 與地址框）→ 編碼一次
+
+        Args:
+            source: 圖片路徑、PNG bytes（Static Maps / Playwright）或已解碼的 PIL Image
+            output_path: 輸出路徑
+            distance_km: 單程公里數（None 表示不畫 Badge）
+            origin_addr: 起點地址（A 點地址框）
+            dest_addr: 終點地址（B 點地址框）
+            ab_markers: A/B Marker 位置 {"a": (lat, lng), "b": (lat, lng), "zoom": int, "center": (lat, lng)}，
+                        None 表示不畫 Marker 與地址框
+            compress_level: PNG 壓縮等級（None 表示 Pillow 預設）
+            generated_at: 右下角的系統產出時間文字（None 表示 overlay_timestamp()）
+            copy: 傳入 PIL Image 時是否先複製；呼叫端擁有該影像且之後不再使用時傳 False，省去一次整張影像的複製
+
+        Returns:
+            bool: 是否成功標註
         """
         try:
-            # 確保內容是字串
-            origin_addr = str(origin_addr).replace("台灣", "") if origin_addr else "" # 移除重複的台灣若有
-            # 簡單優化地址顯示
-            if origin_addr.startswith("號"): origin_addr = origin_addr[1:]
-            
-            dest_addr = str(dest_addr).replace("台灣", "") if dest_addr else ""
-            
-            # 日期處理
-            date_str = ""
-            if date_text:
-                try:
-                    # 嘗試解析日期字串，格式化為 MM/DD
-                    # 假設輸入可能是 YYYY-MM-DD 或 YYYY/MM/DD
-                    dt = None
-                    for fmt in ["%Y-%m-%d", "%Y/%m/%d", "%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M:%S"]:
-                        try:
-                            dt = datetime.strptime(str(date_text).split(' ')[0], fmt)
-                            break
-                        except ValueError:
-                            continue
-                    if dt:
-                        date_str = dt.strftime("%m/%d")
-                    else:
-                        date_str = str(date_text)
-                except:
-                    date_str = str(date_text)
-            
-            # 若無日期，使用當日
-            if not date_str:
-                date_str = datetime.now().strftime("%m/%d")
-
-            base = Image.open(image_path).convert("RGB")
-            W, H = base.size
-
-            # 計算縮放比例（以 1000px 為基準）
-            scale = max(W / 1000.0, 0.8)
-            
-            # 刪除舊的 Header 邏輯，改用 Overlay
-            # 建立可繪圖物件 (直接在地圖圖層上畫)
-            draw = ImageDraw.Draw(base, "RGBA") # 確保支援 alpha
-            
-            import textwrap
-
-            # -----------------------------------------------
-            # 1. 左上角 Badge (KM)
-            # -----------------------------------------------
-            if distance_km is not None:
-                km_text = f"{distance_km} km"
-                font_km = self._load_cjk_font(int(40 * scale))
-                
-                dummy = ImageDraw.Draw(Image.new("RGB", (1, 1)))
-                bbox = dummy.textbbox((0, 0), km_text, font=font_km)
-                w = bbox[2] - bbox[0] + int(30 * scale)
-                h = bbox[3] - bbox[1] + int(20 * scale)
-                
-                x, y = int(20 * scale), int(20 * scale)
-                
-                # 陰影
-                draw.rounded_rectangle([x+2, y+2, x+w+2, y+h+2], radius=10, fill=(0,0,0,100))
-                # 白底
-                draw.rounded_rectangle([x, y, x+w, y+h], radius=10, fill=(255,255,255,230))
-                # 紅字
-                text_x = x + int(15 * scale)
-                text_y = y + int(10 * scale)
-                draw.text((text_x, text_y), km_text, fill=(200, 0, 0), font=font_km)
-
-            # -----------------------------------------------
-            # 2. 右下角 Timestamp
-            # -----------------------------------------------
-            # 格式：System Generated: YYYY/MM/DD HH:MM
-            ts_str = f"系統產出時間: {datetime.now().strftime('%Y/%m/%d %H:%M')}"
-            font_ts = self._load_cjk_font(int(20 * scale))
-            
-            bbox_ts = dummy.textbbox((0, 0), ts_str, font=font_ts)
-            ts_w = bbox_ts[2] - bbox_ts[0]
-            ts_h = bbox_ts[3] - bbox_ts[1]
-            
-            ts_x = W - ts_w - int(20 * scale)
-            ts_y = H - ts_h - int(20 * scale)
-            
-            # 加個白色暈開效果 (Halo) 增加可讀性
-            draw = ImageDraw.Draw(base) # RGB mode now
-            halo_r = 2
-            for ox in range(-halo_r, halo_r+1):
-                for oy in range(-halo_r, halo_r+1):
-                    draw.text((ts_x+ox, ts_y+oy), ts_str, font=font_ts, fill=(255,255,255))
-            
-            draw.text((ts_x, ts_y), ts_str, font=font_ts, fill=(50, 50, 50))
-
-            # 存檔
-            base.save(image_path)
+            base = self.open_map_image(source, copy=copy)
+            self._draw_info_overlay(base, distance_km, generated_at)
+            if ab_markers:
+                self._draw_ab_overlay(base, ab_markers, origin_addr, dest_addr)
+            save_options = {} if compress_level is None else {"compress_level": compress_level}
+            write_atomic(output_path, lambda tmp: base.save(str(tmp), format="PNG", **save_options))
             logger.info("地圖已套用 Burn-in 樣式（KM + Address Overlay + Timestamp）")
+            return True
 
         except Exception as e:
-            logger.error(f"在地圖上標註 Header 資訊錯誤: {str(e)}")
+            logger.error(f"在地圖上標註資訊錯誤: {str(e)}")
+            # 標註失敗仍保留原圖
+            if isinstance(source, (bytes, bytearray)):
+                write_bytes_atomic(output_path, source)
+            return False
 
+    def _draw_info_overlay(self, base, distance_km, generated_at=None):
+        """
+        在影像上畫左上角 KM Badge 與右下角系統產出時間（直接修改傳入影像）
+        """
+        W, H = base.size
+
+        # 計算縮放比例（以 1000px 為基準）
+        scale = max(W / 1000.0, 0.8)
+
+        # 建立可繪圖物件 (直接在地圖圖層上畫)
+        draw = ImageDraw.Draw(base, "RGBA") # 確保支援 alpha
+
+        # -----------------------------------------------
+        # 1. 左上角 Badge (KM)
+        # -----------------------------------------------
+        if distance_km is not None:
+            km_text = f"{distance_km} km"
+            font_km = self._load_cjk_font(int(40 * scale))
+
+            bbox = draw.textbbox((0, 0), km_text, font=font_km)
+            w = bbox[2] - bbox[0] + int(30 * scale)
+            h = bbox[3] - bbox[1] + int(20 * scale)
+
+            x, y = int(20 * scale), int(20 * scale)
+
+            # 陰影
+            draw.rounded_rectangle([x+2, y+2, x+w+2, y+h+2], radius=10, fill=(0,0,0,100))
+            # 白底
+            draw.rounded_rectangle([x, y, x+w, y+h], radius=10, fill=(255,255,255,230))
+            # 紅字
+            text_x = x + int(15 * scale)
+            text_y = y + int(10 * scale)
+            draw_text(draw, (text_x, text_y), km_text, font_km, fill=(200, 0, 0))
+
+        # -----------------------------------------------
+        # 2. 右下角 Timestamp
+        # -----------------------------------------------
+        # 格式：System Generated: YYYY/MM/DD HH:MM
+        ts_str = f"系統產出時間: {generated_at or overlay_timestamp()}"
+        font_ts = self._load_cjk_font(int(20 * scale))
+
+        ts_w, ts_h = text_size(font_ts, ts_str)
+
+        ts_x = W - ts_w - int(20 * scale)
+        ts_y = H - ts_h - int(20 * scale)
+
+        # 加個白色暈開效果 (Halo) 增加可讀性：以文字外框一次畫出
+        draw_text(draw, (ts_x, ts_y), ts_str, font_ts, fill=(50, 50, 50), outline=(255, 255, 255), outline_width=2)
 
     def download_static_map_with_polyline(
         self,
@@ -479,23 +497,29 @@ class GoogleMapsService:
         distance_km=None,
         output_path=None,
         alternative_polylines=None,
+        origin_geo=None,
+        destination_geo=None,
+        bounds=None,
     ):
         """
         下載帶路線 polyline 的靜態地圖圖片（使用 Google Maps 官方樣式）
         - 移除 fillcolor，避免出現藍色/灰色半透明面積
         - 下載後用 PIL 加註：公里數 + A/B formatted address + 系統產出時間
+        - origin_geo / destination_geo：呼叫端已有的起終點座標（路線起終點或批次解析表），提供時不再重新地理編碼
+        - bounds：路線範圍（Directions bounds），提供時以完整路線範圍決定縮放
         """
         try:
             if not self.api_key:
                 return None
 
-            origin_geo = self.geocode(origin_address)
-            destination_geo = self.geocode(destination_address)
+            origin_geo = origin_geo or self.geocode(origin_address)
+            destination_geo = destination_geo or self.geocode(destination_address)
 
             if not origin_geo or not destination_geo:
                 logger.warning(f"無法取得地理座標: {origin_address} -> {destination_address}")
                 return self._download_simple_static_map(
-                    polyline, origin_address, destination_address, distance_km, output_path
+                    polyline, origin_address, destination_address, distance_km, output_path,
+                    origin_geo=origin_geo, destination_geo=destination_geo,
                 )
 
             from urllib.parse import quote
@@ -506,84 +530,107 @@ class GoogleMapsService:
 
             # 計算合適的 zoom 和 center
             W, H = 1200, 800
-            zoom, center_lat, center_lng = self._choose_zoom_for_two_points(
-                origin_geo["lat"], origin_geo["lng"],
-                destination_geo["lat"], destination_geo["lng"],
-                W, H, padding_px=120
-            )
+            # 以完整路線範圍（起終點、Directions bounds、主路線與替代路線所有點）決定縮放，避免繞行路段被裁切
+            fit_points = [
+                (origin_geo["lat"], origin_geo["lng"]),
+                (destination_geo["lat"], destination_geo["lng"]),
+            ]
+            if bounds and bounds.get("northeast") and bounds.get("southwest"):
+                ne, sw = bounds["northeast"], bounds["southwest"]
+                fit_points += [(sw["lat"], sw["lng"]), (ne["lat"], ne["lng"])]
+            for encoded in [polyline] + list(alternative_polylines or []):
+                try:
+                    fit_points += polyline_utils.decode(encoded).tolist()
+                except ValueError as e:
+                    logger.debug(f"略過無法解碼的 polyline: {e}")
+            zoom, center_lat, center_lng = self._choose_zoom_for_points(fit_points, W, H, padding_px=120)
 
             url_parts.append(f"size={W}x{H}")
             url_parts.append(f"zoom={zoom}")
             url_parts.append(f"center={center_lat},{center_lng}")
 
-            # 主路線：只畫線（不使用 fillcolor）
-            main_path = f"color:0x4285F4|weight:6|enc:{polyline}"
-            url_parts.append(f"path={quote(main_path)}")
-
-            # 替代路線：只畫線（不使用 fillcolor）
-            if alternative_polylines:
-                for alt_polyline in alternative_polylines:
-                    alt_path = f"color:0x808080|weight:4|enc:{alt_polyline}"
-                    url_parts.append(f"path={quote(alt_path)}")
-
             # 起點：紅色標記（不帶 label，由 _draw_ab_markers() 手動繪製）
             origin_marker = f"color:0xFF0000|{origin_geo['lat']},{origin_geo['lng']}"
-            url_parts.append(f"markers={quote(origin_marker)}")
-
             # 終點：綠色標記（不帶 label，由 _draw_ab_markers() 手動繪製）
             destination_marker = f"color:0x00FF00|{destination_geo['lat']},{destination_geo['lng']}"
-            url_parts.append(f"markers={quote(destination_marker)}")
-
-            url_parts.append(f"key={self.api_key}")
-
-            static_map_url = f"https://maps.googleapis.com/maps/api/staticmap?{'&'.join(url_parts)}"
+            marker_parts = [f"markers={quote(origin_marker)}", f"markers={quote(destination_marker)}"]
+
+            def build_url(paths):
+                path_parts = []
+                for i, encoded in enumerate(paths):
+                    # 主路線藍色、替代路線灰色：只畫線（不使用 fillcolor）
+                    style = "color:0x4285F4|weight:6" if i == 0 else "color:0x808080|weight:4"
+                    path_parts.append(f"path={quote(f'{style}|enc:{encoded}')}")
+                parts = url_parts + path_parts + marker_parts + [f"key={self.api_key}"]
+                return f"https://maps.googleapis.com/maps/api/staticmap?{'&'.join(parts)}"
+
+            paths = self._fit_static_map_paths(
+                [polyline] + list(alternative_polylines or []), build_url, zoom
+            )
+            polyline, alternative_polylines = paths[0], paths[1:]
+            static_map_url = build_url(paths)
             logger.debug(f"Static Maps API URL 長度: {len(static_map_url)} 字元")
 
-            response = requests.get(static_map_url, timeout=30)
-            if response.status_code != 200:
-                logger.error(f"下載靜態地圖失敗: HTTP {response.status_code}, Response: {response.text[:200]}")
-                return self._download_simple_static_map(
-                    polyline, origin_address, destination_address, distance_km, output_path
-                )
-
-            if not response.content.startswith(b"\x89PNG"):
-                error_text = response.text[:500] if hasattr(response, "text") else str(response.content[:200])
-                logger.error(f"下載的內容不是有效的 PNG 圖片: {error_text}")
-                return self._download_simple_static_map(
-                    polyline, origin_address, destination_address, distance_km, output_path
+            # 未標註的底圖以請求內容（不含 API Key）定址：重複路線直接使用既有底圖，不再呼叫 API
+            base_key = make_image_key("static", static_map_url.split("&key=")[0])
+            cached = map_image_store.lookup(base_key)
+            if cached:
+                logger.info("[MAP_STORE] 重複路線，使用既有靜態地圖底圖")
+                content = cached.read_bytes()
+            else:
+                static_map_limiter.acquire()
+                response = requests.get(static_map_url, timeout=30)
+                if response.status_code != 200:
+                    logger.error(f"下載靜態地圖失敗: HTTP {response.status_code}, Response: {response.text[:200]}")
+                    return self._download_simple_static_map(
+                        polyline, origin_address, destination_address, distance_km, output_path,
+                        origin_geo=origin_geo, destination_geo=destination_geo,
+                    )
+
+                if not response.content.startswith(b"\x89PNG"):
+                    error_text = response.text[:500] if hasattr(response, "text") else str(response.content[:200])
+                    logger.error(f"下載的內容不是有效的 PNG 圖片: {error_text}")
+                    return self._download_simple_static_map(
+                        polyline, origin_address, destination_address, distance_km, output_path,
+                        origin_geo=origin_geo, destination_geo=destination_geo,
+                    )
+                content = response.content
+                map_image_store.put_bytes(
+                    base_key, content, kind="static", origin=origin_address, destination=destination_address
                 )
 
+            origin_fmt = origin_geo.get("formatted_address", origin_address)
+            dest_fmt = destination_geo.get("formatted_address", destination_address)
+            generated_at = overlay_timestamp()
+            annotated_key = None
             if not output_path:
-                maps_dir = get_temp_maps_dir()
-                filename = f"map_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{hash(origin_address + destination_address) % 10000}.png"
-                output_path = maps_dir / filename
+                annotated_key = make_image_key(
+                    "annotated", base_key, distance_km=distance_km, origin=origin_fmt, destination=dest_fmt,
+                    generated_at=generated_at,
+                )
+                output_path = map_image_store.path_for(annotated_key)
             else:
                 output_path = Path(output_path)
 
-            with open(str(output_path), "wb") as f:
-                f.write(response.content)
-
-            # 加註：公里數 + A/B 地址（formatted address）+ 系統產出時間
-            # 加註：公里數 + A/B 地址（formatted address）+ 系統產出時間
-            # 1. 先加整體資訊（km + 右下時間）
-            self.annotate_map_info(
-                str(output_path),
+            # 加註：公里數 + 系統產出時間 + A/B marker 與旁邊的地址（formatted address），
+            # 直接由下載內容合成後一次寫檔
+            self.annotate_map_image(
+                content,
+                output_path,
                 distance_km,
-                origin_geo.get("formatted_address", origin_address),
-                destination_geo.get("formatted_address", destination_address),
-            )
-
-            # 2. 再加：A/B marker 旁邊的地址（貼近點）
-            self._annotate_ab_near_markers(
-                str(output_path),
-                origin_geo["lat"], origin_geo["lng"],
-                destination_geo["lat"], destination_geo["lng"],
-                origin_geo.get("formatted_address", origin_address),
-                destination_geo.get("formatted_address", destination_address),
-                zoom=zoom,
-                center_lat=center_lat,
-                center_lng=center_lng,
+                origin_fmt,
+                dest_fmt,
+                ab_markers={
+                    "a": (origin_geo["lat"], origin_geo["lng"]),
+                    "b": (destination_geo["lat"], destination_geo["lng"]),
+                    "zoom": zoom,
+                    "center": (center_lat, center_lng),
+                    "paths": [polyline] + list(alternative_polylines or []),
+                },
+                generated_at=generated_at,
             )
+            if annotated_key:
+                map_image_store.record(annotated_key, kind="annotated", base=base_key)
 
             logger.info(f"成功下載 Google Maps 官方樣式靜態地圖: {str(output_path)}")
             return str(output_path)
@@ -593,10 +640,45 @@ class GoogleMapsService:
             import traceback
             logger.error(traceback.format_exc())
             return self._download_simple_static_map(
-                polyline, origin_address, destination_address, distance_km, output_path
+                polyline, origin_address, destination_address, distance_km, output_path,
+                origin_geo=origin_geo, destination_geo=destination_geo,
             )
 
-    def _download_simple_static_map(self, polyline, origin_address, destination_address, distance_km=None, output_path=None):
+    def _fit_static_map_paths(self, paths, build_url, zoom=21):
+        """
+        讓 Static Maps URL 不超過長度上限：先以二分搜尋簡化所有路線，仍過長時由最後一條替代路線開始捨棄
+
+        Args:
+            paths: 編碼 polyline 列表（第一條為主路線）
+            build_url: 由 polyline 列表組出完整 URL 的函式
+            zoom: 地圖縮放等級（簡化容許誤差以此等級的像素計算）
+
+        Returns:
+            list: 可用的 polyline 列表（至少保留主路線）
+        """
+        def fits(candidate):
+            return len(build_url(candidate)) <= STATIC_MAPS_URL_LIMIT
+
+        original_length = len(build_url(paths))
+        while paths:
+            fitted = polyline_utils.fit_encoded(paths, fits, zoom=zoom)
+            if fitted is not None:
+                if fitted != paths:
+                    logger.info(
+                        f"[STATIC_MAP] URL 過長 ({original_length} 字元)，已簡化路線至 "
+                        f"{len(build_url(fitted))} 字元（保留 {len(fitted)} 條路線）"
+                    )
+                return fitted
+            if len(paths) == 1:
+                break
+            paths = paths[:-1]
+
+        # 只剩起終點仍過長（理論上不會發生），交由 API 回應錯誤
+        logger.warning(f"[STATIC_MAP] 無法將 URL 縮短至 {STATIC_MAPS_URL_LIMIT} 字元內")
+        return paths
+
+    def _download_simple_static_map(self, polyline, origin_address, destination_address, distance_km=None, output_path=None,
+                                    origin_geo=None, destination_geo=None):
         """
         回退方法：使用簡單的靜態地圖（當官方樣式失敗時使用）
         也會加註：公里數 + A/B 地址 + 系統產出時間（確保一致）
@@ -605,36 +687,45 @@ class GoogleMapsService:
             if not self.api_key:
                 return None
 
-            static_map_url = (
-                f"https://maps.googleapis.com/maps/api/staticmap?"
-                f"size=800x600&"
-                f"maptype=roadmap&"
-                f"path=enc:{polyline}&"
-                f"key={self.api_key}"
-            )
+            def build_url(paths):
+                return (
+                    f"https://maps.googleapis.com/maps/api/staticmap?"
+                    f"size=800x600&"
+                    f"maptype=roadmap&"
+                    f"path=enc:{paths[0]}&"
+                    f"key={self.api_key}"
+                )
+
+            static_map_url = build_url(self._fit_static_map_paths([polyline], build_url))
 
+            static_map_limiter.acquire()
             response = requests.get(static_map_url, timeout=30)
             if response.status_code != 200:
                 logger.error(f"下載簡單靜態地圖失敗: HTTP {response.status_code}")
                 return None
 
-            if not output_path:
-                maps_dir = get_temp_maps_dir()
-                filename = f"map_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{hash(origin_address + destination_address) % 10000}.png"
-                output_path = maps_dir / filename
-            else:
-                output_path = Path(output_path)
-
-            with open(str(output_path), "wb") as f:
-                f.write(response.content)
-
             # 嘗試拿 formatted address（沒有就用原字串）
-            origin_geo = self.geocode(origin_address) or {}
-            dest_geo = self.geocode(destination_address) or {}
+            origin_geo = origin_geo or self.geocode(origin_address) or {}
+            dest_geo = destination_geo or self.geocode(destination_address) or {}
             origin_fmt = origin_geo.get("formatted_address", origin_address)
             dest_fmt = dest_geo.get("formatted_address", destination_address)
 
-            self.annotate_map_info(str(output_path), distance_km, origin_fmt, dest_fmt)
+            generated_at = overlay_timestamp()
+            annotated_key = None
+            if not output_path:
+                annotated_key = make_image_key(
+                    "annotated", "static_simple", static_map_url.split("&key=")[0],
+                    distance_km=distance_km, origin=origin_fmt, destination=dest_fmt, generated_at=generated_at,
+                )
+                output_path = map_image_store.path_for(annotated_key)
+            else:
+                output_path = Path(output_path)
+
+            self.annotate_map_image(
+                response.content, output_path, distance_km, origin_fmt, dest_fmt, generated_at=generated_at
+            )
+            if annotated_key:
+                map_image_store.record(annotated_key, kind="annotated")
 
             logger.info(f"成功下載簡單靜態地圖: {str(output_path)}")
             return str(output_path)
@@ -645,7 +736,7 @@ class GoogleMapsService:
        
     # =========================
     # Helpers for marker pixel + zoom + label box
-    # (fix: ensure _annotate_ab_near_markers always works)
+    # (fix: ensure _draw_ab_overlay always works)
     # =========================
     def _latlng_to_pixel(self, lat, lng, zoom, W, H, center_lat, center_lng):
         """
@@ -676,64 +767,29 @@ class GoogleMapsService:
         Choose a zoom that fits both points in the image (with padding).
         Return: (zoom, center_lat, center_lng)
         """
-        lat1, lng1 = float(lat1), float(lng1)
-        lat2, lng2 = float(lat2), float(lng2)
-
-        center_lat = (lat1 + lat2) / 2.0
-        center_lng = (lng1 + lng2) / 2.0
-
-        best_zoom = 15
-        for z in range(21, -1, -1):
-            x1, y1 = self._latlng_to_pixel(lat1, lng1, z, W, H, center_lat, center_lng)
-            x2, y2 = self._latlng_to_pixel(lat2, lng2, z, W, H, center_lat, center_lng)
-
-            minx, maxx = min(x1, x2), max(x1, x2)
-            miny, maxy = min(y1, y2), max(y1, y2)
-
-            if (
-                minx >= padding_px and maxx <= (W - padding_px)
-                and miny >= padding_px and maxy <= (H - padding_px)
-            ):
-                best_zoom = z
-                break
+        return self._choose_zoom_for_points([(lat1, lng1), (lat2, lng2)], W, H, padding_px=padding_px)
 
-        return best_zoom, center_lat, center_lng
+    def _choose_zoom_for_points(self, points, W, H, padding_px=120):
+        """
+        Choose the largest zoom that fits the bounding box of all points (with padding).
+        Closed-form Web Mercator fit (utils.polyline.fit_zoom); center is the bbox midpoint.
+        Return: (zoom, center_lat, center_lng)
+        """
+        min_lat, min_lng, max_lat, max_lng = polyline_utils.bounds(points)
+        return polyline_utils.fit_zoom(min_lat, min_lng, max_lat, max_lng, W, H, padding_px=padding_px)
 
-    def _draw_label_box(self, draw, text, x, y, font, max_width=480, padding=10, line_spacing=4):
+    def _draw_label_box(self, draw, text, x, y, font, max_width=480, padding=10, line_spacing=4, measured=None):
         """
         Draw a rounded white label box with auto-wrapping by pixel width.
+        measured: measure_label_box() result, reused when the caller already measured the box.
         Return bbox: (l,t,r,b)
         """
         # pixel-based wrap (CJK safe)
-        lines = []
-        cur = ""
-        for ch in str(text):
-            test = cur + ch
-            bb = draw.textbbox((0, 0), test, font=font)
-            if (bb[2] - bb[0]) <= max_width:
-                cur = test
-            else:
-                if cur:
-                    lines.append(cur)
-                cur = ch
-        if cur:
-            lines.append(cur)
+        if measured is None:
+            measured = measure_label_box(text, font, max_width, padding=padding, line_spacing=line_spacing)
 
-        # measure line height
-        dummy = ImageDraw.Draw(Image.new("RGB", (1, 1)))
-        line_h = (dummy.textbbox((0, 0), "測", font=font)[3]) + line_spacing
-
-        # measure max line width
-        max_line_w = 0
-        for ln in lines:
-            bb = dummy.textbbox((0, 0), ln, font=font)
-            max_line_w = max(max_line_w, bb[2] - bb[0])
-
-        text_h = line_h * len(lines) - line_spacing
-        box_w = max_line_w + padding * 2
-        box_h = text_h + padding * 2
-
-        l, t, r, b = int(x), int(y), int(x + box_w), int(y + box_h)
+        l, t = int(x), int(y)
+        r, b = l + int(measured["width"]), t + int(measured["height"])
 
         # shadow
         draw.rounded_rectangle([l + 2, t + 2, r + 2, b + 2], radius=10, fill=(0, 0, 0, 80))
@@ -741,9 +797,9 @@ class GoogleMapsService:
         draw.rounded_rectangle([l, t, r, b], radius=10, fill=(255, 255, 255, 220))
 
         ty = t + padding
-        for ln in lines:
-            draw.text((l + padding, ty), ln, font=font, fill=(0, 0, 0, 255))
-            ty += line_h
+        for ln in measured["lines"]:
+            draw_text(draw, (l + padding, ty), ln, font, fill=(0, 0, 0, 255))
+            ty += measured["line_h"]
 
         return (l, t, r, b)
 
@@ -752,7 +808,7 @@ class GoogleMapsService:
         手動繪製 A/B 點 Marker (確保一定看得到)
         """
         # 圓點半徑（增大以更明顯）
-        r = 15
+        r = AB_MARKER_RADIUS
 
         # A: 紅色 (起點) - 外圈陰影
         draw.ellipse((ax - r - 2, ay - r - 2, ax + r + 2, ay + r + 2), fill=(0, 0, 0, 100))
@@ -776,104 +832,63 @@ class GoogleMapsService:
         a_bbox = draw.textbbox((0, 0), "A", font=font_marker)
         a_w = a_bbox[2] - a_bbox[0]
         a_h = a_bbox[3] - a_bbox[1]
-        draw.text((ax - a_w/2, ay - a_h/2), "A", fill=(255, 255, 255, 255), font=font_marker)
+        draw_text(draw, (ax - a_w/2, ay - a_h/2), "A", font_marker, fill=(255, 255, 255, 255))
         
         # B 文字
         b_bbox = draw.textbbox((0, 0), "B", font=font_marker)
         b_w = b_bbox[2] - b_bbox[0]
         b_h = b_bbox[3] - b_bbox[1]
-        draw.text((bx - b_w/2, by - b_h/2), "B", fill=(255, 255, 255, 255), font=font_marker)
+        draw_text(draw, (bx - b_w/2, by - b_h/2), "B", font_marker, fill=(255, 255, 255, 255))
 
-    def _annotate_ab_near_markers(self, image_path: str, a_lat, a_lng, b_lat, b_lng, a_addr: str, b_addr: str,
-                                  zoom: int, center_lat: float, center_lng: float):
+    def _draw_ab_overlay(self, base, ab_markers, a_addr: str, b_addr: str):
         """
-        將 A/B 地址畫在 A/B 點旁邊（貼近 marker）
+        將 A/B 點與地址畫在 A/B 點旁邊（貼近 marker，直接修改傳入影像）
         """
-        try:
-            img = Image.open(image_path)
-            if img.mode != "RGBA":
-                img = img.convert("RGBA")
+        draw = ImageDraw.Draw(base, "RGBA")
 
-            overlay = Image.new("RGBA", img.size, (255, 255, 255, 0))
-            draw = ImageDraw.Draw(overlay)
+        # 字型（使用新的通用載入邏輯）
+        font = self._load_cjk_font(24)
 
-            # 字型（使用新的通用載入邏輯）
-            font = self._load_cjk_font(24)
-
-            W, H = img.size
-
-            # 轉成像素座標
-            ax, ay = self._latlng_to_pixel(a_lat, a_lng, zoom, W, H, center_lat, center_lng)
-            bx, by = self._latlng_to_pixel(b_lat, b_lng, zoom, W, H, center_lat, center_lng)
-
-            # clamp 到畫面內（至少留 20px 邊界）
-            ax = int(min(max(ax, 20), W - 20))
-            ay = int(min(max(ay, 20), H - 20))
-            bx = int(min(max(bx, 20), W - 20))
-            by = int(min(max(by, 20), H - 20))
-
-            logger.info(f"[AB PIXEL] A=({ax},{ay}) B=({bx},{by}) zoom={zoom} center=({center_lat},{center_lng}) size=({W},{H})")
-
-            # 1. 先畫 A/B 圓點（不靠 Google markers）
-            self._draw_ab_markers(draw, ax, ay, bx, by)
-
-            # 2. 再畫 A/B 地址框（確保文字清晰可見）
-            a_text = f"A點（起點）：{a_addr}"
-            b_text = f"B點（終點）：{b_addr}"
-
-            # 預設放右上（避免壓到 marker），如果超出邊界就換位置
-            def place_box(px, py, text, prefer="right"):
-                offset = 20 # 避開 marker 半徑
-                # 調整最大寬度，避免遮擋太多地圖 (0.42 -> 0.32)
-                max_w = int(W * 0.32)
-
-                # 候選位置：右上、右下、左上、左下
-                candidates = []
-                if prefer == "right":
-                    candidates = [
-                        (px + offset, py - 60),
-                        (px + offset, py + offset),
-                        (px - max_w - offset, py - 60),
-                        (px - max_w - offset, py + offset),
-                    ]
-                else:
-                    candidates = [
-                        (px - max_w - offset, py - 60),
-                        (px - max_w - offset, py + offset),
-                        (px + offset, py - 60),
-                        (px + offset, py + offset),
-                    ]
-
-                for (x, y) in candidates:
-                    # 先畫在暫存 overlay 上試 bbox
-                    tmp = Image.new("RGBA", overlay.size, (0, 0, 0, 0))
-                    tmp_draw = ImageDraw.Draw(tmp)
-                    bb = self._draw_label_box(tmp_draw, text, x, y, font, max_width=max_w)
-                    l, t, r, b = bb
-                    if l >= 8 and t >= 8 and r <= W - 8 and b <= H - 8:
-                        # 真正畫到 overlay
-                        self._draw_label_box(draw, text, x, y, font, max_width=max_w)
-                        return
-
-                # 都不行就硬放（但 clamp 到邊界）
-                x = min(max(8, int(px + offset)), W - max_w - 8)
-                y = min(max(8, int(py + offset)), H - 80)
-                self._draw_label_box(draw, text, x, y, font, max_width=max_w)
-
-            place_box(ax, ay, a_text, prefer="right")
-            place_box(bx, by, b_text, prefer="left")
+        W, H = base.size
+        (a_lat, a_lng), (b_lat, b_lng) = ab_markers["a"], ab_markers["b"]
+        zoom = ab_markers["zoom"]
+        center_lat, center_lng = ab_markers["center"]
 
-            img = Image.alpha_composite(img, overlay)
+        # 轉成像素座標
+        ax, ay = self._latlng_to_pixel(a_lat, a_lng, zoom, W, H, center_lat, center_lng)
+        bx, by = self._latlng_to_pixel(b_lat, b_lng, zoom, W, H, center_lat, center_lng)
 
-            background = Image.new("RGB", img.size, (255, 255, 255))
-            background.paste(img, mask=img.split()[3])
-            background.save(image_path)
-            logger.info("地圖已加註 A/B Marker 旁地址 (Advanced Burn-in + Manual Markers)")
+        # clamp 到畫面內（至少留 20px 邊界）
+        ax = int(min(max(ax, 20), W - 20))
+        ay = int(min(max(ay, 20), H - 20))
+        bx = int(min(max(bx, 20), W - 20))
+        by = int(min(max(by, 20), H - 20))
 
-        except Exception as e:
-            logger.error(f"標註 A/B Marker 旁地址錯誤: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+        logger.info(f"[AB PIXEL] A=({ax},{ay}) B=({bx},{by}) zoom={zoom} center=({center_lat},{center_lng}) size=({W},{H})")
+
+        # 1. 先畫 A/B 圓點（不靠 Google markers）
+        self._draw_ab_markers(draw, ax, ay, bx, by)
+
+        # 2. 再畫 A/B 地址框（確保文字清晰可見）：量測一次，依與 marker / 路線 / 另一個標籤的重疊挑位置
+        layout = LabelLayout(W, H)
+        for px, py in ((ax, ay), (bx, by)):
+            layout.add_marker(px, py, AB_MARKER_RADIUS + 2)
+        for encoded in ab_markers.get("paths") or []:
+            layout.add_route(polyline_utils.project(
+                polyline_utils.decode(encoded), zoom, W, H, center_lat, center_lng
+            ))
+
+        # 調整最大寬度，避免遮擋太多地圖 (0.42 -> 0.32)
+        max_w = int(W * 0.32)
+        for px, py, text, prefer in (
+            (ax, ay, f"A點（起點）：{a_addr}", "right"),
+            (bx, by, f"B點（終點）：{b_addr}", "left"),
+        ):
+            measured = measure_label_box(text, font, max_w)
+            l, t, _, _ = layout.place(px, py, measured["width"], measured["height"], prefer=prefer)
+            self._draw_label_box(draw, text, l, t, font, max_width=max_w, measured=measured)
+
+        logger.info("地圖已加註 A/B Marker 旁地址 (Advanced Burn-in + Manual Markers)")
 
     # 仍保留：舊版只加 km 的功能（如果其他地方還在用）
     def _add_km_text_to_map(self, image_path, km):
@@ -890,39 +905,7 @@ class GoogleMapsService:
 
             text = f"{km} km"
 
-            font = None
-            font_paths = []
-
-            if os.name == "nt":
-                windows_font_dir = os.path.join(os.environ.get("WINDIR", "C:/Windows"), "Fonts")
-                font_paths.extend([
-                    os.path.join(windows_font_dir, "msjh.ttc"),
-                    os.path.join(windows_font_dir, "simsun.ttc"),
-                    os.path.join(windows_font_dir, "arial.ttf"),
-                ])
-            else:
-                linux_font_dirs = [
-                    "/usr/share/fonts/truetype/droid",
-                    "/usr/share/fonts/truetype/liberation",
-                    "/usr/share/fonts/TTF",
-                ]
-                for font_dir in linux_font_dirs:
-                    if os.path.exists(font_dir):
-                        font_paths.extend([
-                            os.path.join(font_dir, "DroidSansFallbackFull.ttf"),
-                            os.path.join(font_dir, "LiberationSans-Regular.ttf"),
-                        ])
-
-            for font_path in font_paths:
-                if os.path.exists(font_path):
-                    try:
-                        font = ImageFont.truetype(font_path, 36)
-                        break
-                    except Exception:
-                        continue
-
-            if font is None:
-                font = ImageFont.load_default()
+            font = get_cjk_font(36, fallback=True)
 
             x, y = 20, 20
             bbox = draw.textbbox((x, y), text, font=font)
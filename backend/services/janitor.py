@@ -0,0 +1,309 @@
+"""
+暫存檔清理服務
+依各目錄的保留政策（最長保留時間、總大小上限）定期刪除 temp/、temp/maps/、temp/parsed/、output/ 中的舊檔案，
+略過仍在使用的檔案（批次工作與出差紀錄引用的地圖、暫時保留的批次結果），並記錄回收的檔案數與位元組數。
+可由背景執行緒定期執行，或以命令列執行一次：
+
+    cd backend
+    python -m services.janitor --dry-run
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from loguru import logger
+
+from utils.path_manager import get_base_dir, get_output_dir, get_parsed_cache_dir, get_temp_dir, get_temp_maps_dir
+
+
+class RetentionPolicy:
+    """單一目錄的保留政策"""
+
+    def __init__(self, name, directory, max_age_seconds=None, max_bytes=None):
+        """
+        Args:
+            name: 政策名稱（統計用）
+            directory: 目錄（只處理該層檔案，不含子目錄）
+            max_age_seconds: 最長保留秒數（None 表示不限）
+            max_bytes: 目錄總大小上限（None 表示不限；超過時由最舊的檔案開始刪除）
+        """
+        self.name = name
+        self.directory = Path(directory)
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+
+
+class TempJanitor:
+    """暫存檔清理（執行緒安全；同名不同副檔名的檔案視為一組，例如地圖圖片與其 .json 中繼資料）"""
+
+    def __init__(self, policies, interval_seconds=3600, min_age_seconds=600):
+        """
+        Args:
+            policies: RetentionPolicy 列表
+            interval_seconds: 背景執行間隔秒數
+            min_age_seconds: 最短保留秒數（剛產生、尚未被紀錄引用的檔案不會被刪除）
+        """
+        self.policies = list(policies)
+        self.interval_seconds = interval_seconds
+        self.min_age_seconds = min_age_seconds
+
+        self._protected_providers = []
+        self._holds = {}  # 路徑 -> 保留到期時間
+        self._holds_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.runs = 0
+        self.reclaimed_files = 0
+        self.reclaimed_bytes = 0
+        self.last_run = None
+
+    def add_protected(self, provider):
+        """
+        註冊使用中檔案的來源
+
+        Args:
+            provider: provider() -> 檔案路徑列表（相對路徑以專案根目錄為基準，例如 /temp/maps/x.png）
+        """
+        self._protected_providers.append(provider)
+
+    def hold(self, paths, seconds):
+        """
+        暫時保護檔案（例如已回傳給前端、之後才會匯出的批次結果圖片）
+
+        Args:
+            paths: 檔案路徑列表（格式同 add_protected）
+            seconds: 保留秒數
+        """
+        expires_at = time.time() + seconds
+        with self._holds_lock:
+            for path in paths:
+                if path:
+                    self._holds[str(path)] = max(expires_at, self._holds.get(str(path), 0))
+
+    def run_once(self, dry_run=False):
+        """
+        依所有政策清理一次
+
+        Args:
+            dry_run: 只計算會刪除的檔案，不實際刪除
+
+        Returns:
+            dict: {"files": 刪除檔案數, "bytes": 回收位元組數, "protected": 因使用中略過的檔案數,
+                   "directories": {政策名稱: {"files", "bytes", "remaining_bytes"}}, "dry_run": bool}
+        """
+        with self._lock:
+            protected = self._protected_paths()
+            now = time.time()
+            result = {"files": 0, "bytes": 0, "protected": 0, "directories": {}, "dry_run": dry_run}
+            for policy in self.policies:
+                stats = self._apply(policy, protected, now, dry_run)
+                result["directories"][policy.name] = {
+                    "files": stats["files"], "bytes": stats["bytes"], "remaining_bytes": stats["remaining_bytes"],
+                }
+                result["files"] += stats["files"]
+                result["bytes"] += stats["bytes"]
+                result["protected"] += stats["protected"]
+
+            if not dry_run:
+                self.runs += 1
+                self.reclaimed_files += result["files"]
+                self.reclaimed_bytes += result["bytes"]
+                self.last_run = {"at": datetime.now().isoformat(), **result}
+            if result["files"]:
+                logger.info(
+                    f"[JANITOR] {'(試算) ' if dry_run else ''}刪除 {result['files']} 個檔案，"
+                    f"回收 {result['bytes']} bytes，略過使用中 {result['protected']} 個"
+                )
+            return result
+
+    def stats(self):
+        """
+        取得累計統計
+
+        Returns:
+            dict: 執行次數、累計刪除檔案數與位元組數、上次執行結果
+        """
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "reclaimed_files": self.reclaimed_files,
+                "reclaimed_bytes": self.reclaimed_bytes,
+                "last_run": self.last_run,
+            }
+
+    def start(self):
+        """啟動背景清理執行緒（已啟動時不重複建立）"""
+        if self.interval_seconds <= 0:
+            logger.info("[JANITOR] 未啟用定期清理")
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="temp-janitor", daemon=True)
+            self._thread.start()
+        logger.info(f"[JANITOR] 定期清理已啟動，每 {self.interval_seconds} 秒執行一次")
+
+    def stop(self):
+        """停止背景清理執行緒"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"[JANITOR] 清理失敗: {str(e)}")
+            self._stop.wait(self.interval_seconds)
+
+    def _protected_paths(self):
+        now = time.time()
+        with self._holds_lock:
+            self._holds = {path: expires_at for path, expires_at in self._holds.items() if expires_at > now}
+            paths = list(self._holds)
+        for provider in self._protected_providers:
+            try:
+                paths.extend(provider() or [])
+            except Exception as e:
+                logger.warning(f"[JANITOR] 無法取得使用中檔案: {str(e)}")
+
+        base_dir = get_base_dir()
+        protected = set()
+        for path in paths:
+            if not path:
+                continue
+            # 紀錄中的路徑多為 /temp/maps/x.png 形式（以專案根目錄為基準），兩種解讀都列入
+            path = Path(str(path))
+            candidates = [base_dir / str(path).lstrip("/\\")]
+            if path.is_absolute():
+                candidates.append(path)
+            for candidate in candidates:
+                protected.add(os.path.normcase(str(candidate.resolve())))
+        return protected
+
+    def _apply(self, policy, protected, now, dry_run):
+        stats = {"files": 0, "bytes": 0, "protected": 0, "remaining_bytes": 0}
+        if not policy.directory.is_dir():
+            return stats
+
+        # 同名不同副檔名的檔案為一組：以最新的修改時間為準，一起保留或刪除
+        groups = {}
+        for entry in os.scandir(policy.directory):
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            stem = entry.name.split(".", 1)[0]
+            group = groups.setdefault(stem, {"paths": [], "bytes": 0, "mtime": 0.0, "protected": False})
+            group["paths"].append(Path(entry.path))
+            group["bytes"] += st.st_size
+            group["mtime"] = max(group["mtime"], st.st_mtime)
+            if os.path.normcase(str(Path(entry.path).resolve())) in protected:
+                group["protected"] = True
+
+        candidates = []
+        for group in groups.values():
+            if group["protected"]:
+                stats["protected"] += len(group["paths"])
+            elif now - group["mtime"] >= self.min_age_seconds:
+                candidates.append(group)
+        candidates.sort(key=lambda g: g["mtime"])
+
+        remaining = sum(g["bytes"] for g in groups.values())
+        for group in candidates:
+            expired = policy.max_age_seconds is not None and now - group["mtime"] > policy.max_age_seconds
+            oversize = policy.max_bytes is not None and remaining > policy.max_bytes
+            if not (expired or oversize):
+                continue
+            deleted = group["paths"] if dry_run else self._delete(group["paths"])
+            stats["files"] += len(deleted)
+            stats["bytes"] += group["bytes"]
+            remaining -= group["bytes"]
+
+        stats["remaining_bytes"] = remaining
+        return stats
+
+    @staticmethod
+    def _delete(paths):
+        deleted = []
+        for path in paths:
+            try:
+                path.unlink()
+                deleted.append(path)
+            except FileNotFoundError:
+                deleted.append(path)
+            except OSError as e:
+                logger.warning(f"[JANITOR] 無法刪除 {path}: {str(e)}")
+        return deleted
+
+
+def _hours(name, default):
+    value = float(os.getenv(name, default))
+    return value * 3600 if value > 0 else None
+
+
+def _megabytes(name, default):
+    value = float(os.getenv(name, default))
+    return int(value * 1024 * 1024) if value > 0 else None
+
+
+def default_policies():
+    """
+    依環境變數建立 temp/、temp/maps/、temp/parsed/、output/ 的保留政策（設定為 0 表示不限）
+
+    Returns:
+        list: RetentionPolicy 列表
+    """
+    return [
+        RetentionPolicy(
+            "temp", get_temp_dir(),
+            max_age_seconds=_hours("TEMP_RETENTION_HOURS", "24"),
+            max_bytes=_megabytes("TEMP_MAX_MB", "512"),
+        ),
+        RetentionPolicy(
+            "maps", get_temp_maps_dir(),
+            max_age_seconds=_hours("MAPS_RETENTION_HOURS", "168"),
+            max_bytes=_megabytes("MAPS_MAX_MB", "2048"),
+        ),
+        RetentionPolicy(
+            "parsed", get_parsed_cache_dir(),
+            max_age_seconds=_hours("PARSED_RETENTION_HOURS", "168"),
+            max_bytes=_megabytes("PARSED_MAX_MB", "256"),
+        ),
+        RetentionPolicy(
+            "output", get_output_dir(),
+            max_age_seconds=_hours("OUTPUT_RETENTION_HOURS", "72"),
+            max_bytes=_megabytes("OUTPUT_MAX_MB", "1024"),
+        ),
+    ]
+
+
+janitor = TempJanitor(
+    default_policies(),
+    interval_seconds=float(os.getenv("JANITOR_INTERVAL_MINUTES", "60")) * 60,
+    min_age_seconds=float(os.getenv("JANITOR_MIN_AGE_MINUTES", "10")) * 60,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="清理 temp/、temp/maps/、temp/parsed/、output/ 的舊檔案")
+    parser.add_argument("--dry-run", action="store_true", help="只列出會回收的檔案數與大小，不實際刪除")
+    args = parser.parse_args()
+
+    result = janitor.run_once(dry_run=args.dry_run)
+    for name, stats in result["directories"].items():
+        print(f"{name}: 刪除 {stats['files']} 個檔案，回收 {stats['bytes']} bytes，剩餘 {stats['remaining_bytes']} bytes")
+    print(f"合計: {result['files']} 個檔案，{result['bytes']} bytes（略過使用中 {result['protected']} 個）")
+
+
+if __name__ == "__main__":
+    main()
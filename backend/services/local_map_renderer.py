@@ -0,0 +1,170 @@
+"""
+本機地圖繪製服務（離線回退）
+截圖與 Static Maps API 都失敗時，直接以 Pillow / NumPy 將路線 polyline（含替代路線）畫在
+素色或快取圖磚背景上，再套用與其他地圖相同的標註（KM Badge、A/B Marker 與地址框、時間），
+不需要任何網路連線。
+"""
+from pathlib import Path
+
+from loguru import logger
+import numpy as np
+from PIL import Image, ImageDraw
+
+from services.google_maps_service import overlay_timestamp
+from services.map_image_store import make_image_key, map_image_store
+from utils import polyline as polyline_utils
+
+# 畫面與配色（與 Static Maps 官方樣式相近：主路線藍色、替代路線灰色）
+MAP_WIDTH = 1200
+MAP_HEIGHT = 800
+MAP_PADDING_PX = 120
+BACKGROUND_COLOR = (242, 239, 233)
+ROUTE_COLOR = (66, 133, 244)
+ROUTE_CASING_COLOR = (255, 255, 255)
+ALTERNATIVE_COLOR = (128, 128, 128)
+ROUTE_WIDTH = 6
+ALTERNATIVE_WIDTH = 4
+# 圓角接點由 Pillow 逐點繪製；點數很多時線段極短，不需圓角即看不出缺口
+CURVE_JOINT_MAX_POINTS = 500
+# 素色背景的 PNG 以低壓縮等級編碼（檔案略大，但編碼時間約減半）
+PNG_COMPRESS_LEVEL = 1
+
+
+class LocalMapRenderer:
+    """本機路線地圖繪製（不需網路）"""
+
+    def __init__(self, maps_service, width=MAP_WIDTH, height=MAP_HEIGHT, background=None):
+        """
+        Args:
+            maps_service: GoogleMapsService（共用標註流程）
+            width: 圖片寬
+            height: 圖片高
+            background: 背景提供者 background(zoom, center_lat, center_lng, width, height) -> Image | None，
+                        None 或回傳 None 時使用素色背景
+        """
+        self.maps_service = maps_service
+        self.width = width
+        self.height = height
+        self.background = background
+
+    def render_base(self, polylines, origin_geo=None, destination_geo=None):
+        """
+        繪製底圖與路線（不含標註）
+
+        Args:
+            polylines: 編碼 polyline 列表（第一條為主路線，其餘為替代路線）
+            origin_geo: 起點座標 {"lat", "lng"}（None 表示使用主路線第一個點）
+            destination_geo: 終點座標 {"lat", "lng"}（None 表示使用主路線最後一個點）
+
+        Returns:
+            tuple: (RGB 影像, ab_markers)；ab_markers 可直接傳給 annotate_map_image()
+        """
+        decoded = [polyline_utils.decode(encoded) for encoded in polylines if encoded]
+        if not decoded or len(decoded[0]) == 0:
+            raise ValueError("沒有可繪製的路線")
+
+        main = decoded[0]
+        a = (origin_geo["lat"], origin_geo["lng"]) if origin_geo else tuple(main[0])
+        b = (destination_geo["lat"], destination_geo["lng"]) if destination_geo else tuple(main[-1])
+
+        min_lat, min_lng, max_lat, max_lng = polyline_utils.bounds(np.vstack([[a, b]] + decoded))
+        zoom, center_lat, center_lng = polyline_utils.fit_zoom(
+            min_lat, min_lng, max_lat, max_lng, self.width, self.height, padding_px=MAP_PADDING_PX
+        )
+
+        base = self._background(zoom, center_lat, center_lng)
+        draw = ImageDraw.Draw(base)
+        # 替代路線先畫，主路線蓋在最上層
+        for points in decoded[1:]:
+            self._draw_path(draw, points, zoom, center_lat, center_lng, ALTERNATIVE_COLOR, ALTERNATIVE_WIDTH)
+        self._draw_path(draw, main, zoom, center_lat, center_lng, ROUTE_CASING_COLOR, ROUTE_WIDTH + 4)
+        self._draw_path(draw, main, zoom, center_lat, center_lng, ROUTE_COLOR, ROUTE_WIDTH)
+
+        ab_markers = {
+            "a": (float(a[0]), float(a[1])),
+            "b": (float(b[0]), float(b[1])),
+            "zoom": zoom,
+            "center": (center_lat, center_lng),
+            "paths": [encoded for encoded in polylines if encoded],
+        }
+        return base, ab_markers
+
+    def render(self, route_detail, origin_address, destination_address, origin_geo=None, destination_geo=None,
+               output_path=None):
+        """
+        繪製路線地圖並套用標註（KM + A/B 地址 + 系統產出時間）
+
+        Args:
+            route_detail: get_route_detail() 結果（需有 polyline）
+            origin_address: 起點地址
+            destination_address: 終點地址
+            origin_geo: 起點座標（含 formatted_address 時作為地址框文字）
+            destination_geo: 終點座標
+            output_path: 輸出路徑（None 表示存放於地圖圖片儲存，檔名由路線與標註內容決定）
+
+        Returns:
+            str: 圖片路徑，失敗時為 None
+        """
+        try:
+            polylines = [route_detail.get("polyline")] + list(route_detail.get("alternative_polylines") or [])
+            base, ab_markers = self.render_base(polylines, origin_geo, destination_geo)
+
+            origin_fmt = (origin_geo or {}).get("formatted_address", origin_address)
+            dest_fmt = (destination_geo or {}).get("formatted_address", destination_address)
+            generated_at = overlay_timestamp()
+            image_key = None
+            if not output_path:
+                image_key = make_image_key(
+                    "local", *ab_markers["paths"],
+                    a=ab_markers["a"], b=ab_markers["b"], size=f"{self.width}x{self.height}",
+                    background=self.background is not None,
+                    distance_km=route_detail.get("distance_km"), origin=origin_fmt, destination=dest_fmt,
+                    generated_at=generated_at,
+                )
+                output_path = map_image_store.path_for(image_key)
+            else:
+                output_path = Path(output_path)
+
+            annotated = self.maps_service.annotate_map_image(
+                base,
+                output_path,
+                route_detail.get("distance_km"),
+                origin_fmt,
+                dest_fmt,
+                round_trip_km=route_detail.get("round_trip_km"),
+                ab_markers=ab_markers,
+                compress_level=PNG_COMPRESS_LEVEL,
+                generated_at=generated_at,
+                copy=False,
+            )
+            if not annotated:
+                return None
+            if image_key:
+                map_image_store.record(image_key, kind="local", origin=origin_address, destination=destination_address)
+
+            logger.info(f"[LOCAL_MAP] 已於本機繪製路線地圖: {str(output_path)}")
+            return str(output_path)
+
+        except Exception as e:
+            logger.error(f"[LOCAL_MAP] 本機繪製地圖錯誤: {str(e)}")
+            return None
+
+    def _background(self, zoom, center_lat, center_lng):
+        if self.background is not None:
+            try:
+                image = self.background(zoom, center_lat, center_lng, self.width, self.height)
+                if image is not None:
+                    return image.convert("RGB") if image.mode != "RGB" else image
+            except Exception as e:
+                logger.warning(f"[LOCAL_MAP] 取得背景失敗，改用素色背景: {str(e)}")
+        return Image.new("RGB", (self.width, self.height), BACKGROUND_COLOR)
+
+    def _draw_path(self, draw, points, zoom, center_lat, center_lng, color, width):
+        pixels = polyline_utils.project(points, zoom, self.width, self.height, center_lat, center_lng)
+        if len(pixels) == 1:
+            x, y = pixels[0]
+            r = width / 2
+            draw.ellipse([x - r, y - r, x + r, y + r], fill=color)
+            return
+        joint = "curve" if len(pixels) <= CURVE_JOINT_MAX_POINTS else None
+        draw.line([tuple(p) for p in pixels.tolist()], fill=color, width=width, joint=joint)
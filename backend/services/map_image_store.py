@@ -0,0 +1,181 @@
+"""
+地圖圖片內容定址儲存
+以「路線鍵 + 繪製參數」的 SHA-256 作為檔名（map_{key}.png），旁邊以 map_{key}.json 記錄中繼資料；
+相同路線與參數的圖片只產生一次，重複路線可直接取用既有的底圖，也不再有檔名衝突。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from utils.atomic_write import write_bytes_atomic
+from utils.path_manager import get_temp_maps_dir
+
+IMAGE_PREFIX = "map_"
+IMAGE_SUFFIX = ".png"
+META_SUFFIX = ".json"
+
+
+def make_image_key(kind, *parts, **params) -> str:
+    """
+    產生圖片鍵值
+
+    Args:
+        kind: 圖片種類（例如 "screenshot"、"static"、"annotated"）
+        *parts: 路線鍵（起點、終點等）
+        **params: 繪製參數（尺寸、縮放、日期等）
+
+    Returns:
+        str: SHA-256 十六進位字串
+    """
+    payload = json.dumps([kind, list(parts), params], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MapImageStore:
+    """內容定址的地圖圖片儲存（圖片 + 中繼資料 sidecar，執行緒安全）"""
+
+    def __init__(self, root=None, ttl_seconds=None):
+        """
+        Args:
+            root: 儲存目錄（None 表示 temp/maps，於使用時才解析）
+            ttl_seconds: 圖片有效秒數（None 或 <= 0 表示不過期）；過期圖片查詢時視為不存在
+        """
+        self._root = Path(root) if root is not None else None
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def root(self) -> Path:
+        if self._root is None:
+            return get_temp_maps_dir()
+        self._root.mkdir(parents=True, exist_ok=True)
+        return self._root
+
+    def path_for(self, key) -> Path:
+        """圖片路徑（不論是否存在）"""
+        return self.root / f"{IMAGE_PREFIX}{key}{IMAGE_SUFFIX}"
+
+    def key_for_path(self, path):
+        """
+        由圖片路徑取回鍵值
+
+        Returns:
+            str: 鍵值，不是此儲存的檔名時為 None
+        """
+        name = Path(str(path)).name
+        if not (name.startswith(IMAGE_PREFIX) and name.endswith(IMAGE_SUFFIX)):
+            return None
+        key = name[len(IMAGE_PREFIX):-len(IMAGE_SUFFIX)]
+        return key if len(key) == 64 and all(c in "0123456789abcdef" for c in key) else None
+
+    def lookup(self, key):
+        """
+        查詢已產生的圖片；命中時更新圖片與中繼資料的修改時間，暫存檔清理依最後使用時間保留重複使用的圖片
+
+        Returns:
+            Path: 圖片路徑，不存在或已過期時為 None
+        """
+        path = self.path_for(key)
+        meta = self.metadata(key)
+        fresh = meta is not None and (
+            self.ttl_seconds is None or time.time() - meta.get("created_at", 0) <= self.ttl_seconds
+        )
+        if fresh and self._touch(path):
+            self._touch(self._meta_path(key))
+            with self._lock:
+                self.hits += 1
+            return path
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def metadata(self, key):
+        """
+        讀取中繼資料
+
+        Returns:
+            dict: 中繼資料（含 created_at），不存在時為 None
+        """
+        try:
+            return json.loads(self._meta_path(key).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def put_bytes(self, key, data, **metadata) -> Path:
+        """
+        寫入圖片內容與中繼資料
+
+        Returns:
+            Path: 圖片路徑
+        """
+        path = self.path_for(key)
+        write_bytes_atomic(path, data)
+        self.record(key, size=len(data), **metadata)
+        return path
+
+    def put_file(self, key, source, **metadata) -> Path:
+        """
+        將已產生的檔案移入儲存（同一檔案系統內為改名）
+
+        Returns:
+            Path: 圖片路徑
+        """
+        path = self.path_for(key)
+        source = Path(source)
+        if source.resolve() != path.resolve():
+            os.replace(source, path)
+        self.record(key, size=path.stat().st_size, **metadata)
+        return path
+
+    def record(self, key, **metadata):
+        """
+        為已寫入 path_for(key) 的圖片建立或更新中繼資料
+
+        Returns:
+            dict: 中繼資料
+        """
+        with self._lock:
+            meta = self.metadata(key) or {}
+            meta.update(metadata)
+            meta["key"] = key
+            meta["created_at"] = time.time()
+            if "size" not in metadata and self.path_for(key).exists():
+                meta["size"] = self.path_for(key).stat().st_size
+            self._write_meta(key, meta)
+            return meta
+
+    def stats(self):
+        """
+        取得查詢統計
+
+        Returns:
+            dict: 命中與未命中次數
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def _meta_path(self, key) -> Path:
+        return self.root / f"{IMAGE_PREFIX}{key}{META_SUFFIX}"
+
+    def _write_meta(self, key, meta):
+        write_bytes_atomic(
+            self._meta_path(key),
+            json.dumps(meta, ensure_ascii=False, sort_keys=True).encode("utf-8"),
+        )
+
+
+# 全程序共用（temp/maps）；圖片有效天數由 MAP_IMAGE_TTL_DAYS 設定
+map_image_store = MapImageStore(ttl_seconds=float(os.getenv("MAP_IMAGE_TTL_DAYS", "7")) * 86400)
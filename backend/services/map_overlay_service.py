@@ -4,9 +4,11 @@
 """
 from pathlib import Path
 from typing import Optional
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 from loguru import logger
-import os
+
+from utils.font_registry import get_cjk_font
+from utils.text_render import draw_text, text_size
 
 
 def add_distance_overlay(
@@ -56,59 +58,12 @@ def add_distance_overlay(
         
         # 計算文字大小和框的大小
         # 使用較大的字體，類似 Google Maps 的風格
-        # 使用跨平台字體路徑檢測，避免硬編碼絕對路徑
+        # 字體由全程序共用的字體登錄表提供（找不到中文字體時使用預設字體）
         font_size = 24
-        font = None
-        font_paths = []
-        
-        # Windows 字體路徑
-        if os.name == 'nt':
-            windows_font_dir = os.path.join(os.environ.get('WINDIR', 'C:/Windows'), 'Fonts')
-            font_paths.extend([
-                os.path.join(windows_font_dir, 'msjh.ttc'),  # 微軟正黑體
-                os.path.join(windows_font_dir, 'simsun.ttc'),  # 新細明體
-                os.path.join(windows_font_dir, 'arial.ttf'),  # Arial
-            ])
-        
-        # Linux 字體路徑
-        elif os.name == 'posix':
-            linux_font_dirs = [
-                '/usr/share/fonts/truetype/droid',
-                '/usr/share/fonts/truetype/liberation',
-                '/usr/share/fonts/TTF',
-            ]
-            for font_dir in linux_font_dirs:
-                if os.path.exists(font_dir):
-                    font_paths.extend([
-                        os.path.join(font_dir, 'DroidSansFallbackFull.ttf'),
-                        os.path.join(font_dir, 'LiberationSans-Regular.ttf'),
-                    ])
-        
-        # 嘗試載入字體
-        try:
-            for font_path in font_paths:
-                if os.path.exists(font_path):
-                    try:
-                        font = ImageFont.truetype(font_path, font_size)
-                        break
-                    except Exception:
-                        continue
-            
-            # 如果找不到字體，使用預設字體
-            if font is None:
-                font = ImageFont.load_default()
-                logger.warning("使用預設字體，可能顯示效果不佳")
-        except Exception as e:
-            logger.warning(f"載入字體失敗，使用預設字體: {e}")
-            font = ImageFont.load_default()
+        font = get_cjk_font(font_size, fallback=True)
         
         # 計算每行文字的大小
-        line_heights = []
-        line_widths = []
-        for line in lines:
-            bbox = draw.textbbox((0, 0), line, font=font)
-            line_widths.append(bbox[2] - bbox[0])
-            line_heights.append(bbox[3] - bbox[1])
+        line_widths, line_heights = zip(*(text_size(font, line) for line in lines))
         
         # 框的尺寸
         padding = 12  # 內邊距
@@ -154,7 +109,7 @@ def add_distance_overlay(
             text_y = current_y - bbox[1] if bbox[1] < 0 else current_y
             
             # 繪製文字（黑色）
-            draw.text((text_x, text_y), line, fill=(0, 0, 0), font=font)
+            draw_text(draw, (text_x, text_y), line, font, fill=(0, 0, 0))
             
             # 更新下一行的 Y 位置
             current_y += line_heights[i] + line_spacing
@@ -0,0 +1,102 @@
+"""
+批次地點解析表
+單一批次（請求）內共用：每個不同的地點名稱只解析一次（對應表 → 快取 → API），
+並保留地理座標供靜態地圖回退使用，避免同一地點重複地理編碼。
+"""
+import threading
+
+from loguru import logger
+
+from utils.log_sanitizer import sanitize_log_input
+
+
+class PlaceResolver:
+    """請求範圍的地點解析表（執行緒安全，同一名稱只解析一次）"""
+
+    def __init__(self, maps_service, place_mapping):
+        """
+        Args:
+            maps_service: GoogleMapsService（geocode 會先查快取）
+            place_mapping: PlaceMappingService（地點名稱對應表）
+        """
+        self.maps_service = maps_service
+        self.place_mapping = place_mapping
+
+        self._addresses = {}  # 地點名稱 -> (地址, 來源)
+        self._locations = {}  # 地址或名稱 -> geocode 結果（查無為 None）
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.geocode_calls = 0
+
+    def resolve(self, place_name):
+        """
+        解析地點名稱：對應表（完全相符）→ 地理編碼（快取 → API）→ 對應表（模糊比對）→ 原始名稱
+
+        Args:
+            place_name: 地點名稱
+
+        Returns:
+            tuple: (地址, 來源 "mapping" | "geocode" | "raw")
+        """
+        with self._key_lock(("name", place_name)):
+            if place_name in self._addresses:
+                return self._addresses[place_name]
+
+            safe_name = sanitize_log_input(place_name)
+            mapped = self.place_mapping.get_all_mappings().get(place_name)
+            if mapped:
+                resolved = (mapped, "mapping")
+                logger.info(f"[PLACE] 使用對應表: {safe_name} -> {sanitize_log_input(mapped)}")
+            else:
+                geo = self.locate(place_name)
+                if geo:
+                    resolved = (geo.get("formatted_address", place_name), "geocode")
+                    logger.info(f"[PLACE] Google Maps 解析成功: {safe_name} -> {sanitize_log_input(resolved[0])}")
+                else:
+                    mapped = self.place_mapping.get_address(place_name)
+                    if mapped:
+                        resolved = (mapped, "mapping")
+                        logger.info(f"[PLACE] 使用對應表: {safe_name} -> {sanitize_log_input(mapped)}")
+                    else:
+                        resolved = (place_name, "raw")
+                        logger.warning(f"[PLACE] 無法解析，使用原始名稱: {safe_name}")
+
+            self._addresses[place_name] = resolved
+            return resolved
+
+    def locate(self, address):
+        """
+        取得地址的地理座標（同一地址只查詢一次；地點名稱解析時的結果也會共用）
+
+        Args:
+            address: 地址或地點名稱
+
+        Returns:
+            dict: {"lat", "lng", "formatted_address"}，查無結果時為 None
+        """
+        with self._key_lock(("location", address)):
+            if address in self._locations:
+                return self._locations[address]
+
+            geo = self.maps_service.geocode(address)
+            with self._lock:
+                self.geocode_calls += 1
+                self._locations[address] = geo
+                if geo and geo.get("formatted_address"):
+                    # 解析後的地址即為後續路線與靜態地圖使用的字串
+                    self._locations.setdefault(geo["formatted_address"], geo)
+            return geo
+
+    def stats(self):
+        """
+        取得解析統計
+
+        Returns:
+            dict: 不同地點名稱數與地理編碼查詢次數
+        """
+        with self._lock:
+            return {"places": len(self._addresses), "geocode_calls": self.geocode_calls}
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
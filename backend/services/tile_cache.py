@@ -0,0 +1,307 @@
+"""
+地圖圖磚快取服務
+以 z/x/y 為鍵、內容雜湊（SHA-256）為檔名存放圖磚（相同內容只存一份），
+依總大小以 LRU 淘汰；合成器由快取圖磚拼出本機繪製地圖的背景，圖磚來源可替換（測試可用本機假伺服器）。
+"""
+import hashlib
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import requests
+from loguru import logger
+from PIL import Image
+
+from utils import polyline as polyline_utils
+from utils.atomic_write import write_bytes_atomic
+from utils.path_manager import get_tile_cache_dir
+from utils.rate_limiter import RateLimiter
+
+TILE_SIZE = 256
+# 找不到圖磚的區塊以此顏色填滿（與本機繪製的素色背景相同）
+TILE_FILL_COLOR = (242, 239, 233)
+
+
+class TileStore:
+    """圖磚磁碟快取（z/x/y 索引 + 內容定址檔案 + 依總大小 LRU 淘汰，執行緒安全）"""
+
+    def __init__(self, root, max_bytes):
+        """
+        Args:
+            root: 快取目錄（其下 index/{z}/{x}/{y}.ref 記錄內容雜湊，blobs/ 存放圖磚內容）
+            max_bytes: 圖磚內容總大小上限（位元組）
+        """
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self._index_dir = self.root / "index"
+        self._blobs_dir = self.root / "blobs"
+
+        self._entries = OrderedDict()  # (z, x, y) -> 內容雜湊（由舊到新）
+        self._blob_sizes = {}          # 內容雜湊 -> 大小
+        self._blob_refs = {}           # 內容雜湊 -> 參照的 z/x/y 數
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def get(self, z, x, y):
+        """
+        取得圖磚內容
+
+        Returns:
+            bytes: 圖磚內容，未快取時為 None
+        """
+        key = (int(z), int(x), int(y))
+        with self._lock:
+            digest = self._entries.get(key)
+            if digest is None:
+                self.misses += 1
+                return None
+        # 只在鎖內查詢內容雜湊，讀檔不持有鎖（內容定址檔案寫入後不會改變），各執行緒可同時讀取
+        try:
+            data = self._blob_path(digest).read_bytes()
+        except OSError:
+            data = None
+        with self._lock:
+            if data is None:
+                # 檔案被外部刪除（或讀取前剛被淘汰）：視為未快取
+                if self._entries.get(key) == digest:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        self._touch(key)
+        return data
+
+    def put(self, z, x, y, data):
+        """
+        存入圖磚內容（相同內容的圖磚共用同一個檔案），超過大小上限時淘汰最久未使用的圖磚
+
+        Returns:
+            str: 內容雜湊
+        """
+        key = (int(z), int(x), int(y))
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if self._entries.get(key) == digest:
+                self._entries.move_to_end(key)
+                return digest
+            if key in self._entries:
+                self._remove(key)
+
+            if digest not in self._blob_sizes:
+                self._write_atomic(self._blob_path(digest), data)
+                self._blob_sizes[digest] = len(data)
+                self._blob_refs[digest] = 0
+                self.total_bytes += len(data)
+            self._write_atomic(self._ref_path(key), digest.encode("ascii"))
+            self._blob_refs[digest] += 1
+            self._entries[key] = digest
+            self._evict()
+        return digest
+
+    def stats(self):
+        """
+        取得快取統計
+
+        Returns:
+            dict: 圖磚數、不同內容數、總大小與命中/未命中/淘汰次數
+        """
+        with self._lock:
+            return {
+                "tiles": len(self._entries),
+                "blobs": len(self._blob_sizes),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _evict(self):
+        # 至少保留最新的一張（單張超過上限時仍可使用）
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def _remove(self, key):
+        digest = self._entries.pop(key)
+        self._unlink(self._ref_path(key))
+        self._blob_refs[digest] -= 1
+        if self._blob_refs[digest] <= 0:
+            self._unlink(self._blob_path(digest))
+            self.total_bytes -= self._blob_sizes.pop(digest)
+            del self._blob_refs[digest]
+
+    def _load(self):
+        # 重啟後由索引檔重建快取，依最後使用時間（索引檔 mtime）排出 LRU 順序
+        found = []
+        for ref in self._index_dir.glob("*/*/*.ref"):
+            try:
+                key = (int(ref.parent.parent.name), int(ref.parent.name), int(ref.stem))
+                digest = ref.read_text(encoding="ascii").strip()
+                size = self._blob_path(digest).stat().st_size
+                found.append((ref.stat().st_mtime, key, digest, size))
+            except (OSError, ValueError):
+                self._unlink(ref)
+
+        for _, key, digest, size in sorted(found):
+            self._entries[key] = digest
+            if digest not in self._blob_sizes:
+                self._blob_sizes[digest] = size
+                self._blob_refs[digest] = 0
+                self.total_bytes += size
+            self._blob_refs[digest] += 1
+        self._evict()
+        if found:
+            logger.info(f"[TILE_CACHE] 載入 {len(self._entries)} 張圖磚（{self.total_bytes} bytes）")
+
+    def _touch(self, key):
+        try:
+            os.utime(self._ref_path(key))
+        except OSError:
+            pass
+
+    def _ref_path(self, key):
+        z, x, y = key
+        return self._index_dir / str(z) / str(x) / f"{y}.ref"
+
+    def _blob_path(self, digest):
+        return self._blobs_dir / digest[:2] / digest
+
+    @staticmethod
+    def _write_atomic(path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_bytes_atomic(path, data)
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+class HttpTileSource:
+    """以 URL 樣板（{z}/{x}/{y}）下載圖磚的來源"""
+
+    def __init__(self, url_template, timeout=10, limiter=None, headers=None):
+        """
+        Args:
+            url_template: 圖磚網址樣板，例如 https://tile.example.com/{z}/{x}/{y}.png
+            timeout: 單張下載逾時秒數
+            limiter: RateLimiter（None 表示不限制）
+            headers: 額外的 HTTP 標頭（部分圖磚服務要求 User-Agent）
+        """
+        self.url_template = url_template
+        self.timeout = timeout
+        self.limiter = limiter
+        self.headers = headers or {"User-Agent": "mileage-report-tile-cache"}
+
+    def fetch(self, z, x, y):
+        """
+        下載圖磚
+
+        Returns:
+            bytes: 圖磚內容，失敗時為 None
+        """
+        url = self.url_template.format(z=z, x=x, y=y)
+        if self.limiter is not None:
+            self.limiter.acquire()
+        try:
+            response = requests.get(url, timeout=self.timeout, headers=self.headers)
+        except requests.RequestException as e:
+            logger.warning(f"[TILE_CACHE] 下載圖磚失敗 {z}/{x}/{y}: {str(e)}")
+            return None
+        if response.status_code != 200 or not response.content:
+            logger.warning(f"[TILE_CACHE] 下載圖磚失敗 {z}/{x}/{y}: HTTP {response.status_code}")
+            return None
+        return response.content
+
+
+class TileCompositor:
+    """由快取圖磚拼出指定縮放與中心的地圖背景（可作為 LocalMapRenderer 的 background）"""
+
+    def __init__(self, store, source=None):
+        """
+        Args:
+            store: TileStore
+            source: 圖磚來源（需有 fetch(z, x, y) -> bytes | None）；None 表示只使用快取
+        """
+        self.store = store
+        self.source = source
+
+    def get_tile(self, z, x, y):
+        """
+        取得圖磚：快取 → 來源（下載後存入快取）
+
+        Returns:
+            bytes: 圖磚內容，取不到時為 None
+        """
+        data = self.store.get(z, x, y)
+        if data is None and self.source is not None:
+            data = self.source.fetch(z, x, y)
+            if data:
+                self.store.put(z, x, y, data)
+        return data
+
+    def compose(self, zoom, center_lat, center_lng, width, height):
+        """
+        拼出地圖背景（與 utils.polyline.project 使用相同的 Web Mercator 像素座標）
+
+        Returns:
+            Image.Image: RGB 影像；一張圖磚都取不到時為 None
+        """
+        zoom = int(zoom)
+        cx, cy = polyline_utils.world_pixels([[center_lat, center_lng]], zoom)[0]
+        left = int(math.floor(cx - width / 2.0))
+        top = int(math.floor(cy - height / 2.0))
+        tiles_per_side = 2 ** zoom
+
+        canvas = Image.new("RGB", (width, height), TILE_FILL_COLOR)
+        found = 0
+        for ty in range(top // TILE_SIZE, (top + height - 1) // TILE_SIZE + 1):
+            if ty < 0 or ty >= tiles_per_side:
+                continue
+            for tx in range(left // TILE_SIZE, (left + width - 1) // TILE_SIZE + 1):
+                # 經度方向環繞
+                data = self.get_tile(zoom, tx % tiles_per_side, ty)
+                if not data:
+                    continue
+                try:
+                    with Image.open(io.BytesIO(data)) as tile:
+                        canvas.paste(tile.convert("RGB"), (tx * TILE_SIZE - left, ty * TILE_SIZE - top))
+                    found += 1
+                except Exception as e:
+                    logger.warning(f"[TILE_CACHE] 圖磚無法解碼 {zoom}/{tx % tiles_per_side}/{ty}: {str(e)}")
+
+        return canvas if found else None
+
+    __call__ = compose
+
+
+def build_tile_compositor():
+    """
+    依環境變數建立圖磚合成器（未設定 MAP_TILE_URL 時不使用圖磚背景）
+
+    Returns:
+        TileCompositor: 合成器，未啟用時為 None
+    """
+    url_template = os.getenv("MAP_TILE_URL", "").strip()
+    if not url_template:
+        return None
+    max_bytes = int(float(os.getenv("MAP_TILE_CACHE_MAX_MB", "256")) * 1024 * 1024)
+    source = HttpTileSource(
+        url_template,
+        timeout=float(os.getenv("MAP_TILE_TIMEOUT", "10")),
+        limiter=RateLimiter(float(os.getenv("MAP_TILE_QPS", "10"))),
+    )
+    return TileCompositor(TileStore(get_tile_cache_dir(), max_bytes), source)
@@ -79,7 +79,12 @@ class WordService:
             logger.error(f"日期格式化失敗: {e}")
             return str(date_value)
     
-    def generate_report(self, project_name, records, fixed_origin=None, page_break_per_record=True):
+    def report_filename(self, project_name):
+        """報表檔名（{計畫別}_里程報表.docx，移除檔名不允許的字元）"""
+        safe_project_name = "".join(c for c in project_name if c.isalnum() or c in (' ', '-', '_')).strip()
+        return f"{safe_project_name}_里程報表.docx"
+
+    def generate_report(self, project_name, records, fixed_origin=None, page_break_per_record=True, output=None):
         """
         產生 Word 報表（與 mileage_report_demo 一致）
         
@@ -88,9 +93,10 @@ class WordService:
             records: 該計畫別的紀錄列表（需包含計算結果）
             fixed_origin: 固定起點地址（可選）
             page_break_per_record: 是否每筆記錄換頁（預設 True，與 mileage_report_demo 一致）
+            output: 可寫入的檔案物件（None 表示存到 output/）
             
         Returns:
-            str: Word 檔案路徑
+            str: Word 檔案路徑（指定 output 時為報表檔名）
         """
         try:
             # 建立 Word 文件
@@ -216,8 +222,12 @@ class WordService:
                     continue
             
             # 儲存檔案
-            safe_project_name = "".join(c for c in project_name if c.isalnum() or c in (' ', '-', '_')).strip()
-            filename = f"{safe_project_name}_里程報表.docx"
+            filename = self.report_filename(project_name)
+            if output is not None:
+                doc.save(output)
+                logger.info(f"報表已產生: {filename}")
+                return filename
+
             file_path = self.output_dir / filename
             
             try:
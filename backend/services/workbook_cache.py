@@ -0,0 +1,193 @@
+"""
+已解析 Excel 快取
+以上傳檔案內容的 SHA-256 為鍵，將標準化後的資料以欄為單位存成 JSON（temp/parsed/{digest}.json），
+並在記憶體保留最近使用的幾份；相同內容的檔案重新上傳或預覽時不需再解析。
+磁碟快取只用 JSON（不使用 pickle），暫存目錄中的檔案被竄改時最多只會得到錯誤的資料，不會執行程式碼。
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from loguru import logger
+
+from utils.atomic_write import write_bytes_atomic
+from utils.path_manager import get_parsed_cache_dir
+
+# 解析結果格式版本（標準化規則變更時遞增，舊快取自動失效）
+PARSER_VERSION = 2
+CACHE_SUFFIX = ".json"
+# 可原樣存入 JSON 並還原為相同型別的值
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
+
+def file_digest(path) -> str:
+    """
+    計算檔案內容的 SHA-256
+
+    Returns:
+        str: 十六進位字串
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParsedWorkbookCache:
+    """已解析 Excel 的兩層快取（記憶體 LRU + 磁碟 JSON，執行緒安全）"""
+
+    def __init__(self, root=None, memory_entries=8):
+        """
+        Args:
+            root: 快取目錄（None 表示 temp/parsed，於使用時才解析）
+            memory_entries: 記憶體中保留的份數
+        """
+        self._root = Path(root) if root is not None else None
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()  # digest -> 欄式資料
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def root(self) -> Path:
+        if self._root is None:
+            return get_parsed_cache_dir()
+        self._root.mkdir(parents=True, exist_ok=True)
+        return self._root
+
+    def get(self, digest):
+        """
+        取得已解析的資料
+
+        Args:
+            digest: 檔案內容的 SHA-256
+
+        Returns:
+            list: 資料列表（每次回傳新的字典），未快取時為 None
+        """
+        with self._lock:
+            payload = self._memory.get(digest)
+            if payload is not None:
+                self._memory.move_to_end(digest)
+                self.memory_hits += 1
+        if payload is None:
+            payload = self._read(digest)
+            with self._lock:
+                if payload is None:
+                    self.misses += 1
+                    return None
+                self.disk_hits += 1
+                self._remember(digest, payload)
+        self._touch(digest)
+        return self._decode(payload)
+
+    def put(self, digest, records):
+        """
+        存入已解析的資料
+
+        Args:
+            digest: 檔案內容的 SHA-256
+            records: 資料列表（欄位順序需一致）
+        """
+        payload = self._encode(records)
+        if self._json_safe(payload):
+            try:
+                data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                write_bytes_atomic(self._path(digest), data)
+            except OSError as e:
+                logger.warning(f"[PARSED_CACHE] 無法寫入快取: {str(e)}")
+        else:
+            # 含 JSON 無法原樣還原的值（例如只有時間的儲存格）時只保留在記憶體
+            logger.info("[PARSED_CACHE] 資料含無法存為 JSON 的值，只快取於記憶體")
+        with self._lock:
+            self._remember(digest, payload)
+
+    def stats(self):
+        """
+        取得快取統計
+
+        Returns:
+            dict: 記憶體份數與記憶體/磁碟命中、未命中次數
+        """
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+    def _remember(self, digest, payload):
+        self._memory[digest] = payload
+        self._memory.move_to_end(digest)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _touch(self, digest):
+        # 更新修改時間，暫存檔清理依最後使用時間保留常用的快取
+        try:
+            os.utime(self._path(digest))
+        except OSError:
+            pass
+
+    def _read(self, digest):
+        try:
+            payload = json.loads(self._path(digest).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"[PARSED_CACHE] 快取無法讀取，將重新解析: {str(e)}")
+            return None
+        if not isinstance(payload, dict) or payload.get("version") != PARSER_VERSION:
+            return None
+        if not (isinstance(payload.get("rows"), list) or (
+            isinstance(payload.get("columns"), list) and isinstance(payload.get("values"), list)
+            and isinstance(payload.get("count"), int)
+        )):
+            logger.warning(f"[PARSED_CACHE] 快取格式不正確，將重新解析: {digest}")
+            return None
+        return payload
+
+    def _path(self, digest) -> Path:
+        return self.root / f"{digest}{CACHE_SUFFIX}"
+
+    @staticmethod
+    def _json_safe(payload):
+        columns = payload.get("columns", [])
+        if "rows" in payload:
+            values = (item for row in payload["rows"] for pair in row for item in pair)
+        else:
+            values = (value for column in payload["values"] for value in column)
+        return all(type(value) in _JSON_SCALARS for value in columns) and all(
+            type(value) in _JSON_SCALARS for value in values
+        )
+
+    @staticmethod
+    def _encode(records):
+        # 以欄為單位存放：欄名只存一次，同欄數值相鄰，較逐筆字典小且快；
+        # 欄位不一致時逐筆存為 [欄名, 值] 配對（JSON 物件的鍵只能是字串，配對可保留數值欄名）
+        columns = list(records[0]) if records else []
+        if any(len(record) != len(columns) or list(record) != columns for record in records):
+            rows = [[[key, value] for key, value in record.items()] for record in records]
+            return {"version": PARSER_VERSION, "rows": rows}
+        values = [[record[col] for record in records] for col in columns]
+        return {"version": PARSER_VERSION, "columns": columns, "values": values, "count": len(records)}
+
+    @staticmethod
+    def _decode(payload):
+        if "rows" in payload:
+            return [{key: value for key, value in row} for row in payload["rows"]]
+        columns = payload["columns"]
+        if not columns:
+            return [{} for _ in range(payload["count"])]
+        return [dict(zip(columns, row)) for row in zip(*payload["values"])]
+
+
+# 全程序共用（temp/parsed）
+parsed_workbook_cache = ParsedWorkbookCache(memory_entries=int(os.getenv("PARSED_CACHE_MEMORY_ENTRIES", "8")))
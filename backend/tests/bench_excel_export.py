@@ -0,0 +1,82 @@
+"""
+Excel 匯出效能比較（非 pytest 測試，手動執行）
+
+比較 add_calculation_results 的兩種模式在不同列數下的耗時與 Python 記憶體峰值（tracemalloc，另外執行一次量測）：
+載入整個工作簿後修改（full）與 read_only → write_only 逐列串流（streaming）。
+兩種模式的耗時都以 openpyxl 逐格解析與產生 XML 為主，串流模式的效益在記憶體不隨列數增加：
+
+    cd backend
+    python -m tests.bench_excel_export
+"""
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import services.excel_service as excel_module
+from loguru import logger
+from openpyxl import Workbook
+
+from services.excel_service import ExcelService
+
+ROW_COUNTS = (2_000, 10_000)
+
+
+def write_source(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = '出差紀錄'
+    ws.append(['部門', '姓名', '計畫別', '起點名稱', '出差日期時間（開始）', '出差日期時間（結束）', '目的地名稱', '備註'])
+    start = datetime(2024, 1, 1, 8)
+    for i in range(rows):
+        begin = start + timedelta(hours=i)
+        ws.append(['業務部', f'員工{i % 500}', f'計畫{i % 8}', '安環高雄處', begin, begin + timedelta(hours=8),
+                   f'目的地{i % 300}', None])
+    wb.save(path)
+
+
+def make_records(rows):
+    return [
+        {
+            'OneWayKm': 10 + i % 50, 'RoundTripKm': 2 * (10 + i % 50), 'GoogleMapUrl': f'https://maps.example/{i}',
+            'StaticMapImage': f'/temp/maps/map_{i:064x}.png', 'IsDriving': 'Y', 'StepCount': 12,
+            'Polyline': 'u{~vFvyys@fS]' * 20, 'RouteSteps': '[]',
+        }
+        for i in range(rows)
+    ]
+
+
+def measure(service, source, records, mode):
+    start = time.perf_counter()
+    service.add_calculation_results(source, records, mode=mode)
+    seconds = time.perf_counter() - start
+
+    # tracemalloc 會大幅拖慢執行，記憶體另外量測
+    tracemalloc.start()
+    service.add_calculation_results(source, records, mode=mode)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak / 1024 / 1024
+
+
+def main():
+    logger.remove()
+    service = ExcelService()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        excel_module.get_output_dir = lambda: tmp
+        for rows in ROW_COUNTS:
+            source = str(tmp / f'source_{rows}.xlsx')
+            write_source(source, rows)
+            records = make_records(rows)
+            full_seconds, full_mb = measure(service, source, records, 'full')
+            stream_seconds, stream_mb = measure(service, source, records, 'streaming')
+            print(
+                f"{rows:>6} 列: full {full_seconds:.2f} s / {full_mb:.0f} MB，"
+                f"streaming {stream_seconds:.2f} s / {stream_mb:.0f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
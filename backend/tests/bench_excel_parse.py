@@ -0,0 +1,100 @@
+"""
+Excel 解析效能比較（非 pytest 測試，手動執行）
+
+以 10,000 列合成 xlsx 比較上傳解析的兩種做法：原本的 pandas 整份讀取 + 逐列 iterrows 轉換，
+與目前上傳、預覽使用的串流解析 iter_records（openpyxl read_only 逐列讀取、整批轉換日期），並確認兩者輸出的 JSON 相同：
+
+    cd backend
+    python -m tests.bench_excel_parse
+"""
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from services.excel_service import ExcelService
+
+FILE_ROWS = 10_000
+
+
+def legacy_records(df):
+    """原本 parse_excel 的逐列轉換"""
+    records = []
+    for _, row in df.iterrows():
+        record = {}
+        for col in df.columns:
+            value = row[col]
+            if pd.isna(value):
+                record[col] = None
+            elif isinstance(value, pd.Timestamp):
+                if pd.isna(value):
+                    record[col] = None
+                else:
+                    record[col] = value.isoformat()
+            else:
+                record[col] = value
+        records.append(record)
+    return records
+
+
+def synthetic_frame(rows):
+    """上傳檔案欄位的合成資料（約 5% 日期無法解析）"""
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365 * 24 * 60, rows), unit='min')
+    start = start.where(rng.random(rows) > 0.05)
+    df = pd.DataFrame({
+        '部門': rng.choice(['業務部', '研發部', '管理部'], rows),
+        '姓名': [f'員工{i % 500}' for i in range(rows)],
+        '計畫別': rng.choice([f'計畫{c}' for c in 'ABCDEFGH'], rows),
+        '起點名稱': '安環高雄處',
+        '出差日期時間（開始）': start,
+        '出差日期時間（結束）': start + pd.Timedelta(hours=8),
+        '目的地名稱': [f'目的地{i % 300}' for i in range(rows)],
+        '備註': np.where(rng.random(rows) > 0.7, '自備車輛', None),
+        'IsDriving': 'N',
+    })
+    for col in ExcelService().result_columns:
+        df[col] = None
+    return df
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def pandas_parse(service, path):
+    """原本 parse_excel 的做法：pandas 整份讀取、整欄轉換日期後逐列轉為字典"""
+    df = pd.read_excel(path, engine='openpyxl').rename(columns=service.column_mapping)
+    for col in service.date_columns:
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+    df['IsDriving'] = 'N'
+    for col in service.result_columns:
+        df[col] = None
+    return legacy_records(df)
+
+
+def bench_file():
+    service = ExcelService()
+    df = synthetic_frame(FILE_ROWS).drop(columns=['IsDriving', *service.result_columns])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / 'bench.xlsx')
+        df.to_excel(path, index=False)
+        old, old_seconds = timed(pandas_parse, service, path)
+        new, new_seconds = timed(lambda: list(service.iter_records(path)))
+    identical = json.dumps(old, ensure_ascii=False) == json.dumps(new, ensure_ascii=False)
+    print(f"{FILE_ROWS} 列 xlsx: pandas + iterrows {old_seconds:.2f} s，iter_records {new_seconds:.2f} s，JSON 相同: {identical}")
+
+
+def main():
+    logger.remove()
+    bench_file()
+
+
+if __name__ == "__main__":
+    main()
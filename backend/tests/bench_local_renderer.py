@@ -0,0 +1,61 @@
+"""
+本機地圖繪製效能量測（非 pytest 測試，手動執行）
+
+量測 1200×800 畫面上繪製路線底圖、套用標註與 PNG 編碼（寫入記憶體）的耗時，目標為每張 50 ms 內：
+
+    cd backend
+    python -m tests.bench_local_renderer
+"""
+import io
+import time
+
+import numpy as np
+from loguru import logger
+
+from services.google_maps_service import GoogleMapsService
+from services.local_map_renderer import PNG_COMPRESS_LEVEL, LocalMapRenderer
+from utils import polyline
+from utils.font_registry import get_cjk_font
+
+ROUNDS = 50
+# overview_polyline 通常為數百點；另量測較密的路線
+POINT_COUNTS = (300, 1000, 3000)
+
+
+def bench(renderer, service, points):
+    main = np.cumsum(np.random.default_rng(0).normal(0, 0.002, (points, 2)), axis=0) + [22.6, 120.3]
+    paths = [polyline.encode(main), polyline.encode(main[::-1] + 0.002)]
+
+    totals = {"base": 0.0, "annotate": 0.0, "encode": 0.0}
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        base, ab_markers = renderer.render_base(paths)
+        drawn = time.perf_counter()
+        service._draw_info_overlay(base, 12.3)
+        service._draw_ab_overlay(base, ab_markers, "起點地址", "終點地址")
+        annotated = time.perf_counter()
+        base.save(io.BytesIO(), format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+        encoded = time.perf_counter()
+        totals["base"] += drawn - start
+        totals["annotate"] += annotated - drawn
+        totals["encode"] += encoded - annotated
+    return {name: value / ROUNDS * 1000 for name, value in totals.items()}
+
+
+def main():
+    logger.remove()
+    service = GoogleMapsService()
+    # 沒有中文字體的環境改用 Pillow 預設字體，仍可量測
+    service._load_cjk_font = lambda size: get_cjk_font(size, fallback=True)
+    renderer = LocalMapRenderer(service)
+    print(f"畫面 {renderer.width}x{renderer.height}，每種點數執行 {ROUNDS} 次")
+    for points in POINT_COUNTS:
+        ms = bench(renderer, service, points)
+        print(
+            f"{points:>5} 點: 底圖 {ms['base']:.1f} ms + 標註 {ms['annotate']:.1f} ms + "
+            f"PNG {ms['encode']:.1f} ms = {sum(ms.values()):.1f} ms/張"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+文字外框繪製效能比較（非 pytest 測試，手動執行）
+
+比較舊版 25 次位移重畫的 Halo 與 stroke_width 外框，在 1920×1080 畫面上的耗時：
+
+    cd backend
+    python -m tests.bench_text_render
+"""
+import time
+from datetime import datetime
+
+from PIL import Image, ImageDraw
+
+from utils.font_registry import get_cjk_font
+from utils.text_render import draw_text
+
+WIDTH, HEIGHT = 1920, 1080
+ROUNDS = 200
+
+
+def draw_halo_legacy(draw, xy, text, font):
+    """舊版做法：上下左右各位移 2px 重畫 25 次白字，再畫一次本體"""
+    x, y = xy
+    halo_r = 2
+    for ox in range(-halo_r, halo_r + 1):
+        for oy in range(-halo_r, halo_r + 1):
+            draw.text((x + ox, y + oy), text, font=font, fill=(255, 255, 255))
+    draw.text((x, y), text, font=font, fill=(50, 50, 50))
+
+
+def draw_halo_stroke(draw, xy, text, font):
+    draw_text(draw, xy, text, font, fill=(50, 50, 50), outline=(255, 255, 255), outline_width=2)
+
+
+def bench(render, font, text):
+    frame = Image.new("RGB", (WIDTH, HEIGHT), (200, 210, 220))
+    draw = ImageDraw.Draw(frame, "RGBA")
+    xy = (WIDTH - 600, HEIGHT - 60)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        render(draw, xy, text, font)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main():
+    # 與 annotate_map_info 相同的字級（以 1000px 為基準縮放）
+    font = get_cjk_font(int(20 * WIDTH / 1000.0), fallback=True)
+    text = f"系統產出時間: {datetime.now().strftime('%Y/%m/%d %H:%M')}"
+
+    legacy_ms = bench(draw_halo_legacy, font, text)
+    stroke_ms = bench(draw_halo_stroke, font, text)
+    print(f"畫面 {WIDTH}x{HEIGHT}，每種做法執行 {ROUNDS} 次")
+    print(f"舊版 25 次重畫: {legacy_ms:.3f} ms/次")
+    print(f"stroke 外框:    {stroke_ms:.3f} ms/次")
+    print(f"加速: {legacy_ms / stroke_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,21 @@ from app import app
 from extensions import db
 from models.user import User
 from models.travel_record import TravelRecord
+from services.map_image_store import map_image_store
+from services.workbook_cache import parsed_workbook_cache
+
+@pytest.fixture(autouse=True)
+def isolated_map_image_store(tmp_path, monkeypatch):
+    """地圖圖片儲存改用測試暫存目錄，避免測試間共用既有圖片"""
+    monkeypatch.setattr(map_image_store, '_root', tmp_path / 'map_store')
+    return map_image_store
+
+@pytest.fixture(autouse=True)
+def isolated_parsed_workbook_cache(tmp_path, monkeypatch):
+    """已解析 Excel 快取改用測試暫存目錄與空的記憶體快取"""
+    monkeypatch.setattr(parsed_workbook_cache, '_root', tmp_path / 'parsed_cache')
+    monkeypatch.setattr(parsed_workbook_cache, '_memory', type(parsed_workbook_cache._memory)())
+    return parsed_workbook_cache
 
 @pytest.fixture(scope='module')
 def test_app():
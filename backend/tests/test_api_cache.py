@@ -0,0 +1,290 @@
+"""
+外部 API 快取測試（地理編碼、路線）
+"""
+import io
+import time
+
+import pytest
+from flask import Flask
+from PIL import Image, ImageFont
+
+import services.google_maps_service as google_maps_module
+
+from extensions import db
+from models.cache_entry import CacheEntry
+from services.cache_store import PersistentCache, make_cache_key
+from services.google_maps_service import GoogleMapsService
+
+
+class FakeGmaps:
+    """記錄呼叫次數的假 Google Maps 客戶端"""
+
+    def __init__(self):
+        self.geocode_calls = 0
+        self.directions_calls = 0
+
+    def geocode(self, address, language=None):
+        self.geocode_calls += 1
+        if "不存在" in address:
+            return []
+        return [{
+            "geometry": {"location": {"lat": 22.6, "lng": 120.3}},
+            "formatted_address": f"台灣{address}",
+        }]
+
+    def directions(self, origin, destination, mode=None, language=None, alternatives=False):
+        self.directions_calls += 1
+        route = {
+            "overview_polyline": {"points": "_p~iF~ps|U_ulLnnqC"},
+            "bounds": {
+                "northeast": {"lat": 22.7, "lng": 120.4},
+                "southwest": {"lat": 22.5, "lng": 120.2},
+            },
+            "legs": [{
+                "distance": {"value": 12345, "text": "12.3 公里"},
+                "duration": {"value": 900, "text": "15 分鐘"},
+                "start_location": {"lat": 22.6, "lng": 120.3},
+                "end_location": {"lat": 22.62, "lng": 120.31},
+                "start_address": f"台灣{origin}",
+                "end_address": f"台灣{destination}",
+                "steps": [{"html_instructions": "往<b>南</b>走", "distance": {"text": "1 公里"}}],
+            }],
+        }
+        alt = {"overview_polyline": {"points": "alt"}, "legs": route["legs"]}
+        return [route, alt] if alternatives else [route]
+
+
+@pytest.fixture
+def cache_app(tmp_path):
+    """使用暫存 SQLite 檔的獨立應用程式"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'cache.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def maps_service():
+    service = GoogleMapsService()
+    service.gmaps = FakeGmaps()
+    service.geocode_cache = PersistentCache("geocode", ttl_seconds=3600, negative_ttl_seconds=60)
+    service.directions_cache = PersistentCache("directions", ttl_seconds=3600, max_memory_items=16)
+    return service
+
+
+def test_cache_key_normalization():
+    """全形、大小寫與多餘空白不影響快取鍵"""
+    assert make_cache_key(("  安環高雄處 ", "zh-TW"))[0] == make_cache_key(("安環高雄處", "ZH-tw"))[0]
+    assert make_cache_key(("Ｔａｉｐｅｉ  101", "zh-TW"))[0] == make_cache_key(("taipei 101", "zh-TW"))[0]
+    assert make_cache_key(("安環高雄處", "zh-TW"))[0] != make_cache_key(("安環高雄處", "en"))[0]
+
+
+def test_geocode_uses_cache(cache_app, maps_service):
+    """重複地點只呼叫一次 API"""
+    first = maps_service.geocode("安環高雄處")
+    for _ in range(5):
+        assert maps_service.geocode(" 安環高雄處") == first
+    assert maps_service.gmaps.geocode_calls == 1
+
+    stats = maps_service.geocode_cache.stats()
+    assert stats["hits"] == 5
+    assert stats["misses"] == 1
+
+
+def test_geocode_negative_cache(cache_app, maps_service):
+    """查無結果也會快取"""
+    assert maps_service.geocode("不存在的地點") is None
+    assert maps_service.geocode("不存在的地點") is None
+    assert maps_service.gmaps.geocode_calls == 1
+    assert maps_service.geocode_cache.stats()["negative_hits"] == 1
+
+
+def test_cache_persists_across_memory_reset(cache_app, maps_service):
+    """記憶體層清空後仍可從資料庫命中"""
+    maps_service.geocode("總公司")
+    maps_service.geocode_cache.clear_memory()
+    assert maps_service.geocode("總公司")["formatted_address"] == "台灣總公司"
+    assert maps_service.gmaps.geocode_calls == 1
+    assert maps_service.geocode_cache.stats()["db_hits"] == 1
+
+
+def test_cache_ttl_expiry(cache_app):
+    """過期資料視為未命中"""
+    cache = PersistentCache("geocode-ttl", ttl_seconds=-1)
+    cache.set(("高雄市政府",), {"lat": 1})
+    hit, _ = cache.get(("高雄市政府",))
+    assert hit is False
+
+
+def test_cache_retries_database_after_failure(cache_app, monkeypatch):
+    """資料庫層失敗後只暫停一段時間，之後重試並恢復持久化"""
+    table = CacheEntry.__table__
+    original_create = table.create
+    calls = []
+
+    def flaky_create(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return original_create(*args, **kwargs)
+
+    monkeypatch.setattr(table, "create", flaky_create)
+    cache = PersistentCache("geocode-retry", ttl_seconds=60, db_retry_seconds=0.1)
+    cache.set(("a",), {"v": 1})
+    assert cache.stats()["persistent"] is False
+    cache.set(("b",), {"v": 2})
+    assert len(calls) == 1
+
+    time.sleep(0.15)
+    cache.set(("c",), {"v": 3})
+    assert len(calls) == 2
+    assert cache.stats()["persistent"] is True
+    cache.clear_memory()
+    assert cache.get(("a",)) == (False, None)
+    assert cache.get(("c",)) == (True, {"v": 3})
+
+
+def test_cache_without_app_context():
+    """沒有應用程式環境時只使用記憶體層"""
+    cache = PersistentCache("geocode-memory", ttl_seconds=60, max_memory_items=2)
+    cache.set(("a",), {"v": 1})
+    cache.set(("b",), {"v": 2})
+    cache.set(("c",), {"v": 3})
+    assert cache.get(("a",)) == (False, None)
+    assert cache.get(("c",)) == (True, {"v": 3})
+    assert cache.stats()["evictions"] == 1
+
+
+def test_route_detail_uses_directions_cache(cache_app, maps_service):
+    """同一起訖點只呼叫一次 Directions API，且結果一致"""
+    first = maps_service.get_route_detail("安環高雄處", "高雄市政府", alternatives=True)
+    second = maps_service.get_route_detail("安環高雄處", "高雄市政府", alternatives=True)
+
+    assert maps_service.gmaps.directions_calls == 1
+    assert first["from_cache"] is False
+    assert second["from_cache"] is True
+    first.pop("from_cache")
+    second.pop("from_cache")
+    assert first == second
+    assert second["distance_km"] == 12.35
+    assert second["alternative_polylines"] == ["alt"]
+    assert second["steps"] == ["往南走 (1 公里)"]
+
+
+def test_directions_cache_key_includes_mode_and_alternatives(cache_app, maps_service):
+    """不同交通方式或是否含替代路線分開快取"""
+    maps_service.get_route_detail("A", "B", alternatives=True)
+    maps_service.get_route_detail("A", "B", alternatives=False)
+    maps_service.calculate_distance("A", "B", route_type="walking")
+    maps_service.calculate_distance("A", "B", route_type="driving")
+    assert maps_service.gmaps.directions_calls == 3
+    assert maps_service.cache_stats()["directions"]["hits"] == 1
+
+
+def test_route_detail_includes_endpoints_and_bounds(cache_app, maps_service):
+    """路線結果包含起終點座標與範圍，快取命中後仍保留"""
+    maps_service.get_route_detail("安環高雄處", "高雄市政府")
+    detail = maps_service.get_route_detail("安環高雄處", "高雄市政府")
+    assert detail["from_cache"] is True
+    assert detail["bounds"]["northeast"] == {"lat": 22.7, "lng": 120.4}
+
+    origin, destination = maps_service.route_endpoints(detail)
+    assert origin == {"lat": 22.6, "lng": 120.3, "formatted_address": "台灣安環高雄處"}
+    assert destination["lat"] == 22.62
+    assert maps_service.route_endpoints({}) == (None, None)
+
+
+def _png_bytes(width, height):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (230, 230, 230)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class FakeResponse:
+    status_code = 200
+    content = _png_bytes(1200, 800)
+    text = ""
+
+
+def test_static_map_uses_route_endpoints(cache_app, maps_service, monkeypatch, tmp_path):
+    """靜態地圖使用路線起終點座標，不再地理編碼"""
+    urls = []
+    monkeypatch.setattr(google_maps_module.requests, "get", lambda url, timeout=None: urls.append(url) or FakeResponse())
+    monkeypatch.setattr(maps_service, "_load_cjk_font", lambda size: ImageFont.load_default(size))
+    maps_service.api_key = "test-key"
+
+    detail = maps_service.get_route_detail("安環高雄處", "高雄市政府")
+    origin_geo, destination_geo = maps_service.route_endpoints(detail)
+    path = maps_service.download_static_map_with_polyline(
+        detail["polyline"], "安環高雄處", "高雄市政府",
+        distance_km=detail["distance_km"],
+        output_path=tmp_path / "map.png",
+        origin_geo=origin_geo,
+        destination_geo=destination_geo,
+        bounds=detail["bounds"],
+    )
+
+    assert path == str(tmp_path / "map.png")
+    with Image.open(path) as annotated:
+        assert annotated.size == (1200, 800)
+        # 已合成 Badge 與 A/B 標註（不再是單一底色）
+        assert len(annotated.getcolors(1 << 16)) > 1
+    assert maps_service.gmaps.geocode_calls == 0
+    assert len(urls) == 1 and "22.62%2C120.31" in urls[0]
+
+
+def test_static_map_url_fits_length_limit(cache_app, maps_service, monkeypatch, tmp_path):
+    """過長的路線會先簡化，第一次請求的 URL 即符合長度上限"""
+    import numpy as np
+    from utils import polyline as polyline_utils
+
+    urls = []
+    monkeypatch.setattr(google_maps_module.requests, "get", lambda url, timeout=None: urls.append(url) or FakeResponse())
+    monkeypatch.setattr(maps_service, "_load_cjk_font", lambda size: ImageFont.load_default(size))
+    maps_service.api_key = "test-key"
+
+    walk = np.cumsum(np.random.default_rng(1).normal(0, 0.0005, (6000, 2)), axis=0) + [22.6, 120.3]
+    main = polyline_utils.encode(walk)
+    alternatives = [polyline_utils.encode(walk[::-1]), polyline_utils.encode(walk + 0.01)]
+    assert len(main) > google_maps_module.STATIC_MAPS_URL_LIMIT
+
+    path = maps_service.download_static_map_with_polyline(
+        main, "A", "B", distance_km=30,
+        output_path=tmp_path / "long.png",
+        alternative_polylines=alternatives,
+        origin_geo={"lat": 22.6, "lng": 120.3},
+        destination_geo={"lat": 22.7, "lng": 120.4},
+    )
+
+    assert path == str(tmp_path / "long.png")
+    assert len(urls) == 1
+    assert len(urls[0]) <= google_maps_module.STATIC_MAPS_URL_LIMIT
+    assert urls[0].count("path=") >= 1
+
+
+def test_static_map_base_image_reused_for_repeated_route(cache_app, maps_service, monkeypatch, isolated_map_image_store):
+    """相同路線第二次產生靜態地圖時沿用已存的底圖，不再呼叫 Static Maps API；輸出檔名由內容決定"""
+    urls = []
+    monkeypatch.setattr(google_maps_module.requests, "get", lambda url, timeout=None: urls.append(url) or FakeResponse())
+    monkeypatch.setattr(maps_service, "_load_cjk_font", lambda size: ImageFont.load_default(size))
+    maps_service.api_key = "test-key"
+
+    detail = maps_service.get_route_detail("安環高雄處", "高雄市政府")
+    origin_geo, destination_geo = maps_service.route_endpoints(detail)
+    paths = [
+        maps_service.download_static_map_with_polyline(
+            detail["polyline"], "安環高雄處", "高雄市政府",
+            distance_km=detail["distance_km"],
+            origin_geo=origin_geo,
+            destination_geo=destination_geo,
+        )
+        for _ in range(2)
+    ]
+
+    assert len(urls) == 1
+    assert paths[0] == paths[1]
+    key = isolated_map_image_store.key_for_path(paths[0])
+    assert isolated_map_image_store.metadata(key)["kind"] == "annotated"
+    assert "test-key" not in str(isolated_map_image_store.metadata(key))
@@ -0,0 +1,37 @@
+"""
+原子寫檔測試（暫存檔改名覆蓋，失敗時不留下暫存檔）
+"""
+import os
+
+import pytest
+
+from utils.atomic_write import write_atomic, write_bytes_atomic
+
+
+def test_replaces_existing_file(tmp_path):
+    target = tmp_path / "map.png"
+    target.write_bytes(b"old")
+    with open(target, "rb") as reader:
+        write_bytes_atomic(target, b"new")
+        assert reader.read() == b"old"  # 既有檔案不會被截斷
+    assert target.read_bytes() == b"new"
+    assert [p.name for p in tmp_path.iterdir()] == ["map.png"]
+
+
+def test_temp_name_includes_process_and_failure_cleans_up(tmp_path):
+    """暫存檔名含程序編號；寫入失敗時刪除暫存檔並保留原檔"""
+    target = tmp_path / "map.png"
+    target.write_bytes(b"old")
+    seen = []
+
+    def failing_write(tmp):
+        seen.append(tmp)
+        tmp.write_bytes(b"partial")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        write_atomic(target, failing_write)
+    assert f".{os.getpid()}." in seen[0].name
+    assert seen[0].parent == tmp_path
+    assert target.read_bytes() == b"old"
+    assert [p.name for p in tmp_path.iterdir()] == ["map.png"]
@@ -0,0 +1,287 @@
+"""
+批次計算測試（不呼叫外部服務）
+"""
+import random
+import threading
+import time
+
+import pytest
+
+import routes.calculate as calculate
+from app import app
+from services.batch_jobs import BatchJobManager
+from services.cache_store import PersistentCache
+from utils.rate_limiter import RateLimiter
+
+
+class FakeGmaps:
+    """模擬延遲的假 Google Maps 客戶端，距離依終點名稱決定"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.geocode_calls = 0
+        self.directions_calls = 0
+
+    def geocode(self, address, language=None):
+        with self.lock:
+            self.geocode_calls += 1
+        return [{
+            "geometry": {"location": {"lat": 22.6, "lng": 120.3}},
+            "formatted_address": f"地址:{address}",
+        }]
+
+    def directions(self, origin, destination, mode=None, language=None, alternatives=False):
+        with self.lock:
+            self.directions_calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(random.uniform(0.01, 0.05))
+        with self.lock:
+            self.active -= 1
+        km = int(destination.split("-")[-1])
+        return [{
+            "overview_polyline": {"points": "abc"},
+            "legs": [{
+                "distance": {"value": km * 1000, "text": f"{km} 公里"},
+                "duration": {"value": 60, "text": "1 分鐘"},
+                "steps": [],
+            }],
+        }]
+
+
+@pytest.fixture
+def fake_maps(monkeypatch):
+    service = calculate.maps_service
+    fake = FakeGmaps()
+    monkeypatch.setattr(service, "gmaps", fake)
+    monkeypatch.setattr(service, "geocode_cache", PersistentCache("t-geo", 60, 60, use_db=False))
+    monkeypatch.setattr(service, "directions_cache", PersistentCache("t-dir", 60, 60, use_db=False))
+    monkeypatch.setattr(service, "download_static_map_with_polyline", lambda *a, **k: None)
+    monkeypatch.setattr(calculate, "capture_route_screenshot_sync", lambda **kwargs: None)
+    return fake
+
+
+def _records(n):
+    return [
+        {"IsDriving": "Y", "起點名稱": "安環高雄處", "目的地名稱": f"目的地-{i + 1}"}
+        for i in range(n)
+    ]
+
+
+def test_concurrent_batch_keeps_record_order(fake_maps):
+    """並行處理後結果仍依原始順序"""
+    records = _records(12)
+    records.insert(3, {"IsDriving": "Y", "起點名稱": "", "目的地名稱": "缺起點"})
+    records.insert(7, {"IsDriving": "N", "起點名稱": "A", "目的地名稱": "B"})
+
+    with app.test_client() as client:
+        response = client.post("/api/calculate/batch", json={"records": records, "concurrency": 4})
+
+    data = response.get_json()["data"]
+    assert data["concurrency"] == 4
+    kms = [r.get("OneWayKm") for r in data["records"]]
+    assert kms == [1, 2, 3, None, 4, 5, 6, None, 7, 8, 9, 10, 11, 12]
+    assert data["errors"] == ["第 4 筆資料缺少起點或終點"]
+    assert fake_maps.max_active > 1
+    assert fake_maps.max_active <= 4
+
+
+def test_sequential_and_concurrent_results_match(fake_maps):
+    """並行數 1 與並行模式結果一致"""
+    sequential = calculate._run_batch(_records(6), "固定起點", concurrency=1)
+    with app.app_context():
+        concurrent = calculate._run_batch(_records(6), "固定起點", concurrency=3)
+    assert sequential["records"] == concurrent["records"]
+    assert sequential["errors"] == concurrent["errors"]
+
+
+def test_resolve_concurrency_bounds():
+    assert calculate._resolve_concurrency(None) == min(calculate.BATCH_CONCURRENCY, calculate.BATCH_MAX_CONCURRENCY)
+    assert calculate._resolve_concurrency(0) == 1
+    assert calculate._resolve_concurrency(999) == calculate.BATCH_MAX_CONCURRENCY
+    assert calculate._resolve_concurrency("abc") == calculate._resolve_concurrency(None)
+
+
+def test_rate_limiter_spaces_requests():
+    """速率限制器在額度用完後會等待"""
+    limiter = RateLimiter(rate_per_second=50, burst=1)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.09
+    assert RateLimiter(0).acquire() == 0.0
+
+
+def test_batch_job_submit_and_poll(fake_maps):
+    """送出背景工作後可輪詢取得完整結果"""
+    with app.test_client() as client:
+        response = client.post("/api/calculate/jobs", json={"records": _records(5), "concurrency": 2})
+        assert response.status_code == 202
+        job_id = response.get_json()["data"]["job_id"]
+
+        calculate.batch_jobs.wait(job_id, timeout=10)
+        data = client.get(f"/api/calculate/jobs/{job_id}").get_json()["data"]
+
+    assert data["status"] == "completed"
+    assert data["processed_count"] == 5
+    assert data["progress"] == 1.0
+    assert [r["OneWayKm"] for r in data["records"]] == [1, 2, 3, 4, 5]
+    assert data["summary"]["directions_api_calls"] == 5
+
+
+def test_batch_async_flag_returns_job(fake_maps):
+    with app.test_client() as client:
+        response = client.post("/api/calculate/batch", json={"records": _records(1), "async": True})
+    assert response.status_code == 202
+    calculate.batch_jobs.wait(response.get_json()["data"]["job_id"], timeout=10)
+
+
+def test_batch_job_not_found():
+    with app.test_client() as client:
+        response = client.get("/api/calculate/jobs/does-not-exist")
+    assert response.status_code == 404
+
+
+def test_job_manager_reports_partial_progress():
+    """工作進行中可取得部分結果與錯誤"""
+    release = threading.Event()
+
+    def runner(records, on_record_done=None, **params):
+        on_record_done(0, {"record": {"OneWayKm": 1}, "errors": []})
+        on_record_done(2, {"record": {"OneWayKm": None}, "errors": ["第 3 筆資料處理失敗"]})
+        release.wait(5)
+        on_record_done(1, {"record": {"OneWayKm": 2}, "errors": []})
+        return {"directions_hits": 0}
+
+    manager = BatchJobManager(runner=runner)
+    job = manager.submit([{}, {}, {}])
+    deadline = time.monotonic() + 5
+    while job.to_dict()["processed_count"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    partial = job.to_dict()
+    assert partial["status"] == "running"
+    assert partial["records"][1] is None
+    assert partial["errors"] == ["第 3 筆資料處理失敗"]
+    assert manager.active_jobs() == [job]
+
+    release.set()
+    finished = manager.wait(job.job_id, timeout=5).to_dict()
+    assert finished["status"] == "completed"
+    assert finished["calculated_count"] == 2
+    assert finished["summary"] == {"directions_hits": 0}
+
+
+def test_job_manager_marks_failed_job():
+    def runner(records, on_record_done=None, **params):
+        raise RuntimeError("boom")
+
+    manager = BatchJobManager(runner=runner)
+    job = manager.wait(manager.submit([{}]).job_id, timeout=5)
+    assert job.status == "failed"
+    assert job.error == "boom"
+
+
+def test_duplicate_routes_computed_once(fake_maps, monkeypatch, tmp_path):
+    """相同起終點只計算、截圖與標註一次，日期不同的紀錄共用同一張標註圖（標註不含日期）"""
+    shots = []
+    annotations = []
+
+    def fake_capture(origin, destination, output_path, **kwargs):
+        shots.append((origin, destination))
+        with open(output_path, "wb") as f:
+            f.write(b"\0" * 20000)
+        return output_path
+
+    def fake_annotate(source, output_path, distance_km, origin_addr, dest_addr, round_trip_km=None, generated_at=None,
+                      copy=True):
+        annotations.append(output_path)
+        return False
+
+    monkeypatch.setattr(calculate, "capture_route_screenshot_sync", fake_capture)
+    monkeypatch.setattr(calculate, "get_temp_maps_dir", lambda: tmp_path)
+    monkeypatch.setattr(calculate, "get_relative_path", lambda p: p)
+    monkeypatch.setattr(calculate.maps_service, "open_map_image", lambda source: source)
+    monkeypatch.setattr(calculate.maps_service, "annotate_map_image", fake_annotate)
+
+    dates = ["2024-01-02", "2024-01-02", "2024-01-03", "2024-01-02"]
+    records = [
+        {"IsDriving": "Y", "起點名稱": "安環高雄處", "目的地名稱": "目的地-7", "出差日期時間（開始）": d}
+        for d in dates
+    ]
+    records.append({"IsDriving": "Y", "起點名稱": "安環高雄處", "目的地名稱": "目的地-9"})
+
+    with app.app_context():
+        result = calculate._run_batch(records, "", concurrency=3)
+
+    assert fake_maps.directions_calls == 2
+    assert len(shots) == 2
+    assert result["unique_routes"] == 2
+    assert result["shared_routes"] == 3
+    assert result["directions_api_calls"] == 2
+    assert [r["OneWayKm"] for r in result["records"]] == [7, 7, 7, 7, 9]
+
+    images = [r["StaticMapImage"] for r in result["records"]]
+    assert images[0] == images[1] == images[2] == images[3]
+    assert images[4] != images[0]
+    assert len(annotations) == 2
+
+
+def test_repeated_route_reuses_stored_screenshot(fake_maps, monkeypatch, isolated_map_image_store):
+    """重複路線直接使用已存的截圖（跨批次），標註圖不覆寫底圖"""
+    shots = []
+
+    def fake_capture(origin, destination, output_path, **kwargs):
+        shots.append((origin, destination))
+        with open(output_path, "wb") as f:
+            f.write(b"\0" * 20000)
+        return output_path
+
+    monkeypatch.setattr(calculate, "capture_route_screenshot_sync", fake_capture)
+    monkeypatch.setattr(calculate, "get_temp_maps_dir", lambda: isolated_map_image_store.root)
+    monkeypatch.setattr(calculate, "get_relative_path", lambda p: str(p))
+    monkeypatch.setattr(calculate.maps_service, "open_map_image", lambda source: source)
+    monkeypatch.setattr(calculate.maps_service, "annotate_map_image", lambda *args, **kwargs: False)
+    monkeypatch.setattr(calculate, "overlay_timestamp", lambda: "2024/01/05 08:00")
+
+    records = [{"IsDriving": "Y", "起點名稱": "安環高雄處", "目的地名稱": "目的地-7", "出差日期時間（開始）": "2024-01-02"}]
+    with app.app_context():
+        first = calculate._run_batch(records * 2, "", concurrency=1)
+        second = calculate._run_batch(records, "", concurrency=1)
+
+    assert len(shots) == 1
+    image = first["records"][0]["StaticMapImage"]
+    assert image == first["records"][1]["StaticMapImage"] == second["records"][0]["StaticMapImage"]
+
+    store = isolated_map_image_store
+    key = store.key_for_path(image)
+    meta = store.metadata(key)
+    assert meta["kind"] == "annotated"
+    assert store.metadata(meta["base"])["kind"] == "screenshot"
+    assert store.path_for(meta["base"]).exists()
+
+
+def test_each_place_resolved_once_per_batch(fake_maps, monkeypatch):
+    """同一批次每個地點名稱只地理編碼一次，靜態地圖回退沿用解析表座標"""
+    static_calls = []
+
+    def fake_static_map(polyline, origin_address, destination_address, **kwargs):
+        static_calls.append((kwargs["origin_geo"], kwargs["destination_geo"]))
+        return None
+
+    monkeypatch.setattr(calculate.maps_service, "download_static_map_with_polyline", fake_static_map)
+
+    records = [
+        {"IsDriving": "Y", "起點名稱": origin, "目的地名稱": f"目的地-{km}"}
+        for origin, km in [("分處甲", 1), ("分處甲", 2), ("安環高雄處", 1), ("分處甲", 1), ("安環高雄處", 3)]
+    ]
+    with app.app_context():
+        result = calculate._run_batch(records, "", concurrency=3)
+
+    # 分處甲 + 目的地-1/2/3；安環高雄處走對應表；座標查詢只為對應表地址多一次
+    assert fake_maps.geocode_calls == 5
+    assert result["places"] == {"places": 5, "geocode_calls": 5}
+    assert len(static_calls) == result["unique_routes"] == 4
+    assert all(origin and destination for origin, destination in static_calls)
@@ -0,0 +1,120 @@
+"""
+匯出串流下載測試（報表寫入暫存緩衝區後分段回應，不在 output/ 留下檔案）
+"""
+import io
+import zipfile
+
+from openpyxl import Workbook, load_workbook
+
+import routes.export as export_module
+import services.excel_service as excel_module
+import utils.download_stream as download_module
+from app import app
+from utils.download_stream import CHUNK_SIZE, spooled_buffer, stream_download
+from utils.report_generator import ExcelReportGenerator, PDFReportGenerator
+
+
+def _buffer_with(data):
+    buffer = spooled_buffer()
+    buffer.write(data)
+    return buffer
+
+
+def test_stream_download_sends_chunks_and_closes_buffer(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_module, 'get_output_dir', lambda: tmp_path)
+    data = bytes(range(256)) * (CHUNK_SIZE // 128)
+    buffer = _buffer_with(data)
+
+    with app.test_request_context():
+        response = stream_download(buffer, '里程報表_2024.zip', 'application/zip')
+        chunks = list(response.response)
+        response.close()
+
+    assert b''.join(chunks) == data
+    assert len(chunks) == 2
+    assert buffer.closed
+    assert response.content_length == len(data)
+    assert response.mimetype == 'application/zip'
+    disposition = response.headers['Content-Disposition']
+    assert disposition.startswith('attachment;')
+    assert "filename*=UTF-8''%E9%87%8C%E7%A8%8B%E5%A0%B1%E8%A1%A8_2024.zip" in disposition
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_stream_download_can_persist_copy(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_module, 'get_output_dir', lambda: tmp_path)
+    buffer = _buffer_with(b'report-bytes')
+
+    with app.test_request_context():
+        response = stream_download(buffer, 'report.xlsx', 'application/octet-stream', persist=True)
+        assert b''.join(response.response) == b'report-bytes'
+        response.close()
+
+    assert (tmp_path / 'report.xlsx').read_bytes() == b'report-bytes'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=report.xlsx'
+
+
+def test_buffer_closed_when_client_never_reads():
+    buffer = _buffer_with(b'unused')
+    with app.test_request_context():
+        stream_download(buffer, 'a.pdf', 'application/pdf').close()
+    assert buffer.closed
+
+
+def test_excel_export_streams_without_output_file(tmp_path, monkeypatch):
+    """匯出 Excel 直接串流，output/ 不留下檔案"""
+    monkeypatch.setattr(excel_module, 'get_output_dir', lambda: tmp_path / 'output')
+    monkeypatch.setattr(download_module, 'get_output_dir', lambda: tmp_path / 'output')
+    source = tmp_path / 'source.xlsx'
+    wb = Workbook()
+    wb.active.append(['部門', '姓名', '目的地名稱'])
+    wb.active.append(['業務部', '王小明', '台南車站'])
+    wb.save(source)
+
+    with app.test_client() as client:
+        response = client.post('/api/export/excel', json={
+            'file_path': str(source),
+            'records': [{'OneWayKm': 12.5, 'RoundTripKm': 25.0, 'IsDriving': 'Y'}],
+        })
+
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'].startswith('attachment; filename=updated_')
+    ws = load_workbook(io.BytesIO(response.data)).active
+    assert [cell.value for cell in ws[2]][3:6] == [12.5, 25.0, None]
+    assert not (tmp_path / 'output').exists()
+
+
+def test_word_batch_export_builds_zip_in_memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_module.word_service, 'output_dir', tmp_path)
+    record = {'出差日期時間（開始）': '2024-01-05T08:00:00', '起點名稱': '高雄車站', '目的地名稱': '台南車站', 'RoundTripKm': 80}
+
+    with app.test_client() as client:
+        response = client.post('/api/export/word/batch', json={'projects': {'計畫A': [record], '計畫B': [record, record]}})
+        single = client.post('/api/export/word', json={'project_name': '計畫A', 'records': [record]})
+
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.data)) as zipf:
+        assert sorted(zipf.namelist()) == ['計畫A_里程報表.docx', '計畫B_里程報表.docx']
+        assert zipf.read('計畫A_里程報表.docx')[:2] == b'PK'
+    assert single.status_code == 200
+    assert single.data[:2] == b'PK'
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_report_generators_write_to_buffers():
+    """里程報表（Excel / PDF）可直接寫入緩衝區"""
+    records = [{'travel_date': '2024-01-05', 'start_location': 'A', 'end_location': 'B',
+                'one_way_distance': 10, 'round_trip_distance': 20, 'estimated_time': '15 min'}]
+
+    excel = ExcelReportGenerator()
+    excel.generate_mileage_report(records)
+    excel_buffer = spooled_buffer()
+    excel.save(excel_buffer)
+    excel_buffer.seek(0)
+    assert load_workbook(excel_buffer).active['B3'].value == 'A'
+
+    pdf_buffer = spooled_buffer()
+    PDFReportGenerator().generate_mileage_report(records, 'detail', pdf_buffer)
+    pdf_buffer.seek(0)
+    assert pdf_buffer.read(5) == b'%PDF-'
+    assert not pdf_buffer._rolled
@@ -0,0 +1,262 @@
+"""
+Excel 解析測試（串流解析與原本的 pandas 整份解析結果一致）
+"""
+import io
+import types
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+import routes.upload as upload_module
+from app import app
+from services.excel_service import ExcelService, _datetime_to_iso
+
+HEADER = ['部門', '姓名', 'ProjectName', '起點名稱', '出差日期時間（開始）', '出差日期時間（結束）', '目的地名稱', 'IsDriving', '備註']
+
+
+def _write_workbook(path, rows, header=HEADER):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return str(path)
+
+
+def _legacy_records(df):
+    """原本 parse_excel 逐列轉換的寫法"""
+    records = []
+    for _, row in df.iterrows():
+        record = {}
+        for col in df.columns:
+            value = row[col]
+            if pd.isna(value):
+                record[col] = None
+            elif isinstance(value, pd.Timestamp):
+                record[col] = value.isoformat()
+            else:
+                record[col] = value
+        records.append(record)
+    return records
+
+
+def _pandas_records(service, path):
+    """原本 parse_excel 以 pandas 整份讀取後標準化的結果（串流解析的對照）"""
+    df = pd.read_excel(path, engine='openpyxl').rename(columns=service.column_mapping)
+    for col in service.date_columns:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    df = df.drop(columns=[col for col in service.ignored_columns if col in df.columns])
+    df['IsDriving'] = 'N'
+    for col in service.result_columns:
+        df[col] = None
+    return _legacy_records(df)
+
+
+def _sample_rows():
+    return [
+        ['業務部', '王小明', '計畫B', '高雄車站', datetime(2024, 1, 5, 8, 0), datetime(2024, 1, 5, 17, 30), '台南車站', 'Y', '備註一'],
+        [None, None, None, None, None, None, None, None, None],
+        ['研發部', '李小華', '計畫A', '台北車站', '2024/01/06 09:30', '不是日期', '新竹車站', None, None],
+        ['研發部', '李小華', '計畫A', '台北車站', datetime(2024, 1, 2, 8, 0, 0, 250000), None, '桃園車站', 'N', '備註三'],
+    ]
+
+
+@pytest.fixture
+def excel_service():
+    return ExcelService()
+
+
+def test_stream_matches_pandas_parse(tmp_path, excel_service):
+    """串流解析與原本的 pandas 解析產生相同的資料（含欄位順序、空白列與日期轉換），檔尾空白列忽略"""
+    path = _write_workbook(tmp_path / 'trips.xlsx', _sample_rows() + [[None] * len(HEADER)] * 3)
+
+    expected = _pandas_records(excel_service, path)
+    streamed = list(excel_service.iter_records(path, chunk_size=2))
+
+    assert streamed == expected
+    assert [list(record) for record in streamed] == [list(record) for record in expected]
+    assert streamed[0]['出差日期時間（開始）'] == '2024-01-05T08:00:00'
+    assert streamed[2]['出差日期時間（結束）'] is None
+    assert streamed[3]['出差日期時間（開始）'] == '2024-01-02T08:00:00.250000'
+    assert all(record['IsDriving'] == 'N' for record in streamed)
+
+
+def test_stream_is_lazy_and_chunk_size_independent(tmp_path, excel_service):
+    rows = [['部門', f'員工{i}', '計畫A', '起點', datetime(2024, 1, 1 + i % 28, 8), None, '終點', None, i] for i in range(25)]
+    path = _write_workbook(tmp_path / 'many.xlsx', rows)
+
+    records = excel_service.iter_records(path, chunk_size=7)
+    assert isinstance(records, types.GeneratorType)
+    assert next(records)['姓名'] == '員工0'
+    assert list(excel_service.iter_records(path, chunk_size=1)) == list(excel_service.iter_records(path, chunk_size=100))
+
+
+def test_missing_columns(tmp_path, excel_service):
+    path = _write_workbook(tmp_path / 'bad.xlsx', [['業務部', '王小明']], header=['部門', '姓名'])
+
+    with pytest.raises(ValueError, match='缺少必要欄位'):
+        next(excel_service.iter_records(path))
+    result = excel_service.parse_excel_grouped(path)
+    assert result['success'] is False
+    assert result['error'] == '缺少必要欄位: 計畫別, 起點名稱, 出差日期時間（開始）, 出差日期時間（結束）, 目的地名稱'
+
+
+def test_grouped_parse_matches_group_by_project(tmp_path, excel_service):
+    path = _write_workbook(tmp_path / 'trips.xlsx', _sample_rows())
+
+    result = excel_service.parse_excel_grouped(path)
+    expected = excel_service.group_by_project(_pandas_records(excel_service, path))
+
+    assert result['success'] is True
+    assert result['total_count'] == 4
+    assert result['data'] == expected
+    assert [r['目的地名稱'] for r in result['data']['計畫A']] == ['桃園車站', '新竹車站']
+
+
+def test_datetime_to_iso_matches_timestamp_isoformat():
+    series = pd.Series(pd.to_datetime([
+        '2024-01-05 08:00:00', '2024-01-05 08:00:00.5', '1969-12-31 23:59:59.25',
+        '2024-01-05 08:00:00.000000123', None,
+    ], format='ISO8601'))
+
+    expected = [None if pd.isna(value) else value.isoformat() for value in series]
+    assert list(_datetime_to_iso(series)) == expected
+    assert list(_datetime_to_iso(pd.Series(pd.to_datetime([None, None])))) == [None, None]
+    assert _datetime_to_iso(pd.Series([], dtype='datetime64[ns]')).dtype == np.dtype(object)
+
+
+def test_upload_endpoint_streams_and_groups(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_module, 'get_temp_dir', lambda: tmp_path)
+    content = io.BytesIO()
+    _write_workbook(content, [row for row in _sample_rows() if any(row)])
+    content.seek(0)
+
+    with app.test_client() as client:
+        response = client.post('/api/upload/excel', data={'file': (content, 'trips.xlsx')},
+                               content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['total_count'] == 3
+    assert data['projects']['計畫A']['count'] == 2
+    assert (tmp_path / 'trips.xlsx').exists()
+
+
+def _export_source(path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = '出差紀錄'
+    ws.append(['部門', '姓名', 'IsDriving', '出差日期時間（開始）', '目的地名稱', '=1+1'])
+    ws.append(['業務部', '王小明', 'N', datetime(2024, 1, 5, 8, 0), '台南車站'])
+    ws.append(['研發部', '李小華', None, datetime(2024, 1, 6, 9, 30), '新竹車站', '=B3'])
+    ws.append(['研發部'])
+    ws.append(['管理部', '陳大文', 'Y', None, '屏東車站'])
+    other = wb.create_sheet('說明')
+    other.append(['說明', 123, datetime(2024, 2, 1)])
+    wb.active = 0
+    wb.save(path)
+    return str(path)
+
+
+def _sheet_values(path):
+    from openpyxl import load_workbook
+    wb = load_workbook(path)
+    result = {}
+    for ws in wb.worksheets:
+        rows = [list(row) for row in ws.iter_rows(values_only=True)]
+        for row in rows:
+            while row and row[-1] is None:
+                row.pop()
+        while rows and not rows[-1]:
+            rows.pop()
+        result[ws.title] = rows
+    return wb.active.title, result
+
+
+@pytest.mark.parametrize('record_count', [2, 4, 6])
+def test_streaming_export_matches_full_export(tmp_path, monkeypatch, excel_service, record_count):
+    """串流匯出與載入整個工作簿的匯出內容相同（紀錄少於、等於、多於原始列數）"""
+    monkeypatch.setattr('services.excel_service.get_output_dir', lambda: tmp_path)
+    source = _export_source(tmp_path / 'source.xlsx')
+    records = [
+        {'OneWayKm': 12.3, 'RoundTripKm': 24.6, 'GoogleMapUrl': 'https://maps.example/1', 'StaticMapImage': '/temp/maps/a.png',
+         'IsDriving': 'Y', 'StepCount': 0, 'Polyline': 'abc', 'RouteSteps': '[]'},
+        {'OneWayKm': None, 'RoundTripKm': None, 'GoogleMapUrl': '', 'IsDriving': 'N', 'StepCount': None},
+        {},
+        {'OneWayKm': 0, 'IsDriving': None, 'Polyline': None},
+        {'OneWayKm': 5.5, 'IsDriving': 'Y'},
+        {'RouteSteps': '["直行"]'},
+    ][:record_count]
+
+    full = excel_service.add_calculation_results(source, records, mode='full')
+    (tmp_path / 'full.xlsx').write_bytes(open(full, 'rb').read())
+    streamed = excel_service.add_calculation_results(source, records, mode='streaming')
+
+    assert _sheet_values(streamed) == _sheet_values(tmp_path / 'full.xlsx')
+    title, sheets = _sheet_values(streamed)
+    assert title == '出差紀錄'
+    assert sheets['出差紀錄'][0][-7:] == ['OneWayKm', 'RoundTripKm', 'GoogleMapUrl', 'StaticMapImage', 'StepCount', 'Polyline', 'RouteSteps']
+    assert sheets['出差紀錄'][1][3] == datetime(2024, 1, 5, 8, 0)
+
+
+def test_auto_export_mode_uses_row_threshold(tmp_path, monkeypatch, excel_service):
+    import services.excel_service as excel_module
+    monkeypatch.setattr(excel_module, 'get_output_dir', lambda: tmp_path)
+    monkeypatch.setattr(excel_module, 'EXCEL_STREAM_EXPORT_MIN_ROWS', 3)
+    used = []
+    monkeypatch.setattr(excel_service, '_write_results_full', lambda *args: used.append('full'))
+    monkeypatch.setattr(excel_service, '_write_results_streaming', lambda *args: used.append('streaming'))
+
+    excel_service.add_calculation_results('source.xlsx', [{}] * 2, mode='auto')
+    excel_service.add_calculation_results('source.xlsx', [{}] * 3, mode='auto')
+    assert used == ['full', 'streaming']
+
+
+def test_default_export_mode_keeps_formatting(tmp_path, monkeypatch, excel_service):
+    """預設不論筆數都保留格式，串流需明確指定且會記錄警告"""
+    import services.excel_service as excel_module
+    from loguru import logger
+    monkeypatch.setattr(excel_module, 'get_output_dir', lambda: tmp_path)
+    monkeypatch.setattr(excel_module, 'EXCEL_STREAM_EXPORT_MIN_ROWS', 1)
+    used = []
+    monkeypatch.setattr(excel_service, '_write_results_full', lambda *args: used.append('full'))
+    monkeypatch.setattr(excel_service, '_write_results_streaming', lambda *args: used.append('streaming'))
+    warnings = []
+    sink = logger.add(lambda message: warnings.append(message), level='WARNING')
+    try:
+        excel_service.add_calculation_results('source.xlsx', [{}] * 3)
+        assert warnings == []
+        excel_service.add_calculation_results('source.xlsx', [{}] * 3, mode='streaming')
+    finally:
+        logger.remove(sink)
+
+    assert excel_module.EXCEL_EXPORT_MODE == 'full'
+    assert used == ['full', 'streaming']
+    assert len(warnings) == 1 and '不保留原始檔案的格式' in warnings[0]
+
+
+def test_column_types_do_not_depend_on_chunk_boundaries(tmp_path, excel_service):
+    """欄位型別只推斷一次：跨批的日期格式與整數 / 浮點數與整欄 pandas 解析相同"""
+    rows = [
+        ['業務部', '王小明', '計畫A', '高雄車站', '01/02/2024 08:00', None, '台南車站', None, 1.5],
+        ['業務部', '王小明', '計畫A', '高雄車站', datetime(2024, 1, 3, 8, 0), None, '台南車站', None, 3],
+        # 以下在第二批：第一個值看起來是「日/月」格式，仍沿用第一批推斷的「月/日」格式
+        ['業務部', '王小明', '計畫A', '高雄車站', '13/01/2024 09:00', None, '台南車站', None, 12],
+        ['業務部', '王小明', '計畫A', '高雄車站', '02/03/2024 09:00', None, '台南車站', None, 2.25],
+    ]
+    path = _write_workbook(tmp_path / 'types.xlsx', rows)
+
+    expected = _pandas_records(excel_service, path)
+    for chunk_size in (1, 2, 3, 100):
+        streamed = list(excel_service.iter_records(path, chunk_size=chunk_size))
+        assert streamed == expected
+        assert [type(r['備註']) for r in streamed] == [float] * 4
+
+    assert [r['出差日期時間（開始）'] for r in expected] == [
+        '2024-01-02T08:00:00', '2024-01-03T08:00:00', None, '2024-02-03T09:00:00',
+    ]
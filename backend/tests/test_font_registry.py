@@ -0,0 +1,49 @@
+"""
+中文字體登錄表測試（以假字體檔測試，不需安裝中文字體）
+"""
+import pytest
+from PIL import ImageFont
+
+import utils.font_registry as font_registry_module
+from utils.font_registry import FontRegistry
+
+
+@pytest.fixture
+def fake_truetype(monkeypatch):
+    """以 Pillow 內建字體取代 truetype，並記錄開啟次數"""
+    calls = []
+    original = ImageFont.truetype
+
+    def truetype(font, size, index=0, **kwargs):
+        if not isinstance(font, str):
+            # load_default() 內部會以記憶體字體呼叫 truetype
+            return original(font, size, index=index, **kwargs)
+        calls.append((font, size, index))
+        return ImageFont.load_default(size)
+
+    monkeypatch.setattr(font_registry_module.ImageFont, "truetype", truetype)
+    return calls
+
+
+def test_font_resolved_once_and_cached_per_size(tmp_path, fake_truetype):
+    """字體檔只探測一次，同字級共用同一個物件"""
+    font_file = tmp_path / "cjk.ttf"
+    font_file.write_bytes(b"font")
+    registry = FontRegistry(candidates=[str(tmp_path / "missing.ttf"), str(font_file)])
+
+    first = registry.get_font(24)
+    assert registry.get_font(24) is first
+    assert registry.get_font(40) is not first
+    registry.get_font(40)
+
+    assert registry.resolve() == (str(font_file), 0)
+    # 探測 1 次 + 兩個字級各 1 次
+    assert len(fake_truetype) == 3
+
+
+def test_missing_font_raises_or_falls_back(tmp_path, fake_truetype):
+    registry = FontRegistry(candidates=[str(tmp_path / "missing.ttf")])
+    with pytest.raises(RuntimeError):
+        registry.get_font(20)
+    assert registry.get_font(20, fallback=True) is not None
+    assert fake_truetype == []
@@ -0,0 +1,189 @@
+"""
+暫存檔清理測試（只操作測試暫存目錄）
+"""
+import importlib
+import os
+import time
+from datetime import date
+from functools import partial
+
+from flask import Flask
+
+import app as app_module
+import routes.calculate as calculate
+import services.janitor as janitor_module
+from extensions import db
+from models import TravelRecord
+from services.batch_jobs import BatchJob
+from services.janitor import RetentionPolicy, TempJanitor
+from services.map_image_store import MapImageStore, make_image_key
+
+HOUR = 3600
+
+
+def _make(path, size, age_seconds):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"\0" * size)
+    mtime = time.time() - age_seconds
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_age_policy_removes_old_files_with_sidecars(tmp_path):
+    """超過保留時間的檔案連同同名中繼資料一起刪除，子目錄與新檔案保留"""
+    old_png = _make(tmp_path / "map_old.png", 100, 48 * HOUR)
+    old_json = _make(tmp_path / "map_old.json", 10, 48 * HOUR)
+    new_png = _make(tmp_path / "map_new.png", 100, 2 * HOUR)
+    nested = _make(tmp_path / "tiles" / "old.bin", 100, 48 * HOUR)
+
+    janitor = TempJanitor([RetentionPolicy("maps", tmp_path, max_age_seconds=24 * HOUR)], min_age_seconds=0)
+    result = janitor.run_once()
+
+    assert not old_png.exists() and not old_json.exists()
+    assert new_png.exists() and nested.exists()
+    assert result["files"] == 2 and result["bytes"] == 110
+    assert result["directories"]["maps"]["remaining_bytes"] == 100
+
+
+def test_size_policy_removes_oldest_first(tmp_path):
+    files = [_make(tmp_path / f"f{i}.docx", 100, (10 - i) * HOUR) for i in range(5)]
+
+    janitor = TempJanitor([RetentionPolicy("output", tmp_path, max_bytes=250)], min_age_seconds=0)
+    janitor.run_once()
+
+    assert [f.exists() for f in files] == [False, False, False, True, True]
+
+
+def test_protected_and_fresh_files_are_kept(tmp_path, monkeypatch):
+    """使用中（相對或絕對路徑）與剛產生的檔案不刪除"""
+    monkeypatch.setattr(janitor_module, "get_base_dir", lambda: tmp_path)
+    maps = tmp_path / "temp" / "maps"
+    in_use = _make(maps / "map_a.png", 100, 48 * HOUR)
+    in_use_meta = _make(maps / "map_a.json", 10, 48 * HOUR)
+    absolute = _make(maps / "map_b.png", 100, 48 * HOUR)
+    fresh = _make(maps / "map_c.png", 100, 60)
+    stale = _make(maps / "map_d.png", 100, 48 * HOUR)
+
+    janitor = TempJanitor([RetentionPolicy("maps", maps, max_age_seconds=HOUR, max_bytes=1)], min_age_seconds=600)
+    janitor.add_protected(lambda: ["/temp/maps/map_a.png", None])
+    janitor.add_protected(lambda: [absolute])
+    janitor.add_protected(lambda: 1 / 0)  # 來源失敗不影響清理
+    result = janitor.run_once()
+
+    assert in_use.exists() and in_use_meta.exists() and absolute.exists() and fresh.exists()
+    assert not stale.exists()
+    assert result["protected"] == 3
+
+
+def test_dry_run_and_metrics(tmp_path):
+    """試算不刪除也不計入累計統計；實際執行後累計回收量"""
+    old = _make(tmp_path / "upload.xlsx", 500, 48 * HOUR)
+    janitor = TempJanitor([RetentionPolicy("temp", tmp_path, max_age_seconds=HOUR)], min_age_seconds=0)
+
+    assert janitor.run_once(dry_run=True)["bytes"] == 500
+    assert old.exists()
+    assert janitor.stats()["runs"] == 0
+
+    janitor.run_once()
+    janitor.run_once()
+    stats = janitor.stats()
+    assert not old.exists()
+    assert (stats["runs"], stats["reclaimed_files"], stats["reclaimed_bytes"]) == (2, 1, 500)
+    assert stats["last_run"]["files"] == 0
+
+
+def test_batch_jobs_protect_their_images(monkeypatch):
+    """保留中批次工作已完成紀錄的地圖圖片列為使用中"""
+    job = BatchJob([{"IsDriving": "Y"}], {})
+    job.status = "running"
+    job.record_done(0, {"record": {"StaticMapImage": "/temp/maps/map_x.png"}, "errors": []})
+
+    monkeypatch.setattr(calculate.batch_jobs, "retained_jobs", lambda: [job])
+    assert calculate._job_files() == ["/temp/maps/map_x.png"]
+    assert calculate._job_files in calculate.janitor._protected_providers
+
+
+def _travel_record_providers(app):
+    return [
+        provider for provider in calculate.janitor._protected_providers
+        if isinstance(provider, partial) and provider.func is calculate._travel_record_files and provider.args == (app,)
+    ]
+
+
+def test_both_entry_points_protect_travel_record_images():
+    """main.py（Docker / 執行檔）與 app.py 註冊藍圖時都登記出差紀錄圖片的保護"""
+    main_module = importlib.import_module("main")
+    assert len(_travel_record_providers(main_module.app)) == 1
+    assert len(_travel_record_providers(app_module.app)) == 1
+
+
+def test_travel_record_images_are_listed(tmp_path):
+    """背景執行緒（無 app context）也能列出資料庫中出差紀錄引用的地圖圖片"""
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'records.db'}"
+    db.init_app(app)
+    app.register_blueprint(calculate.bp, url_prefix="/api/calculate")
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            TravelRecord(travel_date=date(2024, 1, 5), start_location="A", end_location="B",
+                         map_image_path="/temp/maps/map_a.png"),
+            TravelRecord(travel_date=date(2024, 1, 6), start_location="A", end_location="C"),
+        ])
+        db.session.commit()
+
+    (provider,) = _travel_record_providers(app)
+    calculate.janitor._protected_providers.remove(provider)
+    assert provider() == ["/temp/maps/map_a.png"]
+
+
+def test_held_files_are_kept_until_expiry(tmp_path, monkeypatch):
+    """暫時保留的檔案（同步批次回傳的圖片）到期前不刪除"""
+    monkeypatch.setattr(janitor_module, "get_base_dir", lambda: tmp_path)
+    maps = tmp_path / "temp" / "maps"
+    held = _make(maps / "map_a.png", 100, 48 * HOUR)
+    janitor = TempJanitor([RetentionPolicy("maps", maps, max_age_seconds=HOUR)], min_age_seconds=0)
+
+    janitor.hold(["/temp/maps/map_a.png", None], HOUR)
+    assert janitor.run_once()["protected"] == 1
+    assert held.exists()
+
+    janitor.hold(["/temp/maps/map_a.png"], -1)  # 不縮短既有的保留時間
+    assert janitor.run_once()["protected"] == 1
+    later = time.time() + 2 * HOUR
+    monkeypatch.setattr(janitor_module.time, "time", lambda: later)
+    janitor.run_once()
+    assert not held.exists()
+
+
+def test_sync_batch_holds_returned_images(monkeypatch):
+    """同步批次回傳的地圖圖片保留與背景工作結果相同的時間"""
+    janitor = TempJanitor([])
+    monkeypatch.setattr(calculate, "janitor", janitor)
+    monkeypatch.setattr(calculate, "_run_batch", lambda records, fixed_origin, concurrency: {
+        "records": [{"StaticMapImage": "/temp/maps/map_x.png", "OneWayKm": 5}, {"StaticMapImage": None}],
+        "errors": [], "directions_hits": 0, "directions_api_calls": 1, "unique_routes": 1, "shared_routes": 0,
+        "places": {},
+    })
+
+    with app_module.app.test_client() as client:
+        response = client.post("/api/calculate/batch", json={"records": [{"IsDriving": "Y"}] * 2})
+
+    assert response.status_code == 200
+    assert list(janitor._holds) == ["/temp/maps/map_x.png"]
+    assert janitor._holds["/temp/maps/map_x.png"] > time.time() + calculate.batch_jobs.retention_seconds - 60
+
+
+def test_reused_store_image_survives_sweep(tmp_path):
+    """重複路線取用的舊底圖（修改時間已超過保留時間）不會在交給紀錄後立即被刪除"""
+    store = MapImageStore(tmp_path)
+    key = make_image_key("screenshot", "A", "B")
+    path = store.put_bytes(key, b"png")
+    for stale in (path, tmp_path / f"map_{key}.json"):
+        mtime = time.time() - 48 * HOUR
+        os.utime(stale, (mtime, mtime))
+
+    assert store.lookup(key) == path
+    janitor = TempJanitor([RetentionPolicy("maps", tmp_path, max_age_seconds=24 * HOUR)], min_age_seconds=0)
+    assert janitor.run_once()["files"] == 0
+    assert path.exists() and store.lookup(key) == path
@@ -0,0 +1,115 @@
+"""
+本機地圖繪製測試（不需網路，使用 Pillow 內建字體）
+"""
+import numpy as np
+import pytest
+from PIL import Image, ImageFont
+
+import routes.calculate as calculate
+from app import app
+from services.google_maps_service import GoogleMapsService
+from services.local_map_renderer import ALTERNATIVE_COLOR, ROUTE_COLOR, LocalMapRenderer
+from utils import polyline
+
+
+@pytest.fixture
+def renderer(monkeypatch):
+    service = GoogleMapsService()
+    monkeypatch.setattr(service, "_load_cjk_font", lambda size: ImageFont.load_default(size))
+    return LocalMapRenderer(service)
+
+
+def _route(n=300, seed=0):
+    steps = np.random.default_rng(seed).normal(0, 0.002, (n, 2))
+    return np.cumsum(steps, axis=0) + [22.6, 120.3]
+
+
+def test_render_base_draws_routes_inside_padding(renderer):
+    """主路線與替代路線都畫在畫面內距內，A/B 預設為主路線起終點"""
+    main, alt = _route(), _route(seed=1)
+    base, ab_markers = renderer.render_base([polyline.encode(main), polyline.encode(alt)])
+
+    assert base.size == (1200, 800)
+    assert ab_markers["a"] == pytest.approx(tuple(polyline.decode(polyline.encode(main))[0]))
+    zoom, (center_lat, center_lng) = ab_markers["zoom"], ab_markers["center"]
+
+    pixels = polyline.project(polyline.decode(ab_markers["paths"][0]), zoom, 1200, 800, center_lat, center_lng)
+    assert (pixels[:, 0] >= 120).all() and (pixels[:, 0] <= 1080).all()
+    assert (pixels[:, 1] >= 120).all() and (pixels[:, 1] <= 680).all()
+
+    colors = {base.getpixel((int(round(x)), int(round(y)))) for x, y in pixels}
+    assert ROUTE_COLOR in colors
+    alt_pixels = polyline.project(polyline.decode(ab_markers["paths"][1]), zoom, 1200, 800, center_lat, center_lng)
+    assert ALTERNATIVE_COLOR in {base.getpixel((int(round(x)), int(round(y)))) for x, y in alt_pixels}
+
+
+def test_render_uses_background_provider(renderer):
+    """背景提供者回傳圖磚合成結果時使用該背景，失敗時改用素色背景"""
+    calls = []
+
+    def background(zoom, center_lat, center_lng, width, height):
+        calls.append(zoom)
+        return Image.new("RGB", (width, height), (10, 20, 30))
+
+    renderer.background = background
+    base, _ = renderer.render_base([polyline.encode(_route())])
+    assert calls and base.getpixel((2, 2)) == (10, 20, 30)
+
+    renderer.background = lambda *args: 1 / 0
+    base, _ = renderer.render_base([polyline.encode(_route())])
+    assert base.getpixel((2, 2)) != (10, 20, 30)
+
+
+def test_render_writes_annotated_map_without_network(renderer, monkeypatch, tmp_path):
+    """完整繪製與標註不呼叫任何網路服務（耗時比較見 bench_local_renderer.py）"""
+    import requests
+
+    def no_network(*args, **kwargs):
+        raise AssertionError("不應呼叫網路")
+
+    monkeypatch.setattr(requests, "get", no_network)
+    route_detail = {
+        "polyline": polyline.encode(_route()),
+        "alternative_polylines": [polyline.encode(_route(seed=1))],
+        "distance_km": 12.3,
+    }
+
+    path = renderer.render(route_detail, "起點", "終點", output_path=tmp_path / "map.png")
+    assert path == str(tmp_path / "map.png")
+    with Image.open(path) as image:
+        assert image.size == (1200, 800)
+
+
+def test_render_returns_none_for_missing_polyline(renderer, tmp_path):
+    assert renderer.render({"polyline": None, "distance_km": 1}, "A", "B", output_path=tmp_path / "x.png") is None
+
+
+def test_compute_route_falls_back_to_local_renderer(monkeypatch, tmp_path):
+    """截圖與靜態地圖都失敗時，以本機繪製的地圖作為所有紀錄的地圖"""
+    encoded = polyline.encode(_route())
+    route_detail = {
+        "success": True, "distance_km": 7, "polyline": encoded, "alternative_polylines": [],
+        "start_location": {"lat": 22.6, "lng": 120.3}, "end_location": {"lat": 22.62, "lng": 120.31},
+    }
+    rendered = []
+
+    def fake_render(detail, origin, destination, origin_geo=None, destination_geo=None):
+        rendered.append((origin_geo, destination_geo))
+        path = tmp_path / "local.png"
+        path.write_bytes(b"png")
+        return str(path)
+
+    monkeypatch.setattr(calculate.maps_service, "get_route_detail", lambda *a, **k: route_detail)
+    monkeypatch.setattr(calculate.maps_service, "download_static_map_with_polyline", lambda *a, **k: None)
+    monkeypatch.setattr(calculate, "capture_route_screenshot_sync", lambda **kwargs: None)
+    monkeypatch.setattr(calculate.local_renderer, "render", fake_render)
+
+    class Resolver:
+        def locate(self, address):
+            return None
+
+    with app.app_context():
+        result = calculate._compute_route(("A", "B"), Resolver())
+
+    assert result["image"] == tmp_path / "local.png"
+    assert rendered[0][0]["lat"] == 22.6
@@ -0,0 +1,154 @@
+"""
+地圖標註合成測試（使用 Pillow 內建字體，不需安裝中文字體）
+"""
+import io
+
+import pytest
+from PIL import Image, ImageFont
+
+import services.google_maps_service as google_maps_module
+from services.google_maps_service import GoogleMapsService
+
+
+@pytest.fixture
+def maps_service(monkeypatch):
+    service = GoogleMapsService()
+    monkeypatch.setattr(service, "_load_cjk_font", lambda size: ImageFont.load_default(size))
+    return service
+
+
+def _png_bytes(width=1920, height=1080):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (230, 230, 230)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+AB_MARKERS = {
+    "a": (22.60, 120.30), "b": (22.62, 120.31), "zoom": 13, "center": (22.61, 120.305),
+    "paths": ["_p~iF~ps|U_ulLnnqC"],
+}
+
+
+def test_single_decode_and_encode(maps_service, monkeypatch, tmp_path):
+    """所有標註在一次解碼、一次編碼中完成"""
+    source = tmp_path / "shot.png"
+    source.write_bytes(_png_bytes())
+
+    opens, saves = [], []
+    original_open, original_save = google_maps_module.Image.open, Image.Image.save
+    monkeypatch.setattr(google_maps_module.Image, "open", lambda *a, **k: opens.append(a) or original_open(*a, **k))
+    monkeypatch.setattr(Image.Image, "save", lambda self, *a, **k: saves.append(a) or original_save(self, *a, **k))
+
+    assert maps_service.annotate_map_image(
+        str(source), source, 12.35, "高雄市前鎮區", "高雄市苓雅區", ab_markers=AB_MARKERS
+    )
+    assert len(opens) == 1
+    assert len(saves) == 1
+
+
+def test_annotate_from_bytes_and_image(maps_service, tmp_path):
+    """可直接由下載內容或已解碼影像合成，且不修改傳入影像"""
+    raw = _png_bytes(1200, 800)
+    assert maps_service.annotate_map_image(raw, tmp_path / "a.png", 5, "A", "B", ab_markers=AB_MARKERS)
+
+    base = Image.open(io.BytesIO(raw)).convert("RGB")
+    assert maps_service.annotate_map_image(base, tmp_path / "b.png", 5, "A", "B")
+    assert base.getcolors() == [(1200 * 800, (230, 230, 230))]
+
+    with Image.open(tmp_path / "a.png") as annotated:
+        assert annotated.size == (1200, 800)
+        assert len(annotated.getcolors(1 << 16)) > 1
+
+
+def test_annotate_owned_image_without_copy(maps_service, monkeypatch, tmp_path):
+    """呼叫端擁有的影像以 copy=False 傳入時直接在原影像上繪製，不再複製整張影像"""
+    base = Image.open(io.BytesIO(_png_bytes(1200, 800))).convert("RGB")
+    copies = []
+    original_copy = Image.Image.copy
+    monkeypatch.setattr(Image.Image, "copy", lambda self: copies.append(self) or original_copy(self))
+
+    assert maps_service.annotate_map_image(base, tmp_path / "owned.png", 5, "A", "B", copy=False)
+    assert copies == []
+    assert len(base.getcolors(1 << 16)) > 1
+
+
+def test_failed_annotation_keeps_raw_bytes(maps_service, monkeypatch, tmp_path):
+    """標註失敗時仍寫出原始圖片"""
+    monkeypatch.setattr(maps_service, "_load_cjk_font", lambda size: (_ for _ in ()).throw(RuntimeError("no font")))
+    raw = _png_bytes(400, 300)
+    assert maps_service.annotate_map_image(raw, tmp_path / "raw.png", 5, "A", "B") is False
+    assert (tmp_path / "raw.png").read_bytes() == raw
+
+
+def test_annotation_replaces_output_atomically(maps_service, tmp_path):
+    """輸出以暫存檔改名覆蓋（既有檔案不會被截斷），相同產出時間的圖片內容一致"""
+    raw = _png_bytes(600, 400)
+    target = tmp_path / "map.png"
+    target.write_bytes(b"old")
+    with open(target, "rb") as reader:
+        assert maps_service.annotate_map_image(raw, target, 5, "A", "B", generated_at="2024/01/05 08:00")
+        assert reader.read() == b"old"
+    first = target.read_bytes()
+
+    assert maps_service.annotate_map_image(raw, target, 5, "A", "B", generated_at="2024/01/05 08:00")
+    assert target.read_bytes() == first
+    assert maps_service.annotate_map_image(raw, target, 5, "A", "B", generated_at="2024/01/05 08:01")
+    assert target.read_bytes() != first
+    assert [p.name for p in tmp_path.iterdir()] == ["map.png"]
+
+
+def test_stroke_text_draws_outline():
+    """外框文字一次繪製即包含外框顏色與文字顏色"""
+    from PIL import ImageDraw
+    from utils.text_render import draw_text, text_size
+
+    font = ImageFont.load_default(30)
+    frame = Image.new("RGB", (300, 80), (0, 0, 255))
+    draw_text(ImageDraw.Draw(frame), (10, 10), "12.3 km", font, fill=(50, 50, 50), outline=(255, 255, 255))
+    colors = {color for _, color in frame.getcolors(1 << 16)}
+    assert (255, 255, 255) in colors and (50, 50, 50) in colors
+    assert text_size(font, "12.3 km", outline_width=2)[0] > text_size(font, "12.3 km")[0]
+
+
+def test_wrap_text_by_pixel_width():
+    from utils.text_render import text_size, wrap_text
+
+    font = ImageFont.load_default(20)
+    lines = wrap_text("A點（起點）：高雄市前鎮區復興四路12號", font, 120)
+    assert len(lines) > 1
+    assert "".join(lines) == "A點（起點）：高雄市前鎮區復興四路12號"
+    assert all(text_size(font, line)[0] <= 120 for line in lines)
+
+
+def test_label_layout_avoids_markers_route_and_labels():
+    """標籤避開 marker、路線與已放置的標籤，且不超出畫面"""
+    from utils.label_layout import LabelLayout
+
+    layout = LabelLayout(1000, 600)
+    layout.add_marker(500, 300, 17)
+    # 路線從 marker 往右上延伸，偏好的右上位置會壓到路線
+    layout.add_route([(500, 300), (900, 200)])
+
+    assert layout.score((520, 240, 720, 300)) > 0
+    first = layout.place(500, 300, 200, 60, prefer="right")
+    assert first == (520, 320, 720, 380)
+
+    # 第二個標籤的偏好位置已被第一個標籤佔用
+    second = layout.place(520, 310, 200, 60, prefer="right")
+    layout.labels.remove(second)
+    assert layout.score(second) == 0
+    assert not (second[0] < first[2] and first[0] < second[2] and second[1] < first[3] and first[1] < second[3])
+
+    # 靠近右下角時改放在畫面內
+    corner = LabelLayout(400, 300).place(390, 290, 200, 60, prefer="right")
+    assert corner[0] >= 8 and corner[2] <= 392 and corner[3] <= 292
+
+
+def test_label_placement_does_not_allocate_images(maps_service, monkeypatch, tmp_path):
+    """標籤排版不再為每個候選位置建立暫存影像"""
+    raw = _png_bytes()
+    created = []
+    original_new = google_maps_module.Image.new
+    monkeypatch.setattr(google_maps_module.Image, "new", lambda *a, **k: created.append(a) or original_new(*a, **k))
+    assert maps_service.annotate_map_image(raw, tmp_path / "out.png", 3, "A", "B", ab_markers=AB_MARKERS)
+    assert created == []
@@ -0,0 +1,54 @@
+"""
+地圖圖片內容定址儲存測試
+"""
+import json
+import time
+
+from services.map_image_store import MapImageStore, make_image_key
+
+
+def test_key_depends_on_route_and_params():
+    """相同路線與參數得到相同鍵值，任一參數不同即不同"""
+    key = make_image_key("screenshot", "起點", "終點", viewport="1920x1080")
+    assert key == make_image_key("screenshot", "起點", "終點", viewport="1920x1080")
+    assert key != make_image_key("screenshot", "起點", "終點", viewport="1200x800")
+    assert key != make_image_key("screenshot", "終點", "起點", viewport="1920x1080")
+    assert key != make_image_key("static", "起點", "終點", viewport="1920x1080")
+    assert len(key) == 64
+
+
+def test_put_lookup_and_sidecar(tmp_path):
+    """寫入後可由鍵值或路徑查回，中繼資料存在 sidecar"""
+    store = MapImageStore(tmp_path)
+    key = make_image_key("static", "A", "B")
+    assert store.lookup(key) is None
+
+    path = store.put_bytes(key, b"png-bytes", kind="static", origin="A")
+    assert store.lookup(key) == path == tmp_path / f"map_{key}.png"
+    assert store.key_for_path(path) == key
+    assert store.key_for_path(tmp_path / "gmap_route_20240101.png") is None
+
+    sidecar = json.loads((tmp_path / f"map_{key}.json").read_text(encoding="utf-8"))
+    assert sidecar["kind"] == "static" and sidecar["origin"] == "A" and sidecar["size"] == 9
+    assert store.stats() == {"hits": 1, "misses": 1}
+
+
+def test_put_file_moves_into_store(tmp_path):
+    store = MapImageStore(tmp_path / "store")
+    source = tmp_path / "capture.png"
+    source.write_bytes(b"x" * 10)
+
+    path = store.put_file("a" * 64, source, kind="screenshot")
+    assert not source.exists()
+    assert path.read_bytes() == b"x" * 10
+
+
+def test_expired_images_are_not_reused(tmp_path):
+    store = MapImageStore(tmp_path, ttl_seconds=60)
+    key = make_image_key("static", "A", "B")
+    store.put_bytes(key, b"old")
+
+    meta = store.metadata(key)
+    meta["created_at"] = time.time() - 120
+    (tmp_path / f"map_{key}.json").write_text(json.dumps(meta), encoding="utf-8")
+    assert store.lookup(key) is None
@@ -0,0 +1,143 @@
+"""
+Polyline 工具測試（與 googlemaps 內建純 Python 實作比對）
+"""
+import random
+
+import numpy as np
+import pytest
+from googlemaps.convert import decode_polyline, encode_polyline
+
+from services.google_maps_service import GoogleMapsService
+from utils import polyline
+
+
+def test_decode_known_polyline():
+    """Google 文件範例"""
+    decoded = polyline.decode("_p~iF~ps|U_ulLnnqC_mqNvxq`@")
+    assert np.allclose(decoded, [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]])
+    assert polyline.decode("").shape == (0, 2)
+    with pytest.raises(ValueError):
+        polyline.decode("_p~iF")
+
+
+def test_encode_decode_match_reference():
+    """編碼/解碼結果與 googlemaps 實作一致"""
+    rng = random.Random(7)
+    for _ in range(200):
+        points = [
+            (round(rng.uniform(-80, 80), 5), round(rng.uniform(-179, 179), 5))
+            for _ in range(rng.randint(1, 40))
+        ]
+        encoded = encode_polyline(points)
+        assert polyline.encode(points) == encoded
+        reference = [[p["lat"], p["lng"]] for p in decode_polyline(encoded)]
+        assert np.allclose(polyline.decode(encoded), reference)
+
+
+def test_simplify_keeps_endpoints_and_corners():
+    straight = np.column_stack((np.linspace(0, 100, 50), np.zeros(50)))
+    assert polyline.simplify(straight, 0.5).tolist() == [0, 49]
+
+    corner = np.array([[0, 0], [5, 0.1], [10, 0], [10, 5], [10, 10]])
+    assert polyline.simplify(corner, 1.0).tolist() == [0, 2, 4]
+    assert polyline.simplify(corner, 0).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_project_matches_scalar_projection():
+    """向量化投影與 _latlng_to_pixel 相同"""
+    service = GoogleMapsService()
+    points = np.array([[22.6, 120.3], [25.03, 121.56], [-33.86, 151.2], [89.0, 0.0]])
+    projected = polyline.project(points, 12, 1200, 800, 23.0, 120.9)
+    expected = [service._latlng_to_pixel(lat, lng, 12, 1200, 800, 23.0, 120.9) for lat, lng in points]
+    assert np.allclose(projected, expected)
+    assert polyline.bounds(points) == (-33.86, 0.0, 89.0, 151.2)
+
+
+def _random_walk(n, seed=0):
+    steps = np.random.default_rng(seed).normal(0, 0.0008, (n, 2))
+    return np.cumsum(steps, axis=0) + [22.6, 120.3]
+
+
+def test_fit_encoded_finds_smallest_simplification():
+    """二分搜尋後長度符合上限，且不會過度簡化"""
+    encoded = polyline.encode(_random_walk(3000))
+    budget = len(encoded) // 4
+
+    fitted = polyline.fit_encoded([encoded], lambda ps: len(ps[0]) <= budget, zoom=14)
+    assert len(fitted[0]) <= budget
+    assert len(fitted[0]) > budget * 0.8
+    decoded = polyline.decode(fitted[0])
+    assert np.allclose(decoded[[0, -1]], polyline.decode(encoded)[[0, -1]])
+
+    assert polyline.fit_encoded([encoded], lambda ps: True) == [encoded]
+    assert polyline.fit_encoded([encoded], lambda ps: False) is None
+
+
+def _legacy_choose_zoom(service, lat1, lng1, lat2, lng2, W, H, padding_px=120):
+    """原本逐級（21 → 0）檢查的縮放選擇，作為封閉解的對照"""
+    center_lat = (lat1 + lat2) / 2.0
+    center_lng = (lng1 + lng2) / 2.0
+    for z in range(21, -1, -1):
+        x1, y1 = service._latlng_to_pixel(lat1, lng1, z, W, H, center_lat, center_lng)
+        x2, y2 = service._latlng_to_pixel(lat2, lng2, z, W, H, center_lat, center_lng)
+        if (
+            min(x1, x2) >= padding_px and max(x1, x2) <= W - padding_px
+            and min(y1, y2) >= padding_px and max(y1, y2) <= H - padding_px
+        ):
+            return z, center_lat, center_lng
+    return 15, center_lat, center_lng
+
+
+def test_fit_zoom_matches_legacy_loop_for_endpoints():
+    """只有起終點時，封閉解與逐級檢查結果相同（不同距離尺度、圖片大小與內距）"""
+    service = GoogleMapsService()
+    rng = random.Random(16)
+    for _ in range(3000):
+        lat1, lng1 = rng.uniform(-85, 85), rng.uniform(-180, 180)
+        spread = 10 ** rng.uniform(-7, 2.5)
+        lat2 = max(min(lat1 + rng.uniform(-spread, spread), 85), -85)
+        lng2 = lng1 + rng.uniform(-spread, spread)
+        W, H = rng.choice([(1200, 800), (640, 640), (300, 200), (100, 100)])
+        padding = rng.choice([0, 20, 120])
+
+        expected = _legacy_choose_zoom(service, lat1, lng1, lat2, lng2, W, H, padding)
+        assert service._choose_zoom_for_two_points(lat1, lng1, lat2, lng2, W, H, padding) == expected
+
+
+def test_fit_zoom_edge_cases_match_legacy_loop():
+    """相同座標用最大縮放；內距大於半寬時任何縮放都放不下，沿用預設 15"""
+    service = GoogleMapsService()
+    for args in [
+        (25.03, 121.56, 25.03, 121.56, 1200, 800, 120),
+        (25.03, 121.56, 22.62, 120.30, 200, 200, 120),
+        (-60.0, -170.0, 70.0, 170.0, 1200, 800, 120),
+        (0.0, 0.0, 0.0, 1e-9, 1200, 800, 0),
+    ]:
+        assert service._choose_zoom_for_two_points(*args) == _legacy_choose_zoom(service, *args)
+
+
+def test_fit_zoom_vectorized_matches_scalar():
+    """陣列輸入一次計算多組範圍，結果與逐一計算相同"""
+    rng = np.random.default_rng(3)
+    a = rng.uniform([-60, -170], [60, 170], size=(500, 2))
+    b = a + rng.normal(scale=0.5, size=(500, 2))
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+
+    zooms, center_lat, center_lng = polyline.fit_zoom(lo[:, 0], lo[:, 1], hi[:, 0], hi[:, 1], 1200, 800)
+    assert zooms.shape == (500,)
+    for i in range(500):
+        assert polyline.fit_zoom(lo[i, 0], lo[i, 1], hi[i, 0], hi[i, 1], 1200, 800) == (
+            zooms[i], center_lat[i], center_lng[i]
+        )
+
+
+def test_fit_zoom_uses_full_route_bounds():
+    """繞行路段超出起終點範圍時，以完整路線範圍縮放，所有路線點都在內距內"""
+    service = GoogleMapsService()
+    route = [(25.00, 121.50), (25.20, 121.80), (25.01, 121.52)]
+    endpoint_zoom = service._choose_zoom_for_two_points(*route[0], *route[-1], 1200, 800)[0]
+    zoom, center_lat, center_lng = service._choose_zoom_for_points(route, 1200, 800, padding_px=120)
+
+    assert zoom < endpoint_zoom
+    pixels = polyline.project(route, zoom, 1200, 800, center_lat, center_lng)
+    assert (pixels >= 120).all() and (pixels[:, 0] <= 1080).all() and (pixels[:, 1] <= 680).all()
@@ -0,0 +1,264 @@
+"""
+瀏覽器池與地圖就緒偵測測試（使用假 Playwright 物件，不啟動 Chromium）
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from loguru import logger
+
+import services.gmap_screenshot_service as screenshot_service
+from services.gmap_screenshot_service import BrowserPool, TileRequestTracker, wait_for_map_ready
+
+
+@pytest.fixture(autouse=True)
+def fast_readiness(monkeypatch):
+    monkeypatch.setattr(screenshot_service, "READY_QUIET_MS", 0)
+    monkeypatch.setattr(screenshot_service, "READY_POLL_MS", 1)
+
+
+class FakeRequest:
+    def __init__(self, url):
+        self.url = url
+
+
+class FakePage:
+    def __init__(self, context=None, panel_after=0, frames=None):
+        self.context = context
+        self.viewport_size = {"width": 1920, "height": 1080}
+        self.closed = False
+        self.handlers = {}
+        self.polls = 0
+        self.panel_after = panel_after
+        self.frames = frames or [b"frame"]
+
+    def on(self, event, handler):
+        self.handlers.setdefault(event, []).append(handler)
+
+    def emit(self, event, url):
+        for handler in self.handlers.get(event, []):
+            handler(FakeRequest(url))
+
+    async def goto(self, url, wait_until=None, timeout=None):
+        if self.context:
+            self.context.browser.urls.append(url)
+
+    async def wait_for_selector(self, selector, timeout=None):
+        return True
+
+    async def query_selector(self, selector):
+        return object() if self.polls >= self.panel_after else None
+
+    async def wait_for_timeout(self, ms):
+        self.polls += 1
+        await asyncio.sleep(ms / 1000)
+
+    async def set_viewport_size(self, size):
+        self.viewport_size = size
+
+    async def screenshot(self, path=None, full_page=False, type="png", quality=None, clip=None):
+        if path is None:
+            return self.frames[min(self.polls, len(self.frames) - 1)]
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG" + b"\0" * 20000)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.closed = False
+
+    async def new_page(self):
+        return FakePage(self)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self, owner):
+        self.owner = owner
+        self.connected = True
+        self.urls = []
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **kwargs):
+        self.owner.contexts += 1
+        return FakeContext(self)
+
+    async def close(self):
+        self.connected = False
+
+
+class FakeChromium:
+    def __init__(self, owner):
+        self.owner = owner
+
+    async def launch(self, headless=True, args=None):
+        if self.owner.fail_launch:
+            raise RuntimeError("Executable doesn't exist")
+        self.owner.launches += 1
+        browser = FakeBrowser(self.owner)
+        self.owner.browsers.append(browser)
+        return browser
+
+
+class FakePlaywright:
+    def __init__(self, fail_launch=False):
+        self.fail_launch = fail_launch
+        self.launches = 0
+        self.contexts = 0
+        self.browsers = []
+        self.chromium = FakeChromium(self)
+
+    async def start(self):
+        return self
+
+    async def stop(self):
+        pass
+
+
+def _pool(fake, **kwargs):
+    return BrowserPool(playwright_factory=lambda: fake, **kwargs)
+
+
+def test_pool_reuses_browser_across_captures(tmp_path):
+    """多筆截圖共用同一個瀏覽器"""
+    fake = FakePlaywright()
+    pool = _pool(fake, browsers=1, contexts_per_browser=2)
+    try:
+        for i in range(5):
+            assert pool.capture("A", f"B{i}", tmp_path / f"{i}.png") == str(tmp_path / f"{i}.png")
+        assert fake.launches == 1
+        assert fake.contexts <= 2
+        assert pool.health()["pages"] == 5
+    finally:
+        pool.shutdown()
+
+
+def test_pool_recycles_contexts_and_browsers(tmp_path):
+    """context 與瀏覽器在服務指定頁數後重建"""
+    fake = FakePlaywright()
+    pool = _pool(fake, browsers=2, contexts_per_browser=2, recycle_after_pages=2, browser_recycle_after_pages=6)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(
+                lambda i: pool.capture("A", f"B{i}", tmp_path / f"{i}.png"), range(20)
+            ))
+        assert all(results)
+        health = pool.health()
+        assert health["pages"] == 20
+        assert health["context_recycles"] > 0
+        assert health["browser_recycles"] > 0
+        assert all(e["in_use"] == 0 for e in health["browsers"])
+    finally:
+        pool.shutdown()
+
+
+def test_pool_relaunches_disconnected_browser(tmp_path):
+    """健康檢查發現瀏覽器斷線時重新啟動"""
+    fake = FakePlaywright()
+    pool = _pool(fake, browsers=1, contexts_per_browser=1)
+    try:
+        assert pool.capture("A", "B", tmp_path / "1.png")
+        fake.browsers[0].connected = False
+        assert pool.capture("A", "B", tmp_path / "2.png")
+        assert fake.launches == 2
+    finally:
+        pool.shutdown()
+
+
+def test_pool_launch_failure_returns_none(tmp_path):
+    """瀏覽器無法啟動時回傳 None，並暫停重試"""
+    fake = FakePlaywright(fail_launch=True)
+    pool = _pool(fake, launch_retry_seconds=60)
+    try:
+        assert pool.capture("A", "B", tmp_path / "1.png") is None
+        assert pool.capture("A", "B", tmp_path / "2.png") is None
+        assert pool.health()["failures"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_pool_slot_wait_times_out_separately(tmp_path, monkeypatch):
+    """等待 context 逾時與截圖逾時分開計算，逾時的等待不佔用 context"""
+    release = threading.Event()
+
+    async def slow_capture(page, maps_url, output_path, wait_timeout, readiness=None):
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return str(output_path)
+
+    monkeypatch.setattr(screenshot_service, "_capture_on_page", slow_capture)
+    messages = []
+    sink = logger.add(lambda message: messages.append(message), level="WARNING")
+    pool = _pool(FakePlaywright(), browsers=1, contexts_per_browser=1, slot_wait_seconds=0.1)
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            first = executor.submit(pool.capture, "A", "B", tmp_path / "1.png")
+            while not any(e["in_use"] for e in pool.health()["browsers"]):
+                time.sleep(0.01)
+            assert pool.capture("A", "C", tmp_path / "2.png") is None
+            release.set()
+            assert first.result() == str(tmp_path / "1.png")
+        assert pool.capture("A", "D", tmp_path / "3.png") == str(tmp_path / "3.png")
+        assert pool.health()["pages"] == 2
+    finally:
+        release.set()
+        logger.remove(sink)
+        pool.shutdown()
+    assert any("等待可用 context 逾時" in m for m in messages)
+    assert not any("截圖逾時" in m for m in messages)
+
+
+def test_readiness_waits_for_tile_requests():
+    """圖磚請求結束且畫面穩定後才回報就緒"""
+    page = FakePage(frames=[b"a", b"b", b"c", b"c"])
+    tracker = TileRequestTracker()
+    tracker.attach(page)
+
+    async def scenario():
+        page.emit("request", "https://www.google.com/maps/vt?pb=1")
+        page.emit("request", "https://example.com/analytics.js")
+
+        async def finish_tiles():
+            await asyncio.sleep(0.05)
+            page.emit("requestfinished", "https://www.google.com/maps/vt?pb=1")
+
+        asyncio.ensure_future(finish_tiles())
+        return await wait_for_map_ready(page, tracker, timeout_ms=2000, quiet_ms=0, poll_ms=5)
+
+    result = asyncio.run(scenario())
+    assert result["timed_out"] is False
+    assert result["stable"] and result["panel"] and result["network_idle"]
+    assert result["tile_requests"] == 1
+    assert 50 <= result["ready_ms"] < 2000
+
+
+def test_readiness_respects_ceiling():
+    """路線面板一直沒出現時，在上限時間後放行"""
+    page = FakePage(panel_after=10**6)
+    tracker = TileRequestTracker()
+    result = asyncio.run(wait_for_map_ready(page, tracker, timeout_ms=100, quiet_ms=0, poll_ms=5))
+    assert result["timed_out"] is True
+    assert result["panel"] is False
+    assert 100 <= result["ready_ms"] < 1000
+
+
+def test_pool_reports_readiness_metrics(tmp_path):
+    fake = FakePlaywright()
+    pool = _pool(fake)
+    try:
+        metrics = {}
+        assert pool.capture("A", "B", tmp_path / "1.png", metrics=metrics)
+        assert metrics["timed_out"] is False
+        assert pool.health()["avg_ready_ms"] is not None
+    finally:
+        pool.shutdown()
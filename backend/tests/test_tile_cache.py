@@ -0,0 +1,142 @@
+"""
+圖磚快取與合成測試（以本機 HTTP 假伺服器作為圖磚來源，不連外網）
+"""
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from services.tile_cache import HttpTileSource, TileCompositor, TileStore
+from utils import polyline
+
+
+def _tile_color(z, x, y):
+    return (x * 40 % 256, y * 40 % 256, z * 10 % 256)
+
+
+def _tile_png(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (256, 256), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def tile_server():
+    """本機圖磚伺服器：/{z}/{x}/{y}.png 回傳依座標決定顏色的單色圖磚"""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            z, x, y = (int(part) for part in self.path.strip("/").removesuffix(".png").split("/"))
+            requests_seen.append((z, x, y))
+            body = _tile_png(_tile_color(z, x, y))
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/{{z}}/{{x}}/{{y}}.png", requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+def test_store_deduplicates_identical_tiles(tmp_path):
+    """相同內容的圖磚只存一份，全部鍵移除後才刪除內容檔"""
+    store = TileStore(tmp_path, max_bytes=10_000)
+    data = b"ocean" * 10
+    store.put(3, 1, 1, data)
+    store.put(3, 2, 1, data)
+
+    assert store.get(3, 1, 1) == store.get(3, 2, 1) == data
+    assert store.get(3, 9, 9) is None
+    stats = store.stats()
+    assert (stats["tiles"], stats["blobs"], stats["bytes"]) == (2, 1, len(data))
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    assert len(list((tmp_path / "blobs").rglob("*"))) == 2  # 一個子目錄 + 一個內容檔
+
+
+def test_store_evicts_least_recently_used(tmp_path):
+    """超過大小上限時淘汰最久未使用的圖磚"""
+    store = TileStore(tmp_path, max_bytes=300)
+    for x in range(3):
+        store.put(5, x, 0, bytes([x]) * 100)
+    store.get(5, 0, 0)  # (5, 0, 0) 變為最近使用
+    store.put(5, 3, 0, b"\x03" * 100)
+
+    assert store.get(5, 1, 0) is None
+    assert store.get(5, 0, 0) is not None
+    assert store.stats()["evictions"] == 1
+    assert store.stats()["bytes"] == 300
+
+
+def test_store_reloads_from_disk(tmp_path):
+    """重啟後由索引檔重建快取"""
+    store = TileStore(tmp_path, max_bytes=10_000)
+    store.put(7, 10, 20, b"tile-a")
+    store.put(7, 11, 20, b"tile-b")
+
+    reloaded = TileStore(tmp_path, max_bytes=10_000)
+    assert reloaded.get(7, 10, 20) == b"tile-a"
+    assert reloaded.get(7, 11, 20) == b"tile-b"
+    assert reloaded.stats()["bytes"] == 12
+
+
+def test_store_reads_tiles_outside_lock(tmp_path, monkeypatch):
+    """讀取圖磚檔案時不持有鎖；檔案被外部刪除時視為未快取，不留下暫存檔"""
+    store = TileStore(tmp_path, max_bytes=10_000)
+    store.put(4, 1, 1, b"land")
+    store.put(4, 2, 1, b"sea")
+    original_blob_path = store._blob_path
+    locked_during_read = []
+
+    class ObservedPath:
+        def __init__(self, path):
+            self.path = path
+
+        def read_bytes(self):
+            locked_during_read.append(store._lock.locked())
+            return self.path.read_bytes()
+
+    monkeypatch.setattr(store, "_blob_path", lambda digest: ObservedPath(original_blob_path(digest)))
+    assert store.get(4, 1, 1) == b"land"
+    assert locked_during_read == [False]
+    monkeypatch.undo()
+
+    original_blob_path(store._entries[(4, 2, 1)]).unlink()
+    assert store.get(4, 2, 1) is None
+    assert store.stats()["tiles"] == 1
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_compositor_fetches_once_then_uses_cache(tmp_path, tile_server):
+    """第一次合成向來源下載，之後同一範圍完全由快取提供，且圖磚位置與投影一致"""
+    url, requests_seen = tile_server
+    compositor = TileCompositor(TileStore(tmp_path, max_bytes=10_000_000), HttpTileSource(url, timeout=5))
+
+    image = compositor(12, 22.6, 120.3, 1200, 800)
+    assert image.size == (1200, 800)
+    first = len(requests_seen)
+    assert 20 <= first <= 30
+
+    again = compositor.compose(12, 22.6, 120.3, 1200, 800)
+    assert len(requests_seen) == first
+    assert again.tobytes() == image.tobytes()
+
+    # 畫面中心位於中心點所在圖磚
+    cx, cy = polyline.world_pixels([[22.6, 120.3]], 12)[0]
+    assert image.getpixel((600, 400)) == _tile_color(12, int(cx // 256), int(cy // 256))
+
+
+def test_compositor_without_tiles_returns_none(tmp_path):
+    """沒有來源且快取為空時回傳 None（本機繪製改用素色背景）"""
+    compositor = TileCompositor(TileStore(tmp_path, max_bytes=1000))
+    assert compositor(12, 22.6, 120.3, 1200, 800) is None
@@ -0,0 +1,143 @@
+"""
+已解析 Excel 快取測試（以檔案內容雜湊為鍵，重複上傳、預覽不再解析）
+"""
+import io
+import json
+import shutil
+from datetime import datetime, time
+
+from openpyxl import Workbook
+
+import routes.upload as upload_module
+import services.workbook_cache as workbook_cache_module
+from app import app
+from services.excel_service import ExcelService
+from services.workbook_cache import ParsedWorkbookCache, file_digest
+
+HEADER = ['部門', '姓名', '計畫別', '起點名稱', '出差日期時間（開始）', '出差日期時間（結束）', '目的地名稱']
+
+
+def _workbook_bytes(destinations):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(HEADER)
+    for day, destination in enumerate(destinations, start=1):
+        ws.append(['業務部', '王小明', '計畫A', '高雄車站', datetime(2024, 1, day, 8), None, destination])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _fail_parse(*args, **kwargs):
+    raise AssertionError('不應重新解析')
+
+
+def test_round_trip_and_disk_reload(tmp_path):
+    """以欄存放後還原為相同資料，每次回傳新的字典；重啟後由磁碟載入"""
+    records = [{'a': 1, 'b': None, 'c': '字'}, {'a': 2, 'b': 1.5, 'c': None}]
+    cache = ParsedWorkbookCache(tmp_path, memory_entries=1)
+    cache.put('d1', records)
+
+    first = cache.get('d1')
+    assert first == records
+    first[0]['a'] = 99
+    assert cache.get('d1') == records
+
+    reloaded = ParsedWorkbookCache(tmp_path)
+    assert reloaded.get('d1') == records
+    assert reloaded.get('missing') is None
+    assert (reloaded.stats()['disk_hits'], reloaded.stats()['misses']) == (1, 1)
+
+    # 記憶體只保留 1 份：d1 被擠出後改由磁碟讀取
+    cache.put('d2', [{'x': 1}, {'y': 2}])  # 欄位不一致時逐筆存放
+    assert cache.get('d2') == [{'x': 1}, {'y': 2}]
+    assert cache.get('d1') == records
+    assert cache.stats()['disk_hits'] == 1
+    cache.put('empty', [])
+    assert cache.get('empty') == []
+
+
+def test_stale_or_corrupt_files_are_misses(tmp_path, monkeypatch):
+    cache = ParsedWorkbookCache(tmp_path)
+    (tmp_path / 'broken.json').write_text('not json', encoding='utf-8')
+    (tmp_path / 'old.json').write_text(json.dumps({'version': 0, 'columns': [], 'values': [], 'count': 0}))
+    (tmp_path / 'bad.json').write_text(json.dumps({'version': workbook_cache_module.PARSER_VERSION, 'columns': 1}))
+
+    assert cache.get('broken') is None
+    assert cache.get('old') is None
+    assert cache.get('bad') is None
+
+    cache.put('current', [{'a': 1}])
+    monkeypatch.setattr(workbook_cache_module, 'PARSER_VERSION', workbook_cache_module.PARSER_VERSION + 1)
+    assert ParsedWorkbookCache(tmp_path).get('current') is None
+
+
+def test_disk_cache_is_plain_json(tmp_path):
+    """磁碟快取為 JSON（不 unpickle）；數值欄名與型別原樣還原，無法存為 JSON 的值只留在記憶體"""
+    cache = ParsedWorkbookCache(tmp_path)
+    cache.put('rows', [{2024: 1, 'b': True}, {'c': 1.5}])
+    assert json.loads((tmp_path / 'rows.json').read_text(encoding='utf-8'))['version'] == workbook_cache_module.PARSER_VERSION
+    assert ParsedWorkbookCache(tmp_path).get('rows') == [{2024: 1, 'b': True}, {'c': 1.5}]
+
+    cache.put('times', [{'a': time(8, 30)}])
+    assert not (tmp_path / 'times.json').exists()
+    assert cache.get('times') == [{'a': time(8, 30)}]
+    assert not list(tmp_path.glob('*.pkl'))
+
+
+def test_identical_content_skips_parsing(tmp_path, monkeypatch):
+    """相同內容（不同檔名）第二次解析直接使用快取，結果相同"""
+    service = ExcelService()
+    data = _workbook_bytes(['台南車站', '屏東車站'])
+    first_path = tmp_path / 'first.xlsx'
+    first_path.write_bytes(data)
+    second_path = tmp_path / 'second.xlsx'
+    shutil.copy(first_path, second_path)
+
+    first = service.parse_excel_grouped(str(first_path))
+    monkeypatch.setattr(service, 'iter_records', _fail_parse)
+    second = service.parse_excel_grouped(str(second_path))
+
+    assert first == second
+    assert second['total_count'] == 2
+    assert file_digest(first_path) == file_digest(second_path)
+
+
+def test_changed_content_is_parsed_again(tmp_path):
+    service = ExcelService()
+    path = tmp_path / 'trips.xlsx'
+    path.write_bytes(_workbook_bytes(['台南車站']))
+    assert service.parse_excel_grouped(str(path))['total_count'] == 1
+
+    path.write_bytes(_workbook_bytes(['台南車站', '嘉義車站', '屏東車站']))
+    assert service.parse_excel_grouped(str(path))['total_count'] == 3
+
+
+def test_reupload_uses_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_module, 'get_temp_dir', lambda: tmp_path)
+    data = _workbook_bytes(['台南車站', '屏東車站'])
+
+    with app.test_client() as client:
+        first = client.post('/api/upload/excel', data={'file': (io.BytesIO(data), 'a.xlsx')},
+                            content_type='multipart/form-data')
+        monkeypatch.setattr(upload_module.excel_service, 'iter_records', _fail_parse)
+        second = client.post('/api/upload/excel', data={'file': (io.BytesIO(data), 'b.xlsx')},
+                             content_type='multipart/form-data')
+
+    assert first.status_code == second.status_code == 200
+    assert first.get_json()['data']['projects'] == second.get_json()['data']['projects']
+
+
+def test_failed_disk_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    """寫入磁碟失敗時不留下暫存檔，仍可由記憶體取得"""
+    import utils.atomic_write as atomic_write_module
+
+    def fail_replace(src, dst):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(atomic_write_module.os, 'replace', fail_replace)
+    cache = ParsedWorkbookCache(tmp_path)
+    cache.put('d1', [{'a': 1}])
+
+    assert list(tmp_path.iterdir()) == []
+    assert cache.get('d1') == [{'a': 1}]
@@ -0,0 +1,39 @@
+"""
+原子寫檔工具
+先寫入同目錄的暫存檔（檔名含程序與執行緒編號，多程序、多執行緒同時寫同一檔案也不會共用暫存檔），
+再以 os.replace 改名覆蓋；讀取端只會看到完整的舊檔或新檔，寫入失敗時刪除暫存檔。
+"""
+import os
+import threading
+from pathlib import Path
+
+
+def write_atomic(path, write):
+    """
+    以暫存檔改名的方式寫入檔案
+
+    Args:
+        path: 目標路徑
+        write: 以暫存檔路徑（Path）呼叫的寫檔函式
+
+    Returns:
+        Path: 目標路徑
+    """
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
+
+
+def write_bytes_atomic(path, data):
+    """
+    以暫存檔改名的方式寫入位元組內容
+
+    Returns:
+        Path: 目標路徑
+    """
+    return write_atomic(path, lambda tmp: tmp.write_bytes(data))
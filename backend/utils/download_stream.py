@@ -0,0 +1,81 @@
+"""
+匯出檔案下載工具
+報表先寫入 SpooledTemporaryFile（小檔留在記憶體，超過上限才寫到會自動刪除的暫存檔），
+再以分段串流回應，不在 output/ 或系統暫存目錄留下檔案；需要保留時可另存一份到 output/。
+"""
+import os
+import shutil
+import tempfile
+import unicodedata
+from urllib.parse import quote
+
+from flask import Response
+from loguru import logger
+
+from utils.path_manager import get_output_dir
+
+EXPORT_SPOOL_MAX_BYTES = int(float(os.getenv("EXPORT_SPOOL_MAX_MB", "32")) * 1024 * 1024)
+EXPORT_PERSIST_COPY = os.getenv("EXPORT_PERSIST_COPY", "false").strip().lower() in ("1", "true", "yes")
+CHUNK_SIZE = 64 * 1024
+
+
+def spooled_buffer():
+    """
+    建立匯出用的暫存緩衝區
+
+    Returns:
+        tempfile.SpooledTemporaryFile: 超過 EXPORT_SPOOL_MAX_MB 才寫到磁碟，關閉後自動刪除
+    """
+    return tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES, mode="w+b")
+
+
+def stream_download(buffer, download_name, mimetype, persist=None):
+    """
+    將緩衝區內容以附件下載分段串流回應（回應結束後關閉緩衝區）
+
+    Args:
+        buffer: 已寫入內容的檔案物件（例如 spooled_buffer()）
+        download_name: 下載檔名
+        mimetype: MIME 類型
+        persist: 是否另存一份到 output/（None 表示使用 EXPORT_PERSIST_COPY）
+
+    Returns:
+        Response: 串流回應
+    """
+    size = buffer.seek(0, os.SEEK_END)
+    buffer.seek(0)
+
+    if EXPORT_PERSIST_COPY if persist is None else persist:
+        path = get_output_dir() / download_name
+        with open(path, "wb") as f:
+            shutil.copyfileobj(buffer, f, CHUNK_SIZE)
+        buffer.seek(0)
+        logger.info(f"已另存匯出檔案: {path}")
+
+    def generate():
+        try:
+            while True:
+                chunk = buffer.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            buffer.close()
+
+    response = Response(generate(), mimetype=mimetype, direct_passthrough=True)
+    response.content_length = size
+    response.headers.set("Content-Disposition", "attachment", **_filename_params(download_name))
+    # 用戶端未讀取就中斷時也釋放緩衝區
+    response.call_on_close(buffer.close)
+    return response
+
+
+def _filename_params(download_name):
+    # 與 Flask send_file 相同：非 ASCII 檔名另以 RFC 5987 filename* 提供
+    try:
+        download_name.encode("ascii")
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", download_name).encode("ascii", "ignore").decode("ascii")
+        quoted = quote(download_name, safe="!#$&+-.^_`|~")
+        return {"filename": simple, "filename*": f"UTF-8''{quoted}"}
+    return {"filename": download_name}
@@ -0,0 +1,152 @@
+"""
+中文字體登錄表
+全程序共用：啟動時解析一次可用的中文字體檔，並依字級快取 ImageFont 物件，
+避免每張地圖重新搜尋字體檔與開啟 TTC。
+"""
+import os
+import threading
+from pathlib import Path
+
+from loguru import logger
+from PIL import Image, ImageDraw, ImageFont
+
+# 專案內字體（永遠優先，不依賴系統字體）
+ASSETS_FONTS_DIR = Path(__file__).resolve().parent.parent / "assets" / "fonts"
+PROJECT_FONT = ASSETS_FONTS_DIR / "NotoSansTC-Regular.ttf"
+
+
+def default_candidates():
+    """
+    取得字體候選清單（專案字體優先，其次為系統中文字體）
+
+    Returns:
+        list: 字體檔路徑（未檢查是否存在）
+    """
+    candidates = [str(PROJECT_FONT)]
+
+    if os.name == "nt":
+        # Windows 系統字體
+        fonts_dir = os.path.join(os.environ.get("WINDIR", "C:/Windows"), "Fonts")
+        candidates += [
+            os.path.join(fonts_dir, "msjh.ttc"),      # 微軟正黑體
+            os.path.join(fonts_dir, "msjhbd.ttc"),    # 微軟正黑體粗體
+            os.path.join(fonts_dir, "mingliu.ttc"),   # 新細明體
+            os.path.join(fonts_dir, "kaiu.ttf"),      # 標楷體
+            os.path.join(fonts_dir, "simsun.ttc"),    # 宋體
+            os.path.join(fonts_dir, "simsun.ttf"),    # 宋體
+            os.path.join(fonts_dir, "msyh.ttc"),      # 微軟雅黑
+            os.path.join(fonts_dir, "msyhbd.ttc"),    # 微軟雅黑粗體
+        ]
+    else:
+        # Linux / 其他系統字體（Render 環境通常沒有，但保留作為備選）
+        candidates += [
+            "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+            "/usr/share/fonts/opentype/noto/NotoSansCJKtc-Regular.otf",
+            "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",
+            "/usr/share/fonts/truetype/noto/NotoSansTC-Regular.ttf",
+            "/usr/share/fonts/truetype/noto/NotoSansTC-Regular.otf",
+            "/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf",
+        ]
+    return candidates
+
+
+class FontRegistry:
+    """中文字體登錄表（字體檔只解析一次，ImageFont 依字級快取）"""
+
+    def __init__(self, candidates=None):
+        """
+        Args:
+            candidates: 字體候選路徑（None 表示使用 default_candidates()）
+        """
+        self._candidates = candidates
+        self._resolved = None  # (路徑, TTC 索引)；False 表示找不到可用字體
+        self._fonts = {}
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        """
+        解析可用的中文字體檔（只在第一次呼叫時搜尋）
+
+        Returns:
+            tuple: (字體路徑, TTC 索引)，找不到時為 None
+        """
+        with self._lock:
+            if self._resolved is None:
+                self._resolved = self._probe() or False
+            return self._resolved or None
+
+    def get_font(self, size, fallback=False):
+        """
+        取得指定字級的中文字體
+
+        Args:
+            size: 字級
+            fallback: 找不到中文字體時改用 Pillow 預設字體（否則拋出 RuntimeError）
+
+        Returns:
+            ImageFont.FreeTypeFont: 字體物件（同字級共用同一個物件）
+        """
+        size = int(size)
+        font = self._fonts.get(size)
+        if font is not None:
+            return font
+
+        resolved = self.resolve()
+        if not resolved:
+            if fallback:
+                return ImageFont.load_default(size)
+            # 不使用預設字體（因為不支援中文），改為拋出異常，避免靜默失敗
+            raise RuntimeError(f"無法載入中文字體！請確認專案字體檔案存在於: {PROJECT_FONT}")
+
+        path, index = resolved
+        with self._lock:
+            font = self._fonts.get(size)
+            if font is None:
+                font = ImageFont.truetype(path, size, index=index)
+                self._fonts[size] = font
+        return font
+
+    def reset(self):
+        """清除解析結果與字體快取（更換字體檔後使用）"""
+        with self._lock:
+            self._resolved = None
+            self._fonts.clear()
+
+    def _probe(self):
+        candidates = self._candidates if self._candidates is not None else default_candidates()
+        existing = [os.path.abspath(fp) for fp in candidates if fp and os.path.exists(fp)]
+
+        for fp in existing:
+            # TTC 檔案可能包含多個字體，嘗試不同索引
+            indices = [0, 1, 2] if fp.lower().endswith(".ttc") else [0]
+            for idx in indices:
+                try:
+                    font = ImageFont.truetype(fp, 20, index=idx)
+                    # 測試字體是否能正確顯示中文（確保文字寬度 > 0）
+                    test_bbox = ImageDraw.Draw(Image.new("RGB", (100, 100))).textbbox((0, 0), "測試", font=font)
+                    if test_bbox[2] > test_bbox[0]:
+                        logger.info(f"[FONT] ✓ 使用中文字體: {fp} (index={idx})")
+                        return fp, idx
+                except Exception as e:
+                    logger.debug(f"[FONT] 無法載入字體 {fp} (index={idx}): {e}")
+
+        logger.error("[FONT] ✗ 無法載入任何中文字體！中文字將無法正確顯示。")
+        logger.error(f"[FONT] 已嘗試的候選字體數量: {len(existing)}，專案字體路徑: {PROJECT_FONT}")
+        return None
+
+
+font_registry = FontRegistry()
+
+
+def get_cjk_font(size, fallback=False):
+    """
+    取得指定字級的中文字體（全程序共用快取）
+
+    Args:
+        size: 字級
+        fallback: 找不到中文字體時改用 Pillow 預設字體
+
+    Returns:
+        ImageFont.FreeTypeFont: 字體物件
+    """
+    return font_registry.get_font(size, fallback=fallback)
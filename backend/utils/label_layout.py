@@ -0,0 +1,167 @@
+"""
+地圖標籤排版工具
+以字體量測一次文字大小，用幾何方式計算候選位置，依與 marker、路線像素及其他標籤的重疊程度評分，
+只繪製最佳位置（不需建立暫存影像試畫）。
+"""
+import numpy as np
+
+from utils.text_render import text_size, wrap_text
+
+# 評分權重：超出畫面（每像素）> 壓到 marker（每平方像素）> 壓到其他標籤（每平方像素）> 壓到路線（每個取樣點）
+OUT_OF_BOUNDS_WEIGHT = 1000.0
+MARKER_WEIGHT = 1.0
+LABEL_WEIGHT = 0.5
+ROUTE_WEIGHT = 5.0
+# 候選順序的微小偏好，分數相同時依原本的優先順序
+ORDER_WEIGHT = 0.01
+
+
+def measure_label_box(text, font, max_width, padding=10, line_spacing=4):
+    """
+    量測標籤框大小（依像素寬度換行）
+
+    Args:
+        text: 標籤文字
+        font: 字體
+        max_width: 每行最大寬度（像素）
+        padding: 內距
+        line_spacing: 行距
+
+    Returns:
+        dict: {"lines": 各行文字, "line_h": 行高, "width": 框寬, "height": 框高}
+    """
+    lines = wrap_text(text, font, max_width)
+    line_h = font.getbbox("測")[3] + line_spacing
+    max_line_w = max((text_size(font, ln)[0] for ln in lines), default=0)
+    text_h = line_h * len(lines) - line_spacing
+    return {
+        "lines": lines,
+        "line_h": line_h,
+        "width": max_line_w + padding * 2,
+        "height": text_h + padding * 2,
+    }
+
+
+def _overlap_area(a, b):
+    w = min(a[2], b[2]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[1], b[1])
+    return w * h if w > 0 and h > 0 else 0
+
+
+class LabelLayout:
+    """單張地圖的標籤排版（記錄障礙物並為每個標籤挑選重疊最少的位置）"""
+
+    def __init__(self, width, height, margin=8, route_step=8):
+        """
+        Args:
+            width: 畫面寬
+            height: 畫面高
+            margin: 標籤與畫面邊緣最小距離
+            route_step: 路線取樣間距（像素）
+        """
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.route_step = max(route_step, 1)
+
+        self.markers = []       # (l, t, r, b)
+        self.labels = []        # (l, t, r, b)
+        self.route_points = np.empty((0, 2))  # (x, y)
+
+    def add_marker(self, x, y, radius):
+        """加入 marker（以外接矩形視為障礙物）"""
+        self.markers.append((x - radius, y - radius, x + radius, y + radius))
+
+    def add_route(self, points):
+        """
+        加入路線像素座標（依 route_step 在線段上補點，避免長直線段沒有取樣點）
+
+        Args:
+            points: [(x, y), ...] 或 shape (N, 2) 陣列
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) == 0:
+            return
+        if len(points) > 1:
+            starts, ends = points[:-1], points[1:]
+            lengths = np.hypot(*(ends - starts).T)
+            steps = np.maximum((lengths // self.route_step).astype(np.int64), 1)
+            # 每個線段依長度取樣：start + (end - start) * (i / steps)
+            seg = np.repeat(np.arange(len(starts)), steps)
+            offsets = np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)
+            t = (offsets / steps[seg])[:, None]
+            sampled = starts[seg] + (ends[seg] - starts[seg]) * t
+            points = np.vstack((sampled, points[-1:]))
+        self.route_points = np.vstack((self.route_points, points))
+
+    def candidates(self, px, py, box_w, box_h, prefer="right", offset=20):
+        """
+        計算錨點周圍的候選矩形（偏好側優先）
+
+        Returns:
+            list: [(l, t, r, b), ...]
+        """
+        right = px + offset
+        left = px - box_w - offset
+        above = py - 60
+        below = py + offset
+        middle = py - box_h / 2
+        center = px - box_w / 2
+
+        near = [(right, above), (right, below)]
+        far = [(left, above), (left, below)]
+        if prefer != "right":
+            near, far = far, near
+        positions = near + far + [
+            (right if prefer == "right" else left, middle),
+            (left if prefer == "right" else right, middle),
+            (center, py - box_h - offset),
+            (center, below),
+        ]
+        return [(int(x), int(y), int(x + box_w), int(y + box_h)) for x, y in positions]
+
+    def score(self, rect):
+        """
+        計算候選矩形的分數（越低越好）
+        """
+        l, t, r, b = rect
+        m = self.margin
+        out = (max(m - l, 0) + max(m - t, 0) + max(r - (self.width - m), 0) + max(b - (self.height - m), 0))
+
+        marker_overlap = sum(_overlap_area(rect, marker) for marker in self.markers)
+        label_overlap = sum(_overlap_area(rect, label) for label in self.labels)
+        xs, ys = self.route_points[:, 0], self.route_points[:, 1]
+        route_hits = int(np.count_nonzero((xs >= l) & (xs <= r) & (ys >= t) & (ys <= b)))
+
+        return (
+            out * OUT_OF_BOUNDS_WEIGHT
+            + marker_overlap * MARKER_WEIGHT
+            + label_overlap * LABEL_WEIGHT
+            + route_hits * ROUTE_WEIGHT
+        )
+
+    def place(self, px, py, box_w, box_h, prefer="right", offset=20):
+        """
+        為錨點 (px, py) 的標籤挑選最佳位置，並記錄為後續標籤的障礙物
+
+        Returns:
+            tuple: 最佳矩形 (l, t, r, b)
+        """
+        best = None
+        for order, rect in enumerate(self.candidates(px, py, box_w, box_h, prefer, offset)):
+            rect_score = self.score(rect) + order * ORDER_WEIGHT
+            if best is None or rect_score < best[0]:
+                best = (rect_score, rect)
+
+        rect = self._clamp(best[1])
+        self.labels.append(rect)
+        return rect
+
+    def _clamp(self, rect):
+        # 都放不下時仍限制在畫面內
+        l, t, r, b = rect
+        w, h = r - l, b - t
+        m = self.margin
+        l = min(max(m, l), max(self.width - w - m, m))
+        t = min(max(m, t), max(self.height - h - m, m))
+        return (l, t, l + w, t + h)
@@ -50,6 +50,32 @@ def get_temp_maps_dir():
     return temp_maps_dir
 
 
+def get_tile_cache_dir():
+    """
+    取得地圖圖磚快取目錄
+    
+    Returns:
+        Path: 圖磚快取目錄路徑
+    """
+    base_dir = get_base_dir()
+    tile_cache_dir = base_dir / 'temp' / 'tiles'
+    tile_cache_dir.mkdir(parents=True, exist_ok=True)
+    return tile_cache_dir
+
+
+def get_parsed_cache_dir():
+    """
+    取得已解析 Excel 快取目錄
+    
+    Returns:
+        Path: 已解析 Excel 快取目錄路徑
+    """
+    base_dir = get_base_dir()
+    parsed_cache_dir = base_dir / 'temp' / 'parsed'
+    parsed_cache_dir.mkdir(parents=True, exist_ok=True)
+    return parsed_cache_dir
+
+
 def get_output_dir():
     """
     取得輸出目錄
@@ -0,0 +1,273 @@
+"""
+Polyline 工具（NumPy 向量化）
+Google Encoded Polyline 解碼/編碼、Douglas–Peucker 簡化、Web Mercator 投影到像素座標，
+不需逐點 Python 迴圈，可供本機繪圖與縮放/範圍計算使用。
+"""
+import numpy as np
+
+POLYLINE_PRECISION = 1e5
+# Web Mercator 有效緯度範圍
+MAX_LATITUDE = 85.05112878
+TILE_SIZE = 256.0
+
+
+def decode(encoded):
+    """
+    解碼 Google Encoded Polyline
+
+    Args:
+        encoded: 編碼字串（overview_polyline.points）
+
+    Returns:
+        np.ndarray: shape (N, 2) 的 [lat, lng]（float64）
+    """
+    if not encoded:
+        return np.empty((0, 2), dtype=np.float64)
+
+    chunks = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    # 小於 0x20 的字元是每個數值的最後一段
+    ends = np.flatnonzero(chunks < 0x20)
+    if ends.size % 2:
+        raise ValueError("polyline 格式錯誤：座標數值不成對")
+    starts = np.concatenate(([0], ends[:-1] + 1))
+
+    # 每段在所屬數值中的位置（0, 1, 2, ...），左移 5 * 位置後加總
+    position = np.arange(chunks.size) - np.repeat(starts, ends - starts + 1)
+    values = np.add.reduceat((chunks & 0x1F) << (5 * position), starts)
+
+    # zigzag 解碼後累加差值
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / POLYLINE_PRECISION
+
+
+def encode(points):
+    """
+    編碼為 Google Encoded Polyline
+
+    Args:
+        points: [(lat, lng), ...] 或 shape (N, 2) 陣列
+
+    Returns:
+        str: 編碼字串
+    """
+    coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if coords.size == 0:
+        return ""
+
+    scaled = np.round(coords * POLYLINE_PRECISION).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    # 每個數值拆成 5 bit 一段（最多 7 段），除最後一段外加上 0x20 延續位元
+    shifts = 5 * np.arange(7)
+    parts = (values[:, None] >> shifts) & 0x1F
+    counts = 1 + (values[:, None] >> shifts[1:] > 0).sum(axis=1)
+    used = np.arange(7) < counts[:, None]
+    more = np.arange(7) < (counts - 1)[:, None]
+    chars = (parts | np.where(more, 0x20, 0)) + 63
+    return chars[used].astype(np.uint8).tobytes().decode("ascii")
+
+
+def simplify(points, tolerance):
+    """
+    Douglas–Peucker 簡化（保留起終點）
+
+    Args:
+        points: shape (N, 2) 陣列（建議先投影為像素或公尺，使容許誤差有一致單位）
+        tolerance: 容許誤差（與座標同單位）
+
+    Returns:
+        np.ndarray: 保留點的索引（遞增）
+    """
+    coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    n = len(coords)
+    if n <= 2 or tolerance <= 0:
+        return np.arange(n)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, n - 1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = coords[start + 1:end]
+        a, b = coords[start], coords[end]
+        ab = b - a
+        length = np.hypot(ab[0], ab[1])
+        if length == 0:
+            distances = np.hypot(segment[:, 0] - a[0], segment[:, 1] - a[1])
+        else:
+            distances = np.abs(ab[0] * (segment[:, 1] - a[1]) - ab[1] * (segment[:, 0] - a[0])) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return np.flatnonzero(keep)
+
+
+def world_pixels(latlng, zoom):
+    """
+    Web Mercator：緯經度轉為指定縮放等級的世界像素座標
+
+    Args:
+        latlng: shape (N, 2) 的 [lat, lng]
+        zoom: 縮放等級（可為陣列，與點數相同長度）
+
+    Returns:
+        np.ndarray: shape (N, 2) 的 [x, y]
+    """
+    coords = np.asarray(latlng, dtype=np.float64).reshape(-1, 2)
+    lat = np.clip(coords[:, 0], -MAX_LATITUDE, MAX_LATITUDE)
+    siny = np.clip(np.sin(np.radians(lat)), -0.9999, 0.9999)
+    x = TILE_SIZE * (0.5 + coords[:, 1] / 360.0)
+    y = TILE_SIZE * (0.5 - np.log((1 + siny) / (1 - siny)) / (4 * np.pi))
+    scale = 2.0 ** np.floor(np.asarray(zoom, dtype=np.float64))
+    return np.column_stack((x * scale, y * scale))
+
+
+def project(latlng, zoom, width, height, center_lat, center_lng):
+    """
+    Web Mercator：緯經度轉為圖片像素座標（與 GoogleMapsService._latlng_to_pixel 相同公式）
+
+    Args:
+        latlng: shape (N, 2) 的 [lat, lng]
+        zoom: 縮放等級
+        width: 圖片寬
+        height: 圖片高
+        center_lat: 圖片中心緯度
+        center_lng: 圖片中心經度
+
+    Returns:
+        np.ndarray: shape (N, 2) 的 [x, y]
+    """
+    center = world_pixels([[center_lat, center_lng]], zoom)[0]
+    return world_pixels(latlng, zoom) - center + np.array([width / 2.0, height / 2.0])
+
+
+def bounds(latlng):
+    """
+    計算座標範圍
+
+    Returns:
+        tuple: (min_lat, min_lng, max_lat, max_lng)；沒有座標時為 None
+    """
+    coords = np.asarray(latlng, dtype=np.float64).reshape(-1, 2)
+    if coords.size == 0:
+        return None
+    (min_lat, min_lng), (max_lat, max_lng) = coords.min(axis=0), coords.max(axis=0)
+    return float(min_lat), float(min_lng), float(max_lat), float(max_lng)
+
+
+def fit_encoded(polylines, fits, zoom=21, iterations=24):
+    """
+    以二分搜尋 Douglas–Peucker 容許誤差，找出讓 fits() 成立的最小簡化程度
+
+    Args:
+        polylines: 編碼字串列表
+        fits: 判斷函式 fits(編碼字串列表) -> bool（例如 URL 長度是否在上限內）
+        zoom: 計算容許誤差使用的縮放等級（容許誤差單位為該等級的像素）
+        iterations: 二分搜尋次數
+
+    Returns:
+        list: 簡化後的編碼字串列表（原本就符合時原樣回傳）；簡化到只剩起終點仍不符合時為 None
+    """
+    polylines = list(polylines)
+    if fits(polylines):
+        return polylines
+
+    decoded = [decode(encoded) for encoded in polylines]
+    projected = [world_pixels(points, zoom) for points in decoded]
+
+    def simplified(tolerance):
+        return [
+            encode(points[simplify(pixels, tolerance)])
+            for points, pixels in zip(decoded, projected)
+        ]
+
+    # 上限：路線範圍對角線長度，此時每條路線只剩起終點
+    all_pixels = np.vstack(projected) if projected else np.empty((0, 2))
+    if len(all_pixels) == 0:
+        return None
+    span = all_pixels.max(axis=0) - all_pixels.min(axis=0)
+    high = float(np.hypot(span[0], span[1])) + 1.0
+    best = simplified(high)
+    if not fits(best):
+        return None
+
+    low = 0.0
+    for _ in range(iterations):
+        mid = (low + high) / 2
+        candidate = simplified(mid)
+        if fits(candidate):
+            high, best = mid, candidate
+        else:
+            low = mid
+    return best
+
+
+def _fits(offsets_min, offsets_max, scale, size, padding_px):
+    low = size / 2.0 + offsets_min * scale
+    high = size / 2.0 + offsets_max * scale
+    return (low >= padding_px) & (high <= size - padding_px)
+
+
+def fit_zoom(min_lat, min_lng, max_lat, max_lng, width, height, padding_px=120, max_zoom=21, default_zoom=15):
+    """
+    以封閉解計算能完整容納範圍（含內距）的最大縮放等級，可一次處理多組範圍
+
+    中心點取緯經度範圍的中點；x 方向與經度成正比，y 方向依 Web Mercator 計算，
+    縮放等級 z 需滿足 2^z * 最大偏移 <= 半寬 - 內距，因此 z = floor(log2((半寬 - 內距) / 最大偏移))。
+
+    Args:
+        min_lat, min_lng, max_lat, max_lng: 範圍（純量或陣列）
+        width: 圖片寬
+        height: 圖片高
+        padding_px: 內距（像素）
+        max_zoom: 最大縮放等級
+        default_zoom: 任何縮放等級都放不下時使用的等級
+
+    Returns:
+        tuple: (zoom, center_lat, center_lng)，輸入為陣列時各為陣列
+    """
+    min_lat, min_lng, max_lat, max_lng = np.broadcast_arrays(
+        *(np.asarray(v, dtype=np.float64) for v in (min_lat, min_lng, max_lat, max_lng))
+    )
+    center_lat = (min_lat + max_lat) / 2.0
+    center_lng = (min_lng + max_lng) / 2.0
+
+    # 縮放等級 0 的世界像素；範圍四角相對中心的偏移
+    shape = min_lat.shape
+    corners = world_pixels(np.column_stack((
+        np.concatenate((max_lat.ravel(), min_lat.ravel(), center_lat.ravel())),
+        np.concatenate((min_lng.ravel(), max_lng.ravel(), center_lng.ravel())),
+    )), 0)
+    n = min_lat.size
+    top_left, bottom_right, center = corners[:n], corners[n:2 * n], corners[2 * n:]
+    off_min = top_left - center       # 左上角偏移（x, y 皆 <= 0）
+    off_max = bottom_right - center   # 右下角偏移（x, y 皆 >= 0）
+
+    half = np.array([width / 2.0 - padding_px, height / 2.0 - padding_px])
+    extent = np.maximum(-off_min, off_max)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        limits = np.where(extent > 0, np.log2(half / extent), np.inf)
+    # 內距超過半寬（log2 為 NaN）時視為放不下
+    zoom = np.minimum(np.floor(np.nan_to_num(limits.min(axis=1), nan=-1.0)), max_zoom)
+
+    # 浮點誤差修正：與逐級檢查的結果一致（z+1 可放下就用 z+1，z 放不下就退一級）
+    def fits(z):
+        scale = 2.0 ** z
+        return (
+            _fits(off_min[:, 0], off_max[:, 0], scale, width, padding_px)
+            & _fits(off_min[:, 1], off_max[:, 1], scale, height, padding_px)
+        )
+
+    up = np.minimum(zoom + 1, max_zoom)
+    zoom = np.where(fits(up), up, np.where(fits(zoom), zoom, zoom - 1))
+    zoom = np.where((zoom >= 0) & fits(np.maximum(zoom, 0)), zoom, default_zoom).astype(np.int64)
+
+    if shape == ():
+        return int(zoom[0]), float(center_lat), float(center_lng)
+    return zoom.reshape(shape), center_lat, center_lng
@@ -0,0 +1,49 @@
+"""
+速率限制工具
+以 token bucket 控制對外部 API 的每秒請求數，供多執行緒批次計算共用
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    """執行緒安全的 token bucket 速率限制器"""
+
+    def __init__(self, rate_per_second: float, burst: int | None = None):
+        """
+        Args:
+            rate_per_second: 每秒允許的請求數；<= 0 表示不限制
+            burst: 瞬間可連續發出的請求數（預設為每秒請求數，至少 1）
+        """
+        self.rate = float(rate_per_second)
+        self.capacity = float(burst if burst is not None else max(self.rate, 1.0))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def acquire(self) -> float:
+        """
+        取得一個請求額度，額度不足時阻塞等待
+
+        Returns:
+            float: 實際等待秒數
+        """
+        if not self.enabled:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                delay = (1.0 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
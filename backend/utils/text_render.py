@@ -0,0 +1,67 @@
+"""
+文字繪製工具
+以 Pillow 的 stroke_width / stroke_fill 一次畫出外框（Halo），取代多次位移重畫；
+並提供以像素寬度換行（中日韓文字逐字換行）。
+"""
+
+
+def draw_text(draw, xy, text, font, fill, outline=None, outline_width=2):
+    """
+    繪製文字（可選外框，用於地圖上增加可讀性）
+
+    Args:
+        draw: ImageDraw.Draw
+        xy: 左上角座標 (x, y)
+        text: 文字
+        font: 字體
+        fill: 文字顏色
+        outline: 外框顏色（None 表示不畫外框）
+        outline_width: 外框寬度（像素）
+    """
+    if outline is not None and outline_width > 0:
+        draw.text(xy, text, font=font, fill=fill, stroke_width=outline_width, stroke_fill=outline)
+    else:
+        draw.text(xy, text, font=font, fill=fill)
+
+
+def text_size(font, text, outline_width=0):
+    """
+    量測文字大小（不需建立暫存影像）
+
+    Args:
+        font: 字體
+        text: 文字
+        outline_width: 外框寬度（像素）
+
+    Returns:
+        tuple: (寬, 高)
+    """
+    left, top, right, bottom = font.getbbox(text, stroke_width=outline_width)
+    return right - left, bottom - top
+
+
+def wrap_text(text, font, max_width):
+    """
+    依像素寬度逐字換行（CJK safe）
+
+    Args:
+        text: 文字
+        font: 字體
+        max_width: 每行最大寬度（像素）
+
+    Returns:
+        list: 各行文字
+    """
+    lines = []
+    cur = ""
+    for ch in str(text):
+        test = cur + ch
+        if text_size(font, test)[0] <= max_width:
+            cur = test
+        else:
+            if cur:
+                lines.append(cur)
+            cur = ch
+    if cur:
+        lines.append(cur)
+    return lines
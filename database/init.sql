@@ -35,6 +35,23 @@ CREATE TABLE IF NOT EXISTS system_settings (
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新時間'
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='系統設定資料表';
 
+-- 外部 API 快取資料表（地理編碼、路線）
+CREATE TABLE IF NOT EXISTS api_cache_entries (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    namespace VARCHAR(50) NOT NULL COMMENT '快取分類：geocode, directions',
+    cache_key VARCHAR(64) NOT NULL COMMENT '正規化查詢的 SHA-256',
+    query_text TEXT COMMENT '正規化後的查詢內容（除錯用）',
+    payload MEDIUMTEXT COMMENT '結果（JSON格式），負向快取為空',
+    is_negative BOOLEAN DEFAULT FALSE COMMENT '是否為查無結果的負向快取',
+    hit_count INT DEFAULT 0 COMMENT '命中次數',
+    expires_at DATETIME NOT NULL COMMENT '到期時間',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '建立時間',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新時間',
+    UNIQUE KEY uq_api_cache_namespace_key (namespace, cache_key),
+    INDEX idx_namespace (namespace),
+    INDEX idx_expires_at (expires_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='外部 API 快取資料表';
+
 -- 使用者資料表（可與第一案共用或獨立）
 CREATE TABLE IF NOT EXISTS users (
     id INT AUTO_INCREMENT PRIMARY KEY,